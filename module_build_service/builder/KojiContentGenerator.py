@@ -217,7 +217,8 @@ class KojiContentGenerator(object):
             {"rpmID": rpm_id, "headers": ["license"]} for rpm_id in binary_rpms.keys()
         ]
         rpms_headers = koji_retrying_multicall_map(
-            session, session.getRPMHeaders, list_of_kwargs=multicall_kwargs
+            session, session.getRPMHeaders, list_of_kwargs=multicall_kwargs,
+            method="getRPMHeaders",
         )
 
         # Temporary dict with build_id as a key to find builds easily.
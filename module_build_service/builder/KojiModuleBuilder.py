@@ -935,7 +935,9 @@ class KojiModuleBuilder(GenericBuilder):
         """
         log.info("Blocking packages in tag %s: %r", self.module_build_tag["name"], packages)
         args = [[self.module_build_tag["name"], package] for package in packages]
-        koji_multicall_map(self.koji_session, self.koji_session.packageListBlock, args)
+        koji_multicall_map(
+            self.koji_session, self.koji_session.packageListBlock, args,
+            method="packageListBlock")
 
     def unblock_artifacts(self, artifacts):
         """
@@ -966,7 +968,9 @@ class KojiModuleBuilder(GenericBuilder):
         build_tag_name = self.module_build_tag["name"]
         log.info("Unblocking packages in tag %s: %r", build_tag_name, packages)
         args = [[build_tag_name, package] for package in packages]
-        koji_multicall_map(self.koji_session, self.koji_session.packageListUnblock, args)
+        koji_multicall_map(
+            self.koji_session, self.koji_session.packageListUnblock, args,
+            method="packageListUnblock")
 
     @validate_koji_tag(["build_tag", "dest_tag"])
     def _koji_add_target(self, name, build_tag, dest_tag):
@@ -1093,7 +1097,8 @@ class KojiModuleBuilder(GenericBuilder):
         # Get the Koji PackageID for every component in single Koji call.
         # If some package does not exist in Koji, component_ids will be None.
         component_ids = koji_retrying_multicall_map(
-            koji_session, koji_session.getPackageID, list_of_args=components)
+            koji_session, koji_session.getPackageID, list_of_args=components,
+            method="getPackageID")
         if not component_ids:
             return cls.compute_weights_from_build_time(components)
 
@@ -1109,7 +1114,8 @@ class KojiModuleBuilder(GenericBuilder):
 
         # Get the latest Koji build created by MBS for every component in single Koji call.
         builds_per_component = koji_retrying_multicall_map(
-            koji_session, koji_session.listBuilds, list_of_kwargs=build_queries)
+            koji_session, koji_session.listBuilds, list_of_kwargs=build_queries,
+            method="listBuilds")
         if not builds_per_component:
             return cls.compute_weights_from_build_time(components)
 
@@ -1149,7 +1155,8 @@ class KojiModuleBuilder(GenericBuilder):
         # For components with a build, get the list of tasks associated with this build
         # and compute the weight for each component build as sum of weights of all tasks.
         tasks_per_latest_build = koji_retrying_multicall_map(
-            koji_session, koji_session.getTaskDescendents, list_of_args=task_ids)
+            koji_session, koji_session.getTaskDescendents, list_of_args=task_ids,
+            method="getTaskDescendents")
         if not tasks_per_latest_build:
             return cls.compute_weights_from_build_time(components_with_build)
 
@@ -1181,6 +1188,18 @@ class KojiModuleBuilder(GenericBuilder):
         nvrs = set(kobo.rpmlib.make_nvr(rpm, force_epoch=True) for rpm in rpms)
         return list(nvrs)
 
+    @classmethod
+    def get_module_build_rpms(cls, module):
+        """
+        :param ModuleBuild module: Get the list of RPMs built in the module build.
+        :return: list of RPM dicts with name, epoch, version, release and arch keys
+        """
+        if not module.koji_tag:
+            log.warning("No Koji tag associated with module %r", module)
+            return []
+        koji_session = get_session(conf, login=False)
+        return koji_session.listTaggedRPMS(module.koji_tag, latest=True)[0]
+
     def finalize(self, succeeded=True):
         # Only import to koji CG if the module is "build" and not scratch.
         if (
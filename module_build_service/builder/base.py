@@ -353,6 +353,14 @@ class GenericBuilder(six.with_metaclass(ABCMeta)):
         """
         raise NotImplementedError()
 
+    @classmethod
+    def get_module_build_rpms(cls, module):
+        """
+        :param ModuleBuild module: Get the list of RPMs built in the module build.
+        :return: list of RPM dicts with name, epoch, version, release and arch keys
+        """
+        raise NotImplementedError()
+
     @classmethod
     def get_module_build_arches(cls, module):
         """
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+"""Helpers for the in-process caches used by MBS."""
+
+from __future__ import absolute_import
+from collections import OrderedDict
+import threading
+
+from dogpile.cache import make_region
+
+
+class LRUDict(object):
+    """
+    Thread-safe dict-like container which keeps at most `max_entries` items.
+    When it is full, the least recently used item is removed.
+
+    It implements just the subset of the dict interface used by the
+    "dogpile.cache.memory" backend, so it can be passed to it as `cache_dict`.
+    """
+
+    def __init__(self, max_entries):
+        if max_entries < 1:
+            raise ValueError("max_entries must be >= 1")
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+            self._data[key] = value
+            return value
+
+    def __getitem__(self, key):
+        with self._lock:
+            value = self._data.pop(key)
+            self._data[key] = value
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._data[key]
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def pop(self, key, *default):
+        with self._lock:
+            return self._data.pop(key, *default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def make_bounded_region(backend, arguments=None, max_entries=1024, **region_kwargs):
+    """
+    Creates and configures the dogpile.cache region. When the "dogpile.cache.memory"
+    backend is used, the number of cached items is limited to `max_entries` and the
+    least recently used items are removed first.
+
+    :param str backend: name of the dogpile.cache backend.
+    :param dict arguments: arguments passed to the backend.
+    :param int max_entries: maximum number of items kept by the memory backend.
+    :param region_kwargs: additional kwargs passed to `dogpile.cache.make_region`.
+    :return: configured dogpile.cache region.
+    """
+    arguments = dict(arguments or {})
+    if backend == "dogpile.cache.memory":
+        arguments.setdefault("cache_dict", LRUDict(max_entries))
+    return make_region(**region_kwargs).configure(backend, arguments=arguments)
@@ -302,6 +302,56 @@ class Config(object):
         "log_backend": {"type": str, "default": None, "desc": "Log backend"},
         "log_file": {"type": str, "default": "", "desc": "Path to log file"},
         "log_level": {"type": str, "default": "info", "desc": "Log level"},
+        "db_slow_query_threshold": {
+            "type": int,
+            "default": 1000,
+            "desc": (
+                "The SQL queries running for at least this number of milliseconds are logged "
+                "as slow queries. Set to 0 to not log them."
+            ),
+        },
+        "db_query_budget": {
+            "type": int,
+            "default": 200,
+            "desc": (
+                "A warning is logged when an API request or an event handler runs more SQL "
+                "queries than this. Set to 0 to not check it."
+            ),
+        },
+        "profiling_dir": {
+            "type": Path,
+            "default": "",
+            "desc": (
+                "Directory to store the cProfile profiles of the API requests and the event "
+                "handlers to. Profiling is enabled only when it is set."
+            ),
+        },
+        "profiling_module_build_ids": {
+            "type": list,
+            "default": [],
+            "desc": "The IDs of the module builds whose event handlers are always profiled.",
+        },
+        "profiling_sample_one_in": {
+            "type": int,
+            "default": 0,
+            "desc": (
+                "Profile one of this number of event handler runs, chosen randomly. Set to 0 "
+                "to profile only the handlers of profiling_module_build_ids."
+            ),
+        },
+        "profiling_max_size": {
+            "type": int,
+            "default": 512,
+            "desc": (
+                "The maximum size of the profiles in profiling_dir, in MiB. The oldest "
+                "profiles are deleted when it is exceeded."
+            ),
+        },
+        "profiling_retention_days": {
+            "type": int,
+            "default": 7,
+            "desc": "Time in days after which the profiles are deleted.",
+        },
         "build_logs_dir": {
             "type": Path,
             "default": tempfile.gettempdir(),
@@ -323,6 +373,32 @@ class Config(object):
             "default": ["org.fedoraproject.prod"],
             "desc": "The messaging system topic prefixes which we are interested in.",
         },
+        "consumer_workers": {
+            "type": int,
+            "default": 0,
+            "desc": (
+                "The number of threads handling the received events when Celery is not used. "
+                "The events of a module build are always handled by the same thread, in order. "
+                "When set to 0, the events are handled one by one by the consumer itself."
+            ),
+        },
+        "message_relevance_filter": {
+            "type": bool,
+            "default": True,
+            "desc": (
+                "Drop the received Koji build, tag and repo messages which are not related to "
+                "any module build using an in-memory index, before querying the database."
+            ),
+        },
+        "message_relevance_refresh_interval": {
+            "type": int,
+            "default": 60,
+            "desc": (
+                "The number of seconds after which the message relevance index is rebuilt. The "
+                "builds changed by other processes than the consumer, like the Celery workers, "
+                "are only known to the index after it is rebuilt."
+            ),
+        },
         "distgits": {
             "type": dict,
             "default": {
@@ -371,6 +447,21 @@ class Config(object):
             "default": False,
             "desc": "Is it allowed to directly submit build by modulemd yaml file?",
         },
+        "submission_async": {
+            "type": bool,
+            "default": False,
+            "desc": (
+                'Allow the clients to ask for an asynchronous submission with the "Prefer: '
+                'respond-async" header. Such submission returns a submission job to poll, and '
+                "the module builds are created in the background."
+            ),
+        },
+        "submission_workers": {
+            "type": int,
+            "default": 4,
+            "desc": "The number of threads of a frontend process creating the module builds "
+                    "submitted asynchronously.",
+        },
         "num_concurrent_builds": {
             "type": int,
             "default": 5,
@@ -425,6 +516,40 @@ class Config(object):
                 "the groups in LDAP"
             ),
         },
+        "export_yield_per": {
+            "type": int,
+            "default": 100,
+            "desc": (
+                "The number of rows fetched from the database at a time when streaming builds "
+                "from the export API."
+            ),
+        },
+        "auth_cache_backend": {
+            "type": str,
+            "default": "dogpile.cache.memory",
+            "desc": "The dogpile.cache backend used to cache the authentication data, like the "
+                    "OIDC token information and the LDAP group membership. Use a shared backend "
+                    "like \"dogpile.cache.memcached\" to share the cache between the workers.",
+        },
+        "auth_cache_arguments": {
+            "type": dict,
+            "default": {},
+            "desc": "The arguments passed to the AUTH_CACHE_BACKEND dogpile.cache backend.",
+        },
+        "auth_cache_max_entries": {
+            "type": int,
+            "default": 1024,
+            "desc": "The maximum number of entries kept in the authentication cache when the "
+                    "\"dogpile.cache.memory\" backend is used. The least recently used entries "
+                    "are removed first.",
+        },
+        "oidc_token_cache_max_ttl": {
+            "type": int,
+            "default": 300,
+            "desc": "The maximum time in seconds for which the OIDC token introspection and "
+                    "userinfo responses are cached. The responses are never cached longer than "
+                    "the token is valid. Set to 0 to disable the caching.",
+        },
         "base_module_names": {
             "type": list,
             "default": ["platform"],
@@ -499,6 +624,38 @@ class Config(object):
                 'the "garbage" state.'
             ),
         },
+        "log_messages_buffer_size": {
+            "type": int,
+            "default": 100,
+            "desc": (
+                "The number of log messages of module builds and component builds buffered "
+                "during an event handler before they are inserted into the database."
+            ),
+        },
+        "log_messages_retention_days": {
+            "type": int,
+            "default": 365,
+            "desc": (
+                "Time in days after which the log messages of the module builds in the "
+                '"ready", "failed" or "garbage" state are deleted. Set to 0 to keep them.'
+            ),
+        },
+        "log_messages_max_per_module_build": {
+            "type": int,
+            "default": 10000,
+            "desc": (
+                "The maximum number of log messages kept for a module build, the oldest ones "
+                "are deleted. Set to 0 to keep all of them."
+            ),
+        },
+        "log_messages_cleanup_batch_size": {
+            "type": int,
+            "default": 10000,
+            "desc": (
+                "The maximum number of log messages deleted by a single run of the periodic "
+                "log messages cleanup, the rest is deleted by the next runs."
+            ),
+        },
         "cleanup_stuck_builds_time": {
             "type": int,
             "default": 7,
@@ -523,6 +680,39 @@ class Config(object):
             "desc": "Where to look up for modules. Note that this can (and "
             "probably will) be builder-specific.",
         },
+        "resolver_lookup_workers": {
+            "type": int,
+            "default": 8,
+            "desc": "The maximum number of concurrent lookups of the dependencies of a submitted "
+                    "module in the remote resolvers. When set to 1, they are looked up serially.",
+        },
+        "expansion_plan_cache_ttl": {
+            "type": int,
+            "default": 600,
+            "desc": "The number of seconds the module stream expansion of a submitted module is "
+                    "reused by the subsequent submissions of the module with the same "
+                    "dependencies, as long as no module it depends on gets a new ready module "
+                    "build. Only used with the db resolver. Set to 0 to disable it.",
+        },
+        "expansion_plan_cache_size": {
+            "type": int,
+            "default": 256,
+            "desc": "The maximum number of module stream expansions cached by a frontend process.",
+        },
+        "koji_tag_snapshot_ttl": {
+            "type": int,
+            "default": 60,
+            "desc": "The number of seconds the listing of the module builds tagged in the "
+                    "koji_tag_with_modules Koji tag of a base module is reused by the "
+                    "subsequent submissions.",
+        },
+        "ursine_content_ttl": {
+            "type": int,
+            "default": 300,
+            "desc": "The number of seconds the modules found in the ursine content of a base "
+                    "module and their built RPMs are reused without checking with Koji whether "
+                    "the tags they were found from changed.",
+        },
         "koji_external_repo_url_prefix": {
             "type": str,
             "default": "https://kojipkgs.fedoraproject.org/",
@@ -635,6 +825,24 @@ class Config(object):
             "default": 60,
             "desc": "Greenwave response timeout"
         },
+        "greenwave_policies_ttl": {
+            "type": int,
+            "default": 300,
+            "desc": "The number of seconds the product versions of the Greenwave policies are "
+                    "cached for.",
+        },
+        "greenwave_max_concurrent_queries": {
+            "type": int,
+            "default": 4,
+            "desc": "The maximum number of module builds whose gating is checked in Greenwave "
+                    "at the same time.",
+        },
+        "greenwave_poll_max_interval": {
+            "type": int,
+            "default": 3600,
+            "desc": "The maximum number of seconds between two checks of the gating of a module "
+                    "build in the done state. The interval doubles every time the gating fails.",
+        },
         "modules_allow_scratch": {
             "type": bool,
             "default": False,
@@ -695,6 +903,18 @@ class Config(object):
             "default": "master",
             "desc": "Denotes the branch used for rawhide.",
         },
+        "default_modules_ref_ttl": {
+            "type": int,
+            "default": 300,
+            "desc": "The number of seconds the commit a branch of a default modules repo points "
+                    "to is reused by the subsequent submissions. The default modules are parsed "
+                    "only once per commit.",
+        },
+        "rawhide_version_ttl": {
+            "type": int,
+            "default": 3600,
+            "desc": "The number of seconds the rawhide version queried from Koji is reused.",
+        },
         "dnf_minrate": {
             "type": int,
             "default": 1024 * 100,  # 100KB
@@ -708,6 +928,48 @@ class Config(object):
             "desc": "The timeout configuration for dnf operations, in seconds."
         },
         "num_workers": {"type": int, "default": 1, "desc": "Number of Celery workers"},
+        "shard_assignment": {
+            "type": str,
+            "default": "modulo",
+            "desc": (
+                "How the module builds are assigned to the queues of the Celery workers. "
+                '"modulo" uses the module build id modulo the number of workers, "hash_ring" '
+                "uses a consistent hash ring so that changing the number of workers only moves "
+                'a small part of the module builds, and "lease" uses the hash ring but records '
+                "the assignment in the database, moving idle module builds away from the "
+                "workers which are behind."
+            ),
+        },
+        "shard_ring_replicas": {
+            "type": int,
+            "default": 64,
+            "desc": "The number of points of every worker on the consistent hash ring.",
+        },
+        "shard_lease_timeout": {
+            "type": int,
+            "default": 3600,
+            "desc": (
+                "The number of seconds after which the assignment of a module build to a worker "
+                "is released even if the worker did not report its tasks as done."
+            ),
+        },
+        "shard_lease_cache_ttl": {
+            "type": int,
+            "default": 10,
+            "desc": (
+                "The number of seconds the assignments of the module builds to the workers are "
+                "cached by the processes sending the tasks, before they are checked in the "
+                "database again."
+            ),
+        },
+        "shard_steal_threshold": {
+            "type": int,
+            "default": 5,
+            "desc": (
+                "A module build with no task in progress is assigned to the least busy worker "
+                "instead of its own one when its own worker has this many tasks in progress more."
+            ),
+        },
         "celery_task_always_eager": {
             "type": bool,
             "default": False,
@@ -989,6 +1251,14 @@ class Config(object):
 
         self._product_pages_module_streams = d
 
+    def _setifok_shard_assignment(self, s):
+        if s not in ("modulo", "hash_ring", "lease"):
+            raise ValueError(
+                'The shard assignment "{0}" is not supported. Choose from: '
+                "modulo, hash_ring, lease".format(s)
+            )
+        self._shard_assignment = s
+
     def _setifok_num_threads_for_build_submissions(self, i):
         if not isinstance(i, int):
             raise TypeError("NUM_THREADS_FOR_BUILD_SUBMISSIONS needs to be an int")
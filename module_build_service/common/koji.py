@@ -8,11 +8,18 @@ import munch
 import six.moves.xmlrpc_client as xmlrpclib
 
 from module_build_service.common import log
+import module_build_service.common.monitor as monitor
 from module_build_service.common.retry import retry
 from module_build_service.common.errors import ProgrammingError
 
 
-def koji_multicall_map(koji_session, koji_session_fnc, list_of_args=None, list_of_kwargs=None):
+# The timed versions of _koji_multicall_map, per name of the called Koji API method
+_timed_multicall_maps = {}
+
+
+def koji_multicall_map(
+    koji_session, koji_session_fnc, list_of_args=None, list_of_kwargs=None, method="multiCall"
+):
     """
     Calls the `koji_session_fnc` using Koji multicall feature N times based on the list of
     arguments passed in `list_of_args` and `list_of_kwargs`.
@@ -20,14 +27,26 @@ def koji_multicall_map(koji_session, koji_session_fnc, list_of_args=None, list_o
     the error message is logged and None is returned.
 
     For example to get the package ids of "httpd" and "apr" packages:
-        ids = koji_multicall_map(session, session.getPackageID, ["httpd", "apr"])
+        ids = koji_multicall_map(
+            session, session.getPackageID, ["httpd", "apr"], method="getPackageID")
         # ids is now [280, 632]
 
     :param KojiSessions koji_session: KojiSession to use for multicall.
     :param object koji_session_fnc: Python object representing the KojiSession method to call.
     :param list list_of_args: List of args which are passed to each call of koji_session_fnc.
     :param list list_of_kwargs: List of kwargs which are passed to each call of koji_session_fnc.
+    :param str method: Name of the called Koji API method, used to label the duration of the
+        multicall in the remote call histogram.
     """
+    timed_multicall_map = _timed_multicall_maps.get(method)
+    if timed_multicall_map is None:
+        timed_multicall_map = monitor.timed(
+            monitor.remote_call_histogram, service="koji", method=method)(_koji_multicall_map)
+        _timed_multicall_maps[method] = timed_multicall_map
+    return timed_multicall_map(koji_session, koji_session_fnc, list_of_args, list_of_kwargs)
+
+
+def _koji_multicall_map(koji_session, koji_session_fnc, list_of_args, list_of_kwargs):
     if list_of_args is None and list_of_kwargs is None:
         raise ProgrammingError("One of list_of_args or list_of_kwargs must be set.")
 
@@ -110,6 +129,7 @@ def koji_retrying_multicall_map(*args, **kwargs):
 
 
 @retry(wait_on=(xmlrpclib.ProtocolError, koji.GenericError))
+@monitor.timed(monitor.remote_call_histogram, service="koji", method="get_session")
 def get_session(config, login=True):
     """Create and return a koji.ClientSession object
 
@@ -20,9 +20,22 @@ logging.warning("%s failed to build", task_id)
 """
 
 from __future__ import absolute_import
+from contextlib import contextmanager
+import io
 import os
 import logging
 import inspect
+import threading
+import traceback
+
+try:
+    # python3
+    import queue
+except ImportError:
+    # python2
+    import Queue as queue
+
+import six
 
 levels = {
     "debug": logging.DEBUG,
@@ -41,33 +54,120 @@ level_flags = {
 log_format = "%(asctime)s - %(threadName)s - %(name)s - %(levelname)s - %(message)s"
 
 
-class ModuleBuildFileHandler(logging.FileHandler):
+_context = threading.local()
+
+
+def get_current_module_build_id():
     """
-    FileHandler subclass which handles only messages generated during
-    particular module build with `build_id` set in its constructor.
+    Returns the id of the module build handled by the current thread, or None.
     """
+    return getattr(_context, "module_build_id", None)
 
-    def __init__(self, build_id, filename, mode="a", encoding=None, delay=0):
-        logging.FileHandler.__init__(self, filename, mode, encoding, delay)
-        self.build_id = build_id
 
-    def emit(self, record):
-        # Imported here because of importing cycle between __init__.py,
-        # scheduler and models.
-        from module_build_service.scheduler.consumer import MBSConsumer
-
-        # Check the currently handled module build and emit the message only
-        # if it's associated with current module.
-        build_id = MBSConsumer.current_module_build_id
-        if not build_id or build_id != self.build_id:
+@contextmanager
+def module_build_log_context(module_build_id):
+    """
+    Context manager associating the messages logged by the current thread with the module
+    build, so that they are written to its build log.
+    """
+    previous = get_current_module_build_id()
+    _context.module_build_id = module_build_id
+    try:
+        yield
+    finally:
+        _context.module_build_id = previous
+
+
+class ModuleBuildLogDispatcher(logging.Handler):
+    """
+    Logging handler writing the messages to the build log of the module build handled by the
+    current thread.
+
+    The build logs are looked up by the module build id, so a single handler serves all the
+    module builds. The formatted messages are written by a background thread, so logging never
+    waits for the disk.
+    """
+
+    def __init__(self, level=logging.NOTSET):
+        logging.Handler.__init__(self, level)
+        self.streams = {}
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    def _start_writer(self):
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write, name="mbs-build-logs")
+                self._writer.daemon = True
+                self._writer.start()
+
+    def _write(self):
+        dirty = set()
+        while True:
+            stream, message, closed = self._queue.get()
+            try:
+                if closed is not None:
+                    dirty.discard(stream)
+                    stream.close()
+                else:
+                    stream.write(message)
+                    dirty.add(stream)
+                # Flush once all the queued messages are written
+                if self._queue.empty():
+                    for dirty_stream in dirty:
+                        dirty_stream.flush()
+                    dirty.clear()
+            except Exception:
+                traceback.print_exc()
+            finally:
+                if closed is not None:
+                    closed.set()
+
+    def open_stream(self, build_id, path):
+        """
+        Starts writing the messages logged for the module build to the file at `path`.
+        """
+        self.streams[build_id] = io.open(path, "a", encoding="utf-8")
+        self._start_writer()
+
+    def close_stream(self, build_id):
+        """
+        Stops writing the messages logged for the module build and waits until the messages
+        logged so far are written.
+        """
+        stream = self.streams.pop(build_id, None)
+        if stream is None:
             return
+        closed = threading.Event()
+        self._start_writer()
+        self._queue.put((stream, None, closed))
+        closed.wait()
 
-        logging.FileHandler.emit(self, record)
+    def close(self):
+        for build_id in list(self.streams.keys()):
+            self.close_stream(build_id)
+        logging.Handler.close(self)
+
+    def emit(self, record):
+        build_id = get_current_module_build_id()
+        if build_id is None:
+            return
+        stream = self.streams.get(build_id)
+        if stream is None:
+            return
+        try:
+            message = self.format(record)
+            if not isinstance(message, six.text_type):
+                message = message.decode("utf-8", "replace")
+            self._queue.put((stream, message + u"\n", None))
+        except Exception:
+            self.handleError(record)
 
 
 class ModuleBuildLogs(object):
     """
-    Manages ModuleBuildFileHandler logging handlers.
+    Manages the build logs of the module builds, written by a ModuleBuildLogDispatcher.
     """
 
     def __init__(self, build_logs_dir, build_logs_name_format, level=logging.INFO):
@@ -75,10 +175,18 @@ class ModuleBuildLogs(object):
         Creates new ModuleBuildLogs instance. Module build logs are stored
         to `build_logs_dir` directory.
         """
-        self.handlers = {}
         self.build_logs_dir = build_logs_dir
         self.build_logs_name_format = build_logs_name_format
         self.level = level
+        self.dispatcher = ModuleBuildLogDispatcher(level)
+        self.dispatcher.setFormatter(logging.Formatter(log_format, None))
+
+    @property
+    def build_ids(self):
+        """
+        Returns the ids of the module builds whose build log is being written.
+        """
+        return list(self.dispatcher.streams.keys())
 
     def path(self, db_session, build):
         """
@@ -101,35 +209,23 @@ class ModuleBuildLogs(object):
         if not self.build_logs_dir:
             return
 
-        if build.id in self.handlers:
+        if build.id in self.dispatcher.streams:
             return
 
-        # Create and add ModuleBuildFileHandler.
-        handler = ModuleBuildFileHandler(build.id, self.path(db_session, build))
-        handler.setLevel(self.level)
-        handler.setFormatter(logging.Formatter(log_format, None))
+        self.dispatcher.open_stream(build.id, self.path(db_session, build))
         log = logging.getLogger()
         log.setLevel(self.level)
-        log.addHandler(handler)
-
-        self.handlers[build.id] = handler
+        if self.dispatcher not in log.handlers:
+            log.addHandler(self.dispatcher)
 
     def stop(self, build):
         """
         Stops logging build log for module with `build_id` id. It does *not*
         remove the build log from fs.
         """
-        if build.id not in self.handlers:
-            return
-
-        handler = self.handlers[build.id]
-        handler.flush()
-        handler.close()
-
-        # Remove the log handler.
-        log = logging.getLogger()
-        log.removeHandler(handler)
-        del self.handlers[build.id]
+        self.dispatcher.close_stream(build.id)
+        if not self.dispatcher.streams:
+            logging.getLogger().removeHandler(self.dispatcher)
 
 
 class MBSLogger:
@@ -72,7 +72,7 @@ def _in_memory_publish(topic, msg, conf, service):
     # Create fake fedmsg from the message so we can reuse
     # the BaseMessage.from_fedmsg code to get the particular BaseMessage
     # class instance.
-    wrapped_msg = FedmsgMessageParser(known_fedmsg_services).parse({
+    wrapped_msg = _in_memory_backend["parser"].parse({
         "msg_id": str(_in_memory_msg_id),
         "topic": service + "." + topic,
         "msg": msg
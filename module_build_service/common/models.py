@@ -5,6 +5,7 @@
 
 from __future__ import absolute_import
 from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
 from datetime import datetime
 import hashlib
 import json
@@ -29,6 +30,10 @@ from module_build_service.scheduler import events
 
 DEFAULT_MODULE_CONTEXT = "00000000"
 
+# The keys in session.info of the log messages buffered by buffered_log_messages
+LOG_MESSAGES_BUFFER = "log_messages_buffer"
+LOG_MESSAGES_INSERTED = "log_messages_inserted"
+
 
 # Just like koji.BUILD_STATES, except our own codes for modules.
 BUILD_STATES = {
@@ -69,6 +74,19 @@ FAILED_STATES = (BUILD_STATES["failed"], BUILD_STATES["garbage"])
 
 STATE_TRANSITION_FAILURE_TYPES = ["unspec", "user", "infra"]
 
+# The states of the module build submissions processed in the background
+SUBMISSION_JOB_STATES = {
+    # The submission waits for a free worker.
+    "queued": 0,
+    # The submitted modulemd is being fetched, expanded and recorded.
+    "running": 1,
+    # The module builds are created, see module_build_ids.
+    "done": 2,
+    # The submission was rejected or failed, see error_status and error_message.
+    "failed": 3,
+}
+INVERSE_SUBMISSION_JOB_STATES = {v: k for k, v in SUBMISSION_JOB_STATES.items()}
+
 
 Contexts = namedtuple(
     "Contexts", "build_context runtime_context context build_context_no_bms")
@@ -152,6 +170,7 @@ class ModuleBuild(MBSBase):
     reused_module_id = db.Column(db.Integer, db.ForeignKey("module_builds.id"))
     reused_module = db.relationship("ModuleBuild", remote_side="ModuleBuild.id")
     log_messages = db.relationship("LogMessage", backref="module_build", lazy="dynamic")
+    indexed_rpms = db.relationship("ModuleBuildRPM", backref="module_build", lazy="dynamic")
 
     # List of arches against which the module is built.
     # NOTE: It is not filled for imported modules, because imported module builds have not been
@@ -397,6 +416,37 @@ class ModuleBuild(MBSBase):
         return query.join(
             modules_with_virtual_streams, ModuleBuild.id == modules_with_virtual_streams.c.id)
 
+    @staticmethod
+    def _add_latest_version_filter(db_session, query):
+        """
+        Limits an existing query to the builds with the latest version of each name:stream.
+        All the contexts of the latest version are kept.
+
+        The ranking is done in the database using the `rank()` window function, so only the
+        `id` column of the builds matching the original query is read when searching for the
+        latest versions. Only the matching builds are then loaded in the returned query.
+
+        :param db_session: a SQLAlchemy session
+        :param query: a SQLAlchemy query of ModuleBuild to add the filtering to
+        :return: a new query returning only the latest versions of each name:stream, the newest
+            builds first
+        """
+        version_rank = func.rank().over(
+            partition_by=(ModuleBuild.name, ModuleBuild.stream),
+            order_by=sqlalchemy.cast(ModuleBuild.version, db.BigInteger).desc(),
+        )
+        ranked = (
+            query.order_by(None)
+            .with_entities(ModuleBuild.id.label("id"), version_rank.label("version_rank"))
+            .subquery("ranked")
+        )
+        return (
+            db_session.query(ModuleBuild)
+            .join(ranked, ModuleBuild.id == ranked.c.id)
+            .filter(ranked.c.version_rank == 1)
+            .order_by(sqlalchemy.cast(ModuleBuild.version, db.BigInteger).desc())
+        )
+
     @staticmethod
     def get_last_builds_in_stream_version_lte(
             db_session, name, stream_version=None, virtual_streams=None, states=None):
@@ -419,33 +469,13 @@ class ModuleBuild(MBSBase):
             db_session.query(ModuleBuild)
             .filter(ModuleBuild.name == name)
             .filter(ModuleBuild.state.in_(states))
-            .order_by(sqlalchemy.cast(ModuleBuild.version, db.BigInteger).desc())
         )
 
         query = ModuleBuild._add_stream_version_lte_filter(db_session, query, stream_version)
         query = ModuleBuild._add_virtual_streams_filter(db_session, query, virtual_streams)
+        query = ModuleBuild._add_latest_version_filter(db_session, query)
 
-        builds = query.all()
-
-        # In case there are multiple versions of single name:stream build, we want to return
-        # the latest version only. The `builds` are ordered by "version" desc, so we
-        # can just get the first (greatest) version of name:stream.
-        # TODO: Is there a way how to do that nicely in the SQL query itself?
-        seen = {}  # {"n:s": v, ...}
-        ret = []
-        for build in builds:
-            ns = "%s:%s" % (build.name, build.stream)
-            if ns in seen and seen[ns] != build.version:
-                # Skip the builds if we already handled this nsv before.
-                continue
-            elif ns in seen and seen[ns] == build.version:
-                # Different context of the NSV
-                ret.append(build)
-                continue
-
-            seen[ns] = build.version
-            ret.append(build)
-        return ret
+        return query.all()
 
     @staticmethod
     def get_module_count(db_session, **kwargs):
@@ -518,6 +548,17 @@ class ModuleBuild(MBSBase):
             mmd = load_mmd(mmd_str)
         except UnprocessableEntity:
             raise ValueError("Invalid modulemd")
+        return cls.calculate_contexts(mmd)
+
+    @classmethod
+    def calculate_contexts(cls, mmd):
+        """
+        Same as `contexts_from_mmd`, but computed from the Modulemd metadata object.
+
+        :param Modulemd.ModuleStream mmd: Modulemd metadata.
+        :rtype: Contexts
+        :return: Named tuple with build_context, runtime_context and context hashes.
+        """
         mbs_xmd_buildrequires = mmd.get_xmd()["mbs"]["buildrequires"]
         mmd_deps = mmd.get_dependencies()
 
@@ -621,8 +662,17 @@ class ModuleBuild(MBSBase):
         rebuild_strategy=None,
         scratch=False,
         srpms=None,
+        mmd=None,
+        commit=True,
         **kwargs
     ):
+        """
+        Creates a new module build in the "init" state.
+
+        :param Modulemd.ModuleStream mmd: the already loaded `modulemd`, if any.
+        :param bool commit: whether to commit the new module build. When False, it is only
+            added to the session.
+        """
         now = datetime.utcnow()
         module = cls(
             name=name,
@@ -646,11 +696,12 @@ class ModuleBuild(MBSBase):
         module.module_builds_trace.append(mbt)
 
         # Record the base modules this module buildrequires
-        for base_module in module.get_buildrequired_base_modules(db_session):
+        for base_module in module.get_buildrequired_base_modules(db_session, mmd):
             module.buildrequires.append(base_module)
 
         db_session.add(module)
-        db_session.commit()
+        if commit:
+            db_session.commit()
         return module
 
     def transition(self, db_session, conf, state, state_reason=None, failure_type="unspec"):
@@ -773,29 +824,98 @@ class ModuleBuild(MBSBase):
             rv["scratch"] = self.scratch
         return rv
 
+    # The keys of the JSON representations of a module build mapped to the columns they are
+    # computed from. This allows the API to only load and compute the requested keys.
+    json_field_columns = {
+        "arches": ("id",),
+        "base_module_buildrequires": ("id",),
+        "build_context": ("build_context",),
+        "buildrequires": ("modulemd",),
+        "component_builds": ("id",),
+        "context": ("context",),
+        "id": ("id",),
+        "koji_tag": ("koji_tag",),
+        "modulemd": ("modulemd",),
+        "name": ("name",),
+        "owner": ("owner",),
+        "rebuild_strategy": ("rebuild_strategy",),
+        "reused_module_id": ("reused_module_id",),
+        "runtime_context": ("runtime_context",),
+        "scmurl": ("scmurl",),
+        "scratch": ("scratch",),
+        "siblings": ("id", "name", "stream", "version", "scratch"),
+        "srpms": ("srpms",),
+        "state": ("state",),
+        "state_name": ("state",),
+        "state_reason": ("state_reason",),
+        "state_trace": ("id",),
+        "state_url": ("id",),
+        "stream": ("stream",),
+        "stream_version": ("stream_version",),
+        "tasks": ("id", "state"),
+        "time_completed": ("time_completed",),
+        "time_modified": ("time_modified",),
+        "time_submitted": ("time_submitted",),
+        "version": ("version",),
+        "virtual_streams": ("id",),
+    }
+    # The keys added by json to the ones of short_json, apart from "tasks"
+    _json_fields = (
+        "buildrequires",
+        "component_builds",
+        "koji_tag",
+        "owner",
+        "rebuild_strategy",
+        "scmurl",
+        "siblings",
+        "srpms",
+        "state_reason",
+        "time_completed",
+        "time_modified",
+        "time_submitted",
+    )
+    # The keys added by extended_json to the ones of json
+    _extended_json_fields = (
+        "arches",
+        "base_module_buildrequires",
+        "build_context",
+        "modulemd",
+        "reused_module_id",
+        "runtime_context",
+        "state_trace",
+        "state_url",
+        "stream_version",
+        "virtual_streams",
+    )
+
     def json(self, db_session, show_tasks=True):
-        mmd = self.mmd()
-        xmd = mmd.get_xmd()
-        buildrequires = xmd.get("mbs", {}).get("buildrequires", {})
         rv = self.short_json()
-        rv.update({
-            "component_builds": [build.id for build in self.component_builds],
-            "koji_tag": self.koji_tag,
-            "owner": self.owner,
-            "rebuild_strategy": self.rebuild_strategy,
-            "scmurl": self.scmurl,
-            "srpms": json.loads(self.srpms or "[]"),
-            "siblings": self.siblings(db_session),
-            "state_reason": self.state_reason,
-            "time_completed": _utc_datetime_to_iso(self.time_completed),
-            "time_modified": _utc_datetime_to_iso(self.time_modified),
-            "time_submitted": _utc_datetime_to_iso(self.time_submitted),
-            "buildrequires": buildrequires,
-        })
+        rv.update(self.sparse_json(db_session, self._json_fields))
         if show_tasks:
             rv["tasks"] = self.tasks(db_session)
         return rv
 
+    def new_build_json(self, mmd, siblings):
+        """
+        Same as `json(db_session, show_tasks=False)` for a module build which was just created,
+        computed from its Modulemd metadata object and the ids of its siblings instead of
+        parsing the modulemd and querying the database again.
+
+        :param Modulemd.ModuleStream mmd: Modulemd metadata of the module build.
+        :param list siblings: ids of the siblings of the module build.
+        """
+        known_fields = {
+            "buildrequires": mmd.get_xmd().get("mbs", {}).get("buildrequires", {}),
+            "component_builds": [],
+            "siblings": siblings,
+        }
+        rv = self.short_json()
+        # The other keys are computed from the columns only, without the database session
+        rv.update(self.sparse_json(
+            None, [field for field in self._json_fields if field not in known_fields]))
+        rv.update(known_fields)
+        return rv
+
     def extended_json(self, db_session, show_state_url=False, api_version=1):
         """
         :kwarg show_state_url: this will determine if `get_url_for` should be run to determine
@@ -805,17 +925,43 @@ class ModuleBuild(MBSBase):
         :kwarg api_version: the API version to use when building the state URL
         """
         rv = self.json(db_session, show_tasks=True)
-        state_url = None
-        if show_state_url:
-            state_url = get_url_for("module_build", api_version=api_version, id=self.id)
-
-        rv.update({
-            "base_module_buildrequires": [br.short_json(True, False) for br in self.buildrequires],
-            "build_context": self.build_context,
-            "modulemd": self.modulemd,
-            "reused_module_id": self.reused_module_id,
-            "runtime_context": self.runtime_context,
-            "state_trace": [
+        rv.update(self.sparse_json(
+            db_session, self._extended_json_fields, show_state_url, api_version))
+        return rv
+
+    def sparse_json(self, db_session, fields, show_state_url=False, api_version=1):
+        """
+        Get the JSON representation of the module build limited to the requested keys. The keys
+        which are not requested are not computed, so they don't cost any database query.
+
+        :param db_session: SQLAlchemy session object.
+        :param fields: an iterable of keys of json_field_columns.
+        :kwarg show_state_url: same as for extended_json.
+        :kwarg api_version: the API version to use when building the state URL
+        :return: a dictionary of the requested keys.
+        """
+        return {
+            field: self._get_json_field(db_session, field, show_state_url, api_version)
+            for field in fields
+        }
+
+    def _get_json_field(self, db_session, field, show_state_url, api_version):
+        if field == "arches":
+            return [arch.name for arch in self.arches]
+        elif field == "base_module_buildrequires":
+            return [br.short_json(True, False) for br in self.buildrequires]
+        elif field == "buildrequires":
+            return self.mmd().get_xmd().get("mbs", {}).get("buildrequires", {})
+        elif field == "component_builds":
+            return [build.id for build in self.component_builds]
+        elif field == "siblings":
+            return self.siblings(db_session)
+        elif field == "srpms":
+            return json.loads(self.srpms or "[]")
+        elif field == "state_name":
+            return INVERSE_BUILD_STATES[self.state]
+        elif field == "state_trace":
+            return [
                 {
                     "time": _utc_datetime_to_iso(record.state_time),
                     "state": record.state,
@@ -823,25 +969,22 @@ class ModuleBuild(MBSBase):
                     "reason": record.state_reason,
                 }
                 for record in self.state_trace(db_session, self.id)
-            ],
-            "state_url": state_url,
-            "stream_version": self.stream_version,
-            "virtual_streams": [virtual_stream.name for virtual_stream in self.virtual_streams],
-            "arches": [arch.name for arch in self.arches],
-        })
-
-        return rv
+            ]
+        elif field == "state_url":
+            if show_state_url:
+                return get_url_for("module_build", api_version=api_version, id=self.id)
+            return None
+        elif field == "tasks":
+            return self.tasks(db_session)
+        elif field in ("time_completed", "time_modified", "time_submitted"):
+            return _utc_datetime_to_iso(getattr(self, field))
+        elif field == "virtual_streams":
+            return [virtual_stream.name for virtual_stream in self.virtual_streams]
+        return getattr(self, field)
 
     def log_message(self, session, message):
         log.info(message)
-        log_msg = LogMessage(
-            component_build_id=None,
-            module_build_id=self.id,
-            message=message,
-            time_created=datetime.utcnow(),
-        )
-        session.add(log_msg)
-        session.commit()
+        LogMessage.add(session, message, self.id)
 
     def tasks(self, db_session):
         """
@@ -920,18 +1063,20 @@ class ModuleBuild(MBSBase):
 
             return result
 
-    def get_buildrequired_base_modules(self, db_session):
+    def get_buildrequired_base_modules(self, db_session, mmd=None):
         """
         Find the base modules in the modulemd's xmd/mbs/buildrequires section.
 
         :param db_session: the SQLAlchemy database session to use to query
+        :param Modulemd.ModuleStream mmd: the already loaded modulemd of the module build, if
+            any, so that it is not parsed again.
         :return: a list of ModuleBuild objects of the base modules that are buildrequired with the
             ordering in conf.base_module_names preserved
         :rtype: list
         :raises RuntimeError: when the xmd section isn't properly filled out by MBS
         """
         rv = []
-        xmd = self.mmd().get_xmd()
+        xmd = (mmd or self.mmd()).get_xmd()
         for bm in conf.base_module_names:
             try:
                 bm_dict = xmd["mbs"]["buildrequires"].get(bm)
@@ -1128,28 +1273,38 @@ class ComponentBuild(MBSBase):
             .all()
         )
 
-    def json(self, db_session):
-        retval = {
-            "id": self.id,
-            "package": self.package,
-            "format": self.format,
-            "task_id": self.task_id,
-            "state": self.state,
-            "state_reason": self.state_reason,
-            "module_build": self.module_id,
-            "nvr": self.nvr,
-        }
-
-        try:
-            # Koji is py2 only, so this fails if the main web process is
-            # running on py3.
-            import koji
-
-            retval["state_name"] = koji.BUILD_STATES.get(self.state)
-        except ImportError:
-            pass
+    # The keys of the JSON representations of a component build mapped to the columns they are
+    # computed from. This allows the API to only load and compute the requested keys.
+    json_field_columns = {
+        "batch": ("batch",),
+        "format": ("format",),
+        "id": ("id",),
+        "module_build": ("module_id",),
+        "nvr": ("nvr",),
+        "package": ("package",),
+        "state": ("state",),
+        "state_name": ("state",),
+        "state_reason": ("state_reason",),
+        "state_trace": ("id",),
+        "state_url": ("id",),
+        "task_id": ("task_id",),
+    }
+    _json_fields = (
+        "format",
+        "id",
+        "module_build",
+        "nvr",
+        "package",
+        "state",
+        "state_name",
+        "state_reason",
+        "task_id",
+    )
+    # The keys added by extended_json to the ones of json
+    _extended_json_fields = ("batch", "state_trace", "state_url")
 
-        return retval
+    def json(self, db_session):
+        return self.sparse_json(db_session, self._json_fields)
 
     def extended_json(self, db_session, show_state_url=False, api_version=1):
         """
@@ -1160,12 +1315,33 @@ class ComponentBuild(MBSBase):
         :kwarg api_version: the API version to use when building the state URL
         """
         json = self.json(db_session)
-        state_url = None
-        if show_state_url:
-            state_url = get_url_for("component_build", api_version=api_version, id=self.id)
-        json.update({
-            "batch": self.batch,
-            "state_trace": [
+        json.update(self.sparse_json(
+            db_session, self._extended_json_fields, show_state_url, api_version))
+        return json
+
+    def sparse_json(self, db_session, fields, show_state_url=False, api_version=1):
+        """
+        Get the JSON representation of the component build limited to the requested keys. The
+        keys which are not requested are not computed, so they don't cost any database query.
+
+        :param db_session: SQLAlchemy session object.
+        :param fields: an iterable of keys of json_field_columns.
+        :kwarg show_state_url: same as for extended_json.
+        :kwarg api_version: the API version to use when building the state URL
+        :return: a dictionary of the requested keys.
+        """
+        return {
+            field: self._get_json_field(db_session, field, show_state_url, api_version)
+            for field in fields
+        }
+
+    def _get_json_field(self, db_session, field, show_state_url, api_version):
+        if field == "module_build":
+            return self.module_id
+        elif field == "state_name":
+            return koji.BUILD_STATES.get(self.state)
+        elif field == "state_trace":
+            return [
                 {
                     "time": _utc_datetime_to_iso(record.state_time),
                     "state": record.state,
@@ -1173,23 +1349,16 @@ class ComponentBuild(MBSBase):
                     "reason": record.state_reason,
                 }
                 for record in self.state_trace(db_session)
-            ],
-            "state_url": state_url,
-        })
-
-        return json
+            ]
+        elif field == "state_url":
+            if show_state_url:
+                return get_url_for("component_build", api_version=api_version, id=self.id)
+            return None
+        return getattr(self, field)
 
     def log_message(self, session, message):
         log.info(message)
-        log_msg = LogMessage(
-            component_build_id=self.id,
-            module_build_id=self.module_id,
-            message=message,
-            time_created=datetime.utcnow(),
-        )
-
-        session.add(log_msg)
-        session.commit()
+        LogMessage.add(session, message, self.module_id, self.id)
 
     def __repr__(self):
         return "<ComponentBuild %s, %r, state: %r, task_id: %r, batch: %r, state_reason: %s>" % (
@@ -1276,10 +1445,55 @@ class LogMessage(MBSBase):
     __tablename__ = "log_messages"
     id = db.Column(db.Integer, primary_key=True)
     component_build_id = db.Column(db.Integer, db.ForeignKey("component_builds.id"), nullable=True)
-    module_build_id = db.Column(db.Integer, db.ForeignKey("module_builds.id"), nullable=False)
+    module_build_id = db.Column(
+        db.Integer, db.ForeignKey("module_builds.id"), nullable=False, index=True)
     message = db.Column(db.String, nullable=False)
     time_created = db.Column(db.DateTime, nullable=False)
 
+    @classmethod
+    def add(cls, session, message, module_build_id, component_build_id=None):
+        """
+        Stores a new log message.
+
+        Out of ``buffered_log_messages``, the message is committed right away. Otherwise it is
+        buffered and inserted together with the other buffered messages, either when the buffer
+        is full or when the outermost ``buffered_log_messages`` block ends.
+
+        :param session: SQLAlchemy session object.
+        :param str message: the message.
+        :param int module_build_id: the id of the module build the message is about.
+        :param int component_build_id: the id of the component build the message is about.
+        """
+        row = {
+            "component_build_id": component_build_id,
+            "module_build_id": module_build_id,
+            "message": message,
+            "time_created": datetime.utcnow(),
+        }
+        buffer = session.info.get(LOG_MESSAGES_BUFFER)
+        if buffer is None:
+            session.add(cls(**row))
+            session.commit()
+            return
+        buffer.append(row)
+        if len(buffer) >= conf.log_messages_buffer_size:
+            cls.insert_buffered(session)
+            # Commit them when the buffering ends even if no message is buffered anymore
+            session.info[LOG_MESSAGES_INSERTED] = True
+
+    @classmethod
+    def insert_buffered(cls, session):
+        """
+        Inserts the buffered log messages in a single statement. The transaction of the session
+        is not committed.
+
+        :param session: SQLAlchemy session object.
+        """
+        rows = session.info.get(LOG_MESSAGES_BUFFER)
+        if rows:
+            session.execute(cls.__table__.insert(), rows)
+            del rows[:]
+
     def json(self):
         retval = {
             "id": self.id,
@@ -1302,6 +1516,186 @@ class LogMessage(MBSBase):
         )
 
 
+@contextmanager
+def buffered_log_messages(session):
+    """
+    Buffer the log messages stored by ``LogMessage.add`` during the block, so that a handler
+    does not commit its transaction for every message.
+
+    The blocks can be nested, and the messages are inserted and committed when the outermost
+    block ends. If it ends with an exception, the transaction of the session is rolled back,
+    together with the messages already inserted in it. The messages still in the buffer are
+    then stored in their own transaction, or discarded if they cannot be, for example because
+    they refer to a build created in the rolled back transaction.
+
+    Unlike the messages stored out of the block, the buffered messages do not commit the changes
+    made before them, so when the block ends with an exception, only the changes committed
+    explicitly during the block are kept.
+
+    :param session: SQLAlchemy session object.
+    """
+    if LOG_MESSAGES_BUFFER in session.info:
+        yield
+        return
+
+    session.info[LOG_MESSAGES_BUFFER] = []
+    try:
+        yield
+    except Exception:
+        rows = session.info.pop(LOG_MESSAGES_BUFFER)
+        session.info.pop(LOG_MESSAGES_INSERTED, None)
+        session.rollback()
+        if rows:
+            try:
+                session.execute(LogMessage.__table__.insert(), rows)
+                session.commit()
+            except sqlalchemy.exc.SQLAlchemyError:
+                session.rollback()
+                log.warning("Discarding %d log messages stored before a failure", len(rows))
+        raise
+
+    rows = session.info.pop(LOG_MESSAGES_BUFFER)
+    inserted = session.info.pop(LOG_MESSAGES_INSERTED, False)
+    if rows:
+        session.execute(LogMessage.__table__.insert(), rows)
+    if rows or inserted:
+        session.commit()
+
+
+class ModuleBuildRPM(MBSBase):
+    """
+    Index of the RPMs built in a module build. It is used to find the module builds
+    containing particular RPM without querying the build system.
+    """
+    __tablename__ = "module_build_rpms"
+    id = db.Column(db.Integer, primary_key=True)
+    module_build_id = db.Column(
+        db.Integer, db.ForeignKey("module_builds.id"), nullable=False, index=True)
+    name = db.Column(db.String, nullable=False, index=True)
+    # NEVRA with the epoch always set, for example "foo-0:1.0-1.module_f30+1+abcdef12.x86_64"
+    nevra = db.Column(db.String, nullable=False, index=True)
+    # NVRA as it is used in the RPM filename, for example "foo-1.0-1.module_f30+1+abcdef12.x86_64"
+    nvra = db.Column(db.String, nullable=False, index=True)
+
+    __table_args__ = (
+        db.UniqueConstraint("module_build_id", "nevra", name="unique_module_build_rpm"),
+    )
+
+    @classmethod
+    def record(cls, db_session, module_build, rpms):
+        """
+        Replaces the indexed RPMs of the module build. The changes are not committed.
+
+        :param db_session: SQLAlchemy session object.
+        :param ModuleBuild module_build: the module build the RPMs were built in.
+        :param list rpms: list of RPM dicts as returned by Koji (with name, epoch, version,
+            release and arch keys).
+        """
+        module_build.indexed_rpms.delete(synchronize_session=False)
+        nevras = set()
+        for rpm in rpms:
+            nevra = kobo.rpmlib.make_nvra(rpm, force_epoch=True)
+            if nevra in nevras:
+                continue
+            nevras.add(nevra)
+            db_session.add(cls(
+                module_build_id=module_build.id,
+                name=rpm["name"],
+                nevra=nevra,
+                nvra=kobo.rpmlib.make_nvra(rpm),
+            ))
+
+    @classmethod
+    def module_build_ids_query(cls, db_session, rpm=None, name=None):
+        """
+        Returns the query of ids of module builds containing the RPM.
+
+        :param db_session: SQLAlchemy session object.
+        :param str rpm: NVRA, NEVRA or filename of the RPM.
+        :param str name: name of the RPM.
+        :return: SQLAlchemy query returning module build ids.
+        """
+        query = db_session.query(cls.module_build_id).distinct()
+        if rpm:
+            if rpm.endswith(".rpm"):
+                rpm = rpm[:-4]
+            query = query.filter(sqlalchemy.or_(cls.nvra == rpm, cls.nevra == rpm))
+        if name:
+            query = query.filter(cls.name == name)
+        return query
+
+    def __repr__(self):
+        return "<ModuleBuildRPM %s, module_build_id: %r>" % (self.nevra, self.module_build_id)
+
+
+class ModuleBuildShard(MBSBase):
+    """
+    Assignment of a module build to the queue of a Celery worker, see the "lease" shard
+    assignment in module_build_service.scheduler.shards.
+    """
+    __tablename__ = "module_build_shards"
+    # No foreign key, the tasks can be routed before the module build is committed
+    module_build_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    shard = db.Column(db.Integer, nullable=False, index=True)
+    # The number of tasks of the module build routed to the shard which are not done yet
+    pending = db.Column(db.Integer, nullable=False, default=0)
+    time_leased = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return "<ModuleBuildShard module_build_id: %r, shard: %r, pending: %r>" % (
+            self.module_build_id, self.shard, self.pending)
+
+
+class ModuleSubmissionJob(MBSBase):
+    """
+    A module build submission processed in the background, see
+    module_build_service.web.submission_jobs.
+    """
+    __tablename__ = "module_submission_jobs"
+    id = db.Column(db.Integer, primary_key=True)
+    owner = db.Column(db.String, nullable=False)
+    state = db.Column(db.Integer, nullable=False)
+    time_submitted = db.Column(db.DateTime, nullable=False)
+    time_completed = db.Column(db.DateTime)
+    # Comma separated IDs of the submitted module builds
+    module_build_ids_str = db.Column("module_build_ids", db.String)
+    error_status = db.Column(db.Integer)
+    error_message = db.Column(db.String)
+
+    @property
+    def module_build_ids(self):
+        if not self.module_build_ids_str:
+            return []
+        return [int(module_build_id) for module_build_id in self.module_build_ids_str.split(",")]
+
+    @module_build_ids.setter
+    def module_build_ids(self, module_build_ids):
+        self.module_build_ids_str = ",".join(str(i) for i in module_build_ids)
+
+    def json(self, api_version):
+        return {
+            "id": self.id,
+            "owner": self.owner,
+            "state": self.state,
+            "state_name": INVERSE_SUBMISSION_JOB_STATES[self.state],
+            "time_submitted": _utc_datetime_to_iso(self.time_submitted),
+            "time_completed": _utc_datetime_to_iso(self.time_completed),
+            "module_build_ids": self.module_build_ids,
+            "module_build_urls": [
+                get_url_for("module_build", api_version=api_version, id=module_build_id)
+                for module_build_id in self.module_build_ids
+            ],
+            "error": {
+                "status": self.error_status,
+                "message": self.error_message,
+            } if self.error_status else None,
+        }
+
+    def __repr__(self):
+        return "<ModuleSubmissionJob %r, owner: %r, state: %r>" % (
+            self.id, self.owner, INVERSE_SUBMISSION_JOB_STATES[self.state])
+
+
 def session_before_commit_handlers(session):
     # new and updated items
     for item in set(session.new) | set(session.dirty):
@@ -4,28 +4,44 @@
 # For an up-to-date version of this module, see:
 #   https://pagure.io/monitor-flask-sqlalchemy
 from __future__ import absolute_import
+from functools import wraps
+import hashlib
 import os
+import re
 import tempfile
+import threading
+import time
 
 from prometheus_client import (  # noqa: F401
     ProcessCollector,
     CollectorRegistry,
     Counter,
+    Gauge,
     multiprocess,
     Histogram,
     start_http_server,
+    values as prometheus_values,
 )
 from sqlalchemy import event
 
+from module_build_service.common import conf, log
+
 
 if not os.environ.get("prometheus_multiproc_dir"):
     os.environ.setdefault("prometheus_multiproc_dir", tempfile.mkdtemp())
+# The metrics are registered in `registry`. When the multiprocess directory was set before
+# prometheus_client was imported, their values are written to it and only the multiprocess
+# collector exposes them, so that they are not exposed twice.
 registry = CollectorRegistry()
-ProcessCollector(registry=registry)
-multiprocess.MultiProcessCollector(registry)
+if prometheus_values.ValueClass is prometheus_values.MutexValue:
+    exposed_registry = registry
+    ProcessCollector(registry=registry)
+else:
+    exposed_registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(exposed_registry)
 if os.getenv("MONITOR_STANDALONE_METRICS_SERVER_ENABLE", "false") == "true":
     port = os.getenv("MONITOR_STANDALONE_METRICS_SERVER_PORT", "10040")
-    start_http_server(int(port), registry=registry)
+    start_http_server(int(port), registry=exposed_registry)
 
 
 # Generic metrics
@@ -42,6 +58,16 @@ messaging_rx_failed_counter = Counter(
     "Number of received messages, which failed during processing",
     registry=registry,
 )
+messaging_rx_relevant_counter = Counter(
+    "messaging_rx_relevant",
+    "Number of received messages, which passed the relevance filter",
+    registry=registry,
+)
+messaging_rx_irrelevant_counter = Counter(
+    "messaging_rx_irrelevant",
+    "Number of received messages, which were dropped by the relevance filter",
+    registry=registry,
+)
 
 messaging_tx_to_send_counter = Counter(
     "messaging_tx_to_send", "Total number of messages to send", registry=registry
@@ -75,7 +101,186 @@ db_transaction_rollback_counter = Counter(
 )
 
 # Service-specific metrics
-# XXX: TODO
+consumer_worker_queue_depth_gauge = Gauge(
+    "consumer_worker_queue_depth",
+    "Number of events waiting in the queue of a consumer worker",
+    labelnames=["worker"],
+    multiprocess_mode="livesum",
+    registry=registry,
+)
+consumer_worker_queue_wait_histogram = Histogram(
+    "consumer_worker_queue_wait_seconds",
+    "Time spent by the events in the queues of the consumer workers",
+    registry=registry,
+)
+shard_lease_stolen_counter = Counter(
+    "shard_lease_stolen",
+    "Number of module builds assigned to a less busy worker than their own one",
+    registry=registry,
+)
+event_handler_histogram = Histogram(
+    "event_handler_duration_seconds",
+    "Duration of the MBS event handlers",
+    labelnames=["handler", "outcome"],  # outcome could be: 'success', 'failure'
+    registry=registry,
+)
+producer_task_histogram = Histogram(
+    "producer_task_duration_seconds",
+    "Duration of the periodic tasks of the producer",
+    labelnames=["task", "outcome"],
+    registry=registry,
+)
+remote_call_histogram = Histogram(
+    "remote_call_duration_seconds",
+    "Duration of the calls to Koji, SCM and other services",
+    labelnames=["service", "method", "outcome"],
+    registry=registry,
+)
+db_query_histogram = Histogram(
+    "db_query_duration_seconds",
+    "Duration of the SQL queries",
+    registry=registry,
+)
+db_queries_per_unit_histogram = Histogram(
+    "db_queries_per_unit",
+    "Number of SQL queries run by an API request or an event handler",
+    labelnames=["unit"],  # unit could be: 'request', 'handler'
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float("inf")),
+    registry=registry,
+)
+db_query_time_per_unit_histogram = Histogram(
+    "db_query_time_per_unit_seconds",
+    "Time spent in the SQL queries of an API request or an event handler",
+    labelnames=["unit"],
+    registry=registry,
+)
+auth_oidc_cache_hit_counter = Counter(
+    "auth_oidc_cache_hit",
+    "Number of OIDC token validations served from the cache",
+    registry=registry,
+)
+auth_oidc_cache_miss_counter = Counter(
+    "auth_oidc_cache_miss",
+    "Number of OIDC token validations which required the identity provider requests",
+    registry=registry,
+)
+auth_oidc_request_histogram = Histogram(
+    "auth_oidc_request_duration_seconds",
+    "Duration of the requests to the OIDC identity provider",
+    labelnames=["endpoint"],  # endpoint could be: 'introspection', 'userinfo'
+    registry=registry,
+)
+mse_resolver_lookups_histogram = Histogram(
+    "mse_resolver_lookups",
+    "Number of resolver lookups made to gather the dependencies of a submitted module",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, float("inf")),
+    registry=registry,
+)
+
+
+# time.perf_counter is not available in Python 2
+perf_counter = getattr(time, "perf_counter", time.time)
+
+
+def timed(histogram, **labels):
+    """
+    Decorator observing the duration of the calls of the decorated function in the histogram.
+
+    The observations are labeled by ``labels`` and by the outcome of the call, which is "success"
+    or "failure" when it raises an exception. The labeled metrics are created once, when the
+    function is decorated.
+
+    :param Histogram histogram: the histogram with an "outcome" label and the ``labels``.
+    """
+    observers = {
+        outcome: histogram.labels(outcome=outcome, **labels)
+        for outcome in ("success", "failure")
+    }
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            outcome = "failure"
+            start = perf_counter()
+            try:
+                result = func(*args, **kwargs)
+                outcome = "success"
+                return result
+            finally:
+                observers[outcome].observe(perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+_query_stats = threading.local()
+
+
+class QueryStats(object):
+    """
+    The number of SQL queries run by an API request or an event handler, and the time spent in
+    them. The queries are counted when they are run by the thread which started the stats.
+    """
+
+    def __init__(self, unit, name):
+        """
+        :param str unit: "request" or "handler".
+        :param str name: the name of the request or the handler, used in the log messages.
+        """
+        self.unit = unit
+        self.name = name
+        self.count = 0
+        self.duration = 0.0
+        self._previous = None
+
+    def start(self):
+        self._previous = getattr(_query_stats, "current", None)
+        _query_stats.current = self
+        return self
+
+    def stop(self):
+        _query_stats.current = self._previous
+        db_queries_per_unit_histogram.labels(unit=self.unit).observe(self.count)
+        db_query_time_per_unit_histogram.labels(unit=self.unit).observe(self.duration)
+        if conf.db_query_budget and self.count > conf.db_query_budget:
+            log.warning(
+                "The %s %s ran %d SQL queries, more than the budget of %d",
+                self.unit, self.name, self.count, conf.db_query_budget)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @staticmethod
+    def current():
+        """ Returns the stats started by the current thread, if any. """
+        return getattr(_query_stats, "current", None)
+
+
+_fingerprint_substitutions = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%\(\w+\)s|:\w+"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(...)"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def fingerprint_statement(statement):
+    """
+    Normalizes the SQL statement by replacing its literals and parameters by placeholders, so
+    that the statements differing only by their parameters have the same fingerprint.
+
+    :param str statement: the SQL statement.
+    :return: a tuple with the short hash of the normalized statement and the statement.
+    :rtype: tuple
+    """
+    normalized = statement
+    for pattern, replacement in _fingerprint_substitutions:
+        normalized = pattern.sub(replacement, normalized)
+    normalized = normalized.strip()
+    return hashlib.md5(normalized.encode("utf-8")).hexdigest()[:12], normalized
 
 
 def db_hook_event_listeners(target=None):
@@ -96,7 +301,28 @@ def db_hook_event_listeners(target=None):
     @event.listens_for(target, "handle_error")
     def receive_handle_error(exception_context):
         db_handle_error_counter.inc()
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start_time"):
+            # The query failed, so after_cursor_execute is not called for it
+            conn.info["query_start_time"].pop()
 
     @event.listens_for(target, "rollback")
     def receive_rollback(conn):
         db_transaction_rollback_counter.inc()
+
+    @event.listens_for(target, "before_cursor_execute")
+    def receive_before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(perf_counter())
+
+    @event.listens_for(target, "after_cursor_execute")
+    def receive_after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = perf_counter() - conn.info["query_start_time"].pop()
+        db_query_histogram.observe(duration)
+        stats = QueryStats.current()
+        if stats is not None:
+            stats.count += 1
+            stats.duration += duration
+        if conf.db_slow_query_threshold and duration * 1000 >= conf.db_slow_query_threshold:
+            fingerprint, normalized = fingerprint_statement(statement)
+            log.warning(
+                "Slow SQL query (%.3fs, fingerprint %s): %s", duration, fingerprint, normalized)
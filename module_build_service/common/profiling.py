@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+""" On-demand profiling of the API requests and the event handlers.
+
+The profiles are captured by cProfile and stored in ``profiling_dir``, which enables the
+profiling when it is set. Every profile is stored in its own file, which can be loaded by
+``pstats``, named after the time it was captured, the kind of the profiled code ("request" or
+"handler"), its name and the process ID.
+
+The profiles older than ``profiling_retention_days`` are deleted, and so are the oldest ones
+when the profiles take more than ``profiling_max_size`` MiB.
+"""
+
+from __future__ import absolute_import
+import cProfile
+from collections import namedtuple
+from datetime import datetime, timedelta
+import errno
+import os
+import pstats
+import re
+
+from module_build_service.common import conf, log
+
+PROFILE_SUFFIX = ".prof"
+_TIME_FORMAT = "%Y%m%dT%H%M%S%f"
+_PROFILE_NAME_RE = re.compile(r"^(?P<time>\d{8}T\d{12})-(?P<kind>\w+)-(?P<name>.*)-\d+\.prof$")
+_UNSAFE_CHARACTERS_RE = re.compile(r"[^\w.]+")
+
+ProfileInfo = namedtuple("ProfileInfo", ["path", "time", "kind", "name", "size"])
+
+
+class Profile(object):
+    """
+    The profile of an API request or an event handler, captured in the thread which started it.
+    """
+
+    def __init__(self, kind, name):
+        """
+        :param str kind: "request" or "handler".
+        :param str name: the name of the request or the handler.
+        """
+        self.kind = kind
+        self.name = name
+        self.path = None
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+        return self
+
+    def stop(self):
+        """
+        Stops the profiling and stores the profile to ``profiling_dir``. A failure to store it
+        is only logged, so the profiled code is not affected.
+        """
+        self._profile.disable()
+        filename = "{0}-{1}-{2}-{3}{4}".format(
+            datetime.utcnow().strftime(_TIME_FORMAT),
+            self.kind,
+            _UNSAFE_CHARACTERS_RE.sub("_", self.name),
+            os.getpid(),
+            PROFILE_SUFFIX,
+        )
+        try:
+            _makedirs(conf.profiling_dir)
+            self.path = os.path.join(conf.profiling_dir, filename)
+            self._profile.dump_stats(self.path)
+            log.info("Stored the profile of the %s %s to %s", self.kind, self.name, self.path)
+            cleanup_profiles()
+        except (IOError, OSError):
+            log.exception("Failed to store the profile of the %s %s", self.kind, self.name)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def list_profiles():
+    """
+    Returns the profiles stored in ``profiling_dir``, the oldest first.
+
+    :rtype: list of ProfileInfo
+    """
+    if not conf.profiling_dir or not os.path.isdir(conf.profiling_dir):
+        return []
+    profiles = []
+    for filename in os.listdir(conf.profiling_dir):
+        match = _PROFILE_NAME_RE.match(filename)
+        if not match:
+            continue
+        path = os.path.join(conf.profiling_dir, filename)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            # Deleted by another process meanwhile
+            continue
+        profiles.append(ProfileInfo(
+            path=path,
+            time=datetime.strptime(match.group("time"), _TIME_FORMAT),
+            kind=match.group("kind"),
+            name=match.group("name"),
+            size=size,
+        ))
+    profiles.sort(key=lambda profile: profile.time)
+    return profiles
+
+
+def cleanup_profiles():
+    """
+    Deletes the profiles older than ``profiling_retention_days`` and the oldest profiles
+    exceeding ``profiling_max_size``.
+    """
+    profiles = list_profiles()
+    cutoff = datetime.utcnow() - timedelta(days=conf.profiling_retention_days)
+    max_size = conf.profiling_max_size * 1024 * 1024
+    total_size = sum(profile.size for profile in profiles)
+    for profile in profiles:
+        if profile.time >= cutoff and total_size <= max_size:
+            break
+        try:
+            os.remove(profile.path)
+        except OSError:
+            pass
+        total_size -= profile.size
+
+
+def summarize_profile(path, limit=20, sort_by="cumulative"):
+    """
+    Returns the statistics of the functions taking the most time in the profile.
+
+    :param str path: the path to the profile.
+    :param int limit: the number of functions to return.
+    :param str sort_by: the pstats sort key.
+    :return: a tuple of the total time of the profile and a list of
+        (function, number of calls, total time, cumulative time) tuples.
+    :rtype: tuple
+    """
+    stats = pstats.Stats(path)
+    stats.sort_stats(sort_by)
+    functions = []
+    for func in stats.fcn_list[:limit]:
+        _, ncalls, tottime, cumtime, _ = stats.stats[func]
+        functions.append((pstats.func_std_string(func), ncalls, tottime, cumtime))
+    return stats.total_tt, functions
@@ -3,8 +3,23 @@
 from __future__ import absolute_import
 
 import requests
+from requests.compat import urlparse
 from requests.packages.urllib3.util.retry import Retry
 
+import module_build_service.common.monitor as monitor
+
+
+def observe_response(response, *args, **kwargs):
+    """
+    Response hook observing the time elapsed between sending the request and receiving the
+    response headers in the remote_call_duration_seconds histogram.
+    """
+    monitor.remote_call_histogram.labels(
+        service=urlparse(response.url).netloc,
+        method=response.request.method,
+        outcome="success" if response.ok else "failure",
+    ).observe(response.elapsed.total_seconds())
+
 
 def get_requests_session(auth=False):
     """
@@ -25,6 +40,7 @@ def get_requests_session(auth=False):
     adapter = requests.adapters.HTTPAdapter(max_retries=retry)
     session.mount("http://", adapter)
     session.mount("https://", adapter)
+    session.hooks["response"].append(observe_response)
     return session
 
 
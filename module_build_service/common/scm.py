@@ -11,6 +11,7 @@ import shutil
 import tempfile
 
 from module_build_service.common import log, conf
+import module_build_service.common.monitor as monitor
 from module_build_service.common.errors import (
     Forbidden,
     ValidationError,
@@ -170,6 +171,7 @@ class SCM(object):
         interval=conf.scm_net_retry_interval,
         wait_on=UnprocessableEntity,
     )
+    @monitor.timed(monitor.remote_call_histogram, service="scm", method="git")
     def _run(cmd, chdir=None, log_stdout=False):
         return SCM._run_without_retry(cmd, chdir, log_stdout)
 
@@ -18,10 +18,12 @@ from module_build_service.builder.MockModuleBuilder import (
 from module_build_service.common import conf, models
 from module_build_service.common.errors import StreamAmbigous
 from module_build_service.common.logger import level_flags
+from module_build_service.common.profiling import list_profiles, summarize_profile
 from module_build_service.common.utils import load_mmd_file, import_mmd
 import module_build_service.scheduler.consumer
 from module_build_service.scheduler.db_session import db_session
 import module_build_service.scheduler.local
+from module_build_service.scheduler.submit import record_module_build_rpms
 from module_build_service.web.submit import submit_module_build_from_yaml
 
 
@@ -260,6 +262,69 @@ def retire(identifier, confirm=False):
     logging.info("Module builds retired.")
 
 
+@manager.option(
+    "--reindex",
+    action="store_true",
+    default=False,
+    help="Index again also the module builds which are already indexed",
+)
+def index_module_build_rpms(reindex=False):
+    """ Records the RPMs built in done and ready module builds to the RPM index.
+    """
+    query = db_session.query(models.ModuleBuild).filter(
+        models.ModuleBuild.state.in_(
+            [models.BUILD_STATES["done"], models.BUILD_STATES["ready"]]),
+        models.ModuleBuild.koji_tag.isnot(None),
+    )
+    if not reindex:
+        indexed = db_session.query(models.ModuleBuildRPM.module_build_id)
+        query = query.filter(~models.ModuleBuild.id.in_(indexed))
+
+    module_builds = query.order_by(models.ModuleBuild.id).all()
+    logging.info("Indexing RPMs of %d module builds.", len(module_builds))
+    for build in module_builds:
+        record_module_build_rpms(build)
+        # Commit after every module build, so the progress is not lost on failure.
+        db_session.commit()
+
+    logging.info("RPMs of the module builds indexed.")
+
+
+@manager.option(
+    "profile",
+    nargs="?",
+    default=None,
+    help="File name of a profile to summarize, all the profiles are listed when omitted",
+)
+@manager.option(
+    "--limit", type=int, default=20, help="Number of functions shown in the summary")
+@manager.option(
+    "--sort",
+    default="cumulative",
+    help="Sort the functions in the summary by this pstats key, e.g. cumulative or tottime",
+)
+def profiles(profile=None, limit=20, sort="cumulative"):
+    """ Lists the profiles captured in the profiling directory, or summarizes one of them.
+    """
+    if not conf.profiling_dir:
+        raise ValueError("PROFILING_DIR is not configured")
+
+    if profile is None:
+        captured = list_profiles()
+        logging.info("Found %d profiles in %s:", len(captured), conf.profiling_dir)
+        for info in captured:
+            print("{0:%Y-%m-%d %H:%M:%S}  {1:<8}  {2:>8.1f} KiB  {3}".format(
+                info.time, info.kind, info.size / 1024.0, os.path.basename(info.path)))
+        return
+
+    total_time, functions = summarize_profile(
+        os.path.join(conf.profiling_dir, os.path.basename(profile)), limit, sort)
+    print("Total time: {0:.3f}s".format(total_time))
+    print("{0:>10}  {1:>10}  {2:>10}  {3}".format("ncalls", "tottime", "cumtime", "function"))
+    for function, ncalls, tottime, cumtime in functions:
+        print("{0:>10}  {1:>10.3f}  {2:>10.3f}  {3}".format(ncalls, tottime, cumtime, function))
+
+
 @console_script_help
 @manager.command
 def run(host=None, port=None, debug=None):
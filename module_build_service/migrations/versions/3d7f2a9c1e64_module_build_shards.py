@@ -0,0 +1,32 @@
+"""Add module_build_shards table
+
+Revision ID: 3d7f2a9c1e64
+Revises: b5f3e1c2a9d7
+Create Date: 2026-10-19 14:03:51.702114
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "3d7f2a9c1e64"
+down_revision = "b5f3e1c2a9d7"
+
+
+def upgrade():
+    op.create_table(
+        "module_build_shards",
+        sa.Column("module_build_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("shard", sa.Integer(), nullable=False),
+        sa.Column("pending", sa.Integer(), nullable=False),
+        sa.Column("time_leased", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("module_build_id"),
+    )
+    op.create_index(
+        op.f("ix_module_build_shards_shard"), "module_build_shards", ["shard"], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f("ix_module_build_shards_shard"), table_name="module_build_shards")
+    op.drop_table("module_build_shards")
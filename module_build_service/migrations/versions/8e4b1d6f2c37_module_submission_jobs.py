@@ -0,0 +1,33 @@
+"""Add module_submission_jobs table
+
+Revision ID: 8e4b1d6f2c37
+Revises: 3d7f2a9c1e64
+Create Date: 2026-10-19 15:12:08.405217
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "8e4b1d6f2c37"
+down_revision = "3d7f2a9c1e64"
+
+
+def upgrade():
+    op.create_table(
+        "module_submission_jobs",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("owner", sa.String(), nullable=False),
+        sa.Column("state", sa.Integer(), nullable=False),
+        sa.Column("time_submitted", sa.DateTime(), nullable=False),
+        sa.Column("time_completed", sa.DateTime(), nullable=True),
+        sa.Column("module_build_ids", sa.String(), nullable=True),
+        sa.Column("error_status", sa.Integer(), nullable=True),
+        sa.Column("error_message", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade():
+    op.drop_table("module_submission_jobs")
@@ -0,0 +1,22 @@
+"""Add an index on log_messages.module_build_id
+
+Revision ID: 9a4d3b6e2f18
+Revises: 8e4b1d6f2c37
+Create Date: 2026-10-19 18:36:52.114730
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9a4d3b6e2f18"
+down_revision = "8e4b1d6f2c37"
+
+
+def upgrade():
+    op.create_index(
+        op.f("ix_log_messages_module_build_id"), "log_messages", ["module_build_id"], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f("ix_log_messages_module_build_id"), table_name="log_messages")
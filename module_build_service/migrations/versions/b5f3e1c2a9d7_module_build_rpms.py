@@ -0,0 +1,48 @@
+"""Add module_build_rpms table
+
+Revision ID: b5f3e1c2a9d7
+Revises: 440a8a3c0d96
+Create Date: 2026-10-19 09:12:44.218305
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "b5f3e1c2a9d7"
+down_revision = "440a8a3c0d96"
+
+
+def upgrade():
+    op.create_table(
+        "module_build_rpms",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("module_build_id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("nevra", sa.String(), nullable=False),
+        sa.Column("nvra", sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(["module_build_id"], ["module_builds.id"], ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("module_build_id", "nevra", name="unique_module_build_rpm"),
+    )
+    op.create_index(
+        op.f("ix_module_build_rpms_module_build_id"),
+        "module_build_rpms",
+        ["module_build_id"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_module_build_rpms_name"), "module_build_rpms", ["name"], unique=False)
+    op.create_index(
+        op.f("ix_module_build_rpms_nevra"), "module_build_rpms", ["nevra"], unique=False)
+    op.create_index(
+        op.f("ix_module_build_rpms_nvra"), "module_build_rpms", ["nvra"], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f("ix_module_build_rpms_nvra"), table_name="module_build_rpms")
+    op.drop_index(op.f("ix_module_build_rpms_nevra"), table_name="module_build_rpms")
+    op.drop_index(op.f("ix_module_build_rpms_name"), table_name="module_build_rpms")
+    op.drop_index(op.f("ix_module_build_rpms_module_build_id"), table_name="module_build_rpms")
+    op.drop_table("module_build_rpms")
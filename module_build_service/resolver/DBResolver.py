@@ -171,20 +171,9 @@ class DBResolver(GenericResolver):
             module_br_alias.version == v,
             module_br_alias.context == c,
         )
-        query = query.order_by(
-            sqlalchemy.cast(models.ModuleBuild.version, sqlalchemy.BigInteger).desc())
-        all_builds = query.all()
-
-        # The `all_builds` list contains builds sorted by "build.version". We need only
-        # the builds with latest version, but in all contexts.
-        builds = []
-        latest_version = None
-        for build in all_builds:
-            if latest_version is None:
-                latest_version = build.version
-            if latest_version != build.version:
-                break
-            builds.append(build)
+        # We need only the builds with latest version, but in all contexts.
+        query = models.ModuleBuild._add_latest_version_filter(self.db_session, query)
+        builds = query.all()
 
         mmds = [build.mmd() for build in builds]
         nsvcs = [
@@ -1,13 +1,89 @@
 # -*- coding: utf-8 -*-
 # SPDX-License-Identifier: MIT
 from __future__ import absolute_import
+from collections import defaultdict
 from itertools import groupby
+import threading
+import time
 
 from module_build_service.common import conf, log, models
 from module_build_service.common.koji import get_session, koji_multicall_map
 from module_build_service.resolver.DBResolver import DBResolver
 
 
+class KojiTagSnapshot(object):
+    """
+    The module builds tagged in a Koji tag or in the tags it inherits, and the inheritance of
+    the tag, at the last Koji event when the snapshot is taken.
+    """
+
+    def __init__(self, koji_session, tag):
+        self.tag = tag
+        self.time_created = time.time()
+        self.event = koji_session.getLastEvent()
+
+        # List all the modular builds in the modular Koji tag.
+        # We cannot use latest=True here, because we need to get all the
+        # available streams of all modules. The stream is represented as
+        # "version" in Koji build and with latest=True, Koji would return
+        # only builds with the highest version.
+        module_builds = koji_session.listTagged(
+            tag, inherit=True, type="module", event=self.event["id"])
+        self.inheritance = [
+            parent["name"]
+            for parent in koji_session.getFullInheritance(tag, event=self.event["id"])
+        ]
+
+        # Note that the stream name in the b["version"] is normalized, "-" is replaced by "_".
+        self._module_builds = defaultdict(list)
+        for build in module_builds:
+            self._module_builds[(build["name"], build["version"])].append(build)
+
+    def get_module_builds(self, name, normalized_stream):
+        """
+        :param str name: Name of the module.
+        :param str normalized_stream: Stream of the module, with "-" replaced by "_".
+        :return list: List of builds as returned by KojiSession.listTagged method.
+        """
+        return list(self._module_builds.get((name, normalized_stream), []))
+
+
+# The latest snapshots of the Koji tags, by tag name
+_tag_snapshots = {}
+_tag_snapshots_lock = threading.Lock()
+
+# The real stream names of the Koji builds, by build id. Koji builds never change, so they are
+# kept until there are too many of them.
+_REAL_STREAMS_MAX_SIZE = 100000
+_real_streams = {}
+_real_streams_lock = threading.Lock()
+
+
+def get_koji_tag_snapshot(tag):
+    """
+    Returns the snapshot of the Koji tag. It is taken again when the previous one is older than
+    ``koji_tag_snapshot_ttl`` seconds.
+
+    :param str tag: The Koji tag.
+    :return KojiTagSnapshot: The snapshot of the tag.
+    """
+    with _tag_snapshots_lock:
+        snapshot = _tag_snapshots.get(tag)
+        if snapshot is None or time.time() - snapshot.time_created >= conf.koji_tag_snapshot_ttl:
+            snapshot = KojiTagSnapshot(get_session(conf, login=False), tag)
+            _tag_snapshots[tag] = snapshot
+            log.debug("Took snapshot of the Koji tag %s at event %d", tag, snapshot.event["id"])
+        return snapshot
+
+
+def clear_koji_caches():
+    """ Forget all the Koji tag snapshots and the real stream names of the Koji builds. """
+    with _tag_snapshots_lock:
+        _tag_snapshots.clear()
+    with _real_streams_lock:
+        _real_streams.clear()
+
+
 class KojiResolver(DBResolver):
     """
     Resolver using Koji server running in infrastructure.
@@ -15,7 +91,19 @@ class KojiResolver(DBResolver):
 
     backend = "koji"
 
-    def _filter_inherited(self, koji_session, module_builds, top_tag, event):
+    def __init__(self, db_session, config):
+        super(KojiResolver, self).__init__(db_session, config)
+        # The snapshots of the Koji tags, so that all the lookups of this resolver see the
+        # Koji tags at the same event.
+        self._tag_snapshots = {}
+
+    def _get_tag_snapshot(self, tag):
+        snapshot = self._tag_snapshots.get(tag)
+        if snapshot is None:
+            snapshot = self._tag_snapshots.setdefault(tag, get_koji_tag_snapshot(tag))
+        return snapshot
+
+    def _filter_inherited(self, module_builds, top_tag, inheritance):
         """
         Look at the tag inheritance and keep builds only from the topmost tag.
 
@@ -29,17 +117,13 @@ class KojiResolver(DBResolver):
         For normal RPMs, using latest=True for listTagged() call, Koji would automatically do
         this, but it does not understand streams, so we have to reimplement it here.
 
-        :param KojiSession koji_session: Koji session.
         :param list module_builds: List of builds as returned by KojiSession.listTagged method.
         :param str top_tag: The top Koji tag.
-        :param dict event: Koji event defining the time at which the `module_builds` have been
+        :param list inheritance: Names of the tags inherited by the `top_tag`, as returned by
+            KojiSession.getFullInheritance method at the time the `module_builds` have been
             fetched.
         :return list: Filtered list of builds.
         """
-        inheritance = [
-            tag["name"] for tag in koji_session.getFullInheritance(top_tag, event=event["id"])
-        ]
-
         def keyfunc(mb):
             return (mb["name"], mb["version"])
 
@@ -82,23 +166,43 @@ class KojiResolver(DBResolver):
         if not module_builds:
             return []
 
-        # Prepare list of build ids to pass them to Koji multicall later.
-        build_ids = [b["build_id"] for b in module_builds]
-
-        # Get the Koji builds from Koji.
-        koji_builds = koji_multicall_map(koji_session, koji_session.getBuild, build_ids)
-        if not koji_builds:
-            raise RuntimeError("Error during Koji multicall when filtering KojiResolver builds.")
+        # Prepare list of build ids with unknown real stream names to pass them to Koji
+        # multicall later.
+        with _real_streams_lock:
+            real_streams = {
+                b["build_id"]: _real_streams[b["build_id"]]
+                for b in module_builds if b["build_id"] in _real_streams
+            }
+        build_ids = []
+        for build in module_builds:
+            if build["build_id"] not in real_streams and build["build_id"] not in build_ids:
+                build_ids.append(build["build_id"])
+
+        if build_ids:
+            # Get the Koji builds from Koji.
+            koji_builds = koji_multicall_map(
+                koji_session, koji_session.getBuild, build_ids, method="getBuild")
+            if not koji_builds:
+                raise RuntimeError(
+                    "Error during Koji multicall when filtering KojiResolver builds.")
+
+            for build_id, koji_build in zip(build_ids, koji_builds):
+                real_streams[build_id] = koji_build.get("extra", {}).get("typeinfo", {}).\
+                    get("module", {}).get("stream")
+
+            with _real_streams_lock:
+                if len(_real_streams) + len(build_ids) > _REAL_STREAMS_MAX_SIZE:
+                    _real_streams.clear()
+                _real_streams.update((build_id, real_streams[build_id]) for build_id in build_ids)
 
         # Filter out modules with different stream in the Koji build metadata.
         ret = []
-        for module_build, koji_build in zip(module_builds, koji_builds):
-            koji_build_stream = koji_build.get("extra", {}).get("typeinfo", {}).get("module", {}).\
-                get("stream")
+        for module_build in module_builds:
+            koji_build_stream = real_streams[module_build["build_id"]]
             if not koji_build_stream:
                 log.warning(
                     "Not filtering out Koji build with id %d - it has no \"stream\" set in its "
-                    "metadata." % koji_build["build_id"])
+                    "metadata." % module_build["build_id"])
                 ret.append(module_build)
                 continue
 
@@ -107,7 +211,7 @@ class KojiResolver(DBResolver):
             else:
                 log.info(
                     "Filtering out Koji build %d - its stream \"%s\" does not match the requested "
-                    "stream \"%s\"" % (koji_build["build_id"], stream, koji_build_stream))
+                    "stream \"%s\"" % (module_build["build_id"], stream, koji_build_stream))
 
         return ret
 
@@ -127,17 +231,9 @@ class KojiResolver(DBResolver):
         if not tag:
             return []
 
-        koji_session = get_session(conf, login=False)
-        event = koji_session.getLastEvent()
-
-        # List all the modular builds in the modular Koji tag.
-        # We cannot use latest=True here, because we need to get all the
-        # available streams of all modules. The stream is represented as
-        # "version" in Koji build and with latest=True, Koji would return
-        # only builds with the highest version.
-        # We also cannot ask for particular `stream`, because Koji does not support that.
-        module_builds = koji_session.listTagged(
-            tag, inherit=True, type="module", package=name, event=event["id"])
+        # The listing of the modular builds in the modular Koji tag is shared by all the
+        # buildrequired modules.
+        snapshot = self._get_tag_snapshot(tag)
 
         # Filter out different streams. Note that the stream name in the b["version"] is
         # normalized. This makes it impossible to find out its original value. We therefore
@@ -148,12 +244,13 @@ class KojiResolver(DBResolver):
         # Example of such streams: "fedora-30" and "fedora_30". They will both be normalized to
         # "fedora_30".
         normalized_stream = stream.replace("-", "_")
-        module_builds = [b for b in module_builds if b["version"] == normalized_stream]
+        module_builds = snapshot.get_module_builds(name, normalized_stream)
 
         # Filter out builds inherited from non-top tag
-        module_builds = self._filter_inherited(koji_session, module_builds, tag, event)
+        module_builds = self._filter_inherited(module_builds, tag, snapshot.inheritance)
 
         # Filter out modules based on the real stream name.
+        koji_session = get_session(conf, login=False)
         module_builds = self._filter_based_on_real_stream_name(koji_session, module_builds, stream)
 
         # Find the latest builds of all modules. This does the following:
@@ -22,10 +22,16 @@ class MBSResolver(KojiResolver):
     backend = "mbs"
 
     def __init__(self, db_session, config):
-        self.db_session = db_session
+        super(MBSResolver, self).__init__(db_session, config)
         self.mbs_prod_url = config.mbs_url
         self._generic_error = "Failed to query MBS with query %r returned HTTP status %s"
 
+    @property
+    def concurrent_lookups(self):
+        # The local module builds are looked up in the database session, but there are none
+        # when building in Koji.
+        return conf.system in ["koji"]
+
     def _query_from_nsvc(self, name, stream, version=None, context=None, states=None):
         """
         Generates dict with MBS params query.
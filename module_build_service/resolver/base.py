@@ -26,6 +26,10 @@ class GenericResolver(six.with_metaclass(ABCMeta)):
     # For example, {'mbs': MBSResolver}
     backends = {}
 
+    # Whether the module lookups can be run concurrently from several threads, sharing the
+    # resolver. Resolvers querying the database session cannot.
+    concurrent_lookups = False
+
     @classmethod
     def register_backend_class(cls, backend_class):
         GenericResolver.backends[backend_class.backend] = backend_class
@@ -5,6 +5,9 @@ import concurrent.futures
 import threading
 
 from module_build_service.common import conf, log, models
+from module_build_service.common.logger import (
+    get_current_module_build_id, module_build_log_context
+)
 from module_build_service.scheduler import events
 from module_build_service.scheduler.db_session import db_session
 from module_build_service.scheduler.reuse import get_reusable_components, reuse_component
@@ -133,11 +136,25 @@ def continue_batch_build(config, module, builder, components=None):
         c.state = koji.BUILD_STATES["BUILDING"]
         components_to_build.append(c)
 
+    # The handlers scheduled while starting the builds must run at the end of the current
+    # handler, so use the queue of scheduled handlers of this thread in the executor threads.
+    # Log to the build log of the module build handled by this thread too.
+    scheduler_queue = events.scheduler.get_queue()
+    module_build_id = get_current_module_build_id()
+
+    def _start_build_component(c):
+        events.scheduler.bind_queue(scheduler_queue)
+        try:
+            with module_build_log_context(module_build_id):
+                start_build_component(db_session, builder, c)
+        finally:
+            events.scheduler.unbind_queue()
+
     # Start build of components in this batch.
     max_workers = config.num_threads_for_build_submissions
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = {
-            executor.submit(start_build_component, db_session, builder, c): c
+            executor.submit(_start_build_component, c): c
             for c in components_to_build
         }
         concurrent.futures.wait(futures)
@@ -22,6 +22,7 @@ import sqlalchemy.exc
 
 from module_build_service.common import log, conf, models
 from module_build_service.common.errors import IgnoreMessage
+from module_build_service.common.logger import module_build_log_context
 import module_build_service.common.messaging
 from module_build_service.common.messaging import default_messaging_backend
 import module_build_service.common.monitor as monitor
@@ -29,6 +30,10 @@ import module_build_service.common.monitor as monitor
 from module_build_service.scheduler import events
 from module_build_service.scheduler.db_session import db_session
 from module_build_service.scheduler.handlers import components, repos, modules, greenwave, tags
+from module_build_service.scheduler.profiling import profile_handler
+from module_build_service.scheduler.relevance import relevance_index
+from module_build_service.scheduler.route import apply_async_for_module_build
+from module_build_service.scheduler.workers import ModuleBuildWorkerPool
 
 
 def no_op_handler(*args, **kwargs):
@@ -67,11 +72,6 @@ class MBSConsumer(fedmsg.consumers.FedmsgConsumer):
 
     config_key = "mbsconsumer"
 
-    # It is set to the id of currently handled module build. It is used to
-    # group all the log messages associated with single module build to
-    # per module build log file.
-    current_module_build_id = None
-
     def __init__(self, hub):
         # Topic setting needs to be done *before* the call to `super`.
 
@@ -110,6 +110,19 @@ class MBSConsumer(fedmsg.consumers.FedmsgConsumer):
 
         self.sanity_check()
 
+        # The handlers run in Celery workers when Celery is configured, so there is no point
+        # in handling the events in parallel here.
+        if conf.consumer_workers > 0 and not conf.celery_broker_url:
+            self.worker_pool = ModuleBuildWorkerPool(conf.consumer_workers, self.run_handler)
+        else:
+            self.worker_pool = None
+
+    def stop(self):
+        if self.worker_pool is not None:
+            log.info("Waiting for the consumer workers to handle the queued events.")
+            self.worker_pool.shutdown()
+        super(MBSConsumer, self).stop()
+
     def shutdown(self):
         log.info("Scheduling shutdown.")
         from moksha.hub.reactor import reactor
@@ -138,6 +151,26 @@ class MBSConsumer(fedmsg.consumers.FedmsgConsumer):
                 )
             )
 
+    def check_event_relevance(self, event_info):
+        """
+        Drop the event if it is not related to any module build, before any database query.
+
+        :raises IgnoreMessage: if the event is not related to any module build.
+        """
+        if not conf.message_relevance_filter:
+            return
+        try:
+            relevant = relevance_index.is_relevant(db_session, event_info)
+        finally:
+            db_session.remove()
+        if not relevant:
+            monitor.messaging_rx_irrelevant_counter.inc()
+            raise IgnoreMessage(
+                "Ignoring {} event from message {}, which is not related to any module "
+                "build".format(event_info["event"], event_info["msg_id"])
+            )
+        monitor.messaging_rx_relevant_counter.inc()
+
     def consume(self, message):
         monitor.messaging_rx_counter.inc()
 
@@ -152,6 +185,7 @@ class MBSConsumer(fedmsg.consumers.FedmsgConsumer):
             try:
                 event_info = self.get_abstracted_event_info(message)
                 self.validate_event(event_info)
+                self.check_event_relevance(event_info)
             except IgnoreMessage as e:
                 log.debug(str(e))
                 return
@@ -261,25 +295,44 @@ class MBSConsumer(fedmsg.consumers.FedmsgConsumer):
             log.debug("No module associated with msg %s", event_info["msg_id"])
             return
 
-        MBSConsumer.current_module_build_id = build.id
-
-        log.info("Calling %s", idx)
-
         kwargs = event_info.copy()
         kwargs.pop("event")
 
+        if self.worker_pool is not None:
+            log.info("Queuing %s", idx)
+            self.worker_pool.submit(build.id, handler, kwargs, idx)
+            return
+
+        self.run_handler(build.id, handler, kwargs, idx)
+
+    def run_handler(self, module_build_id, handler, kwargs, idx):
+        """
+        Call the event handler, and mark the module build as failed if it fails.
+
+        :param int module_build_id: the ID of the module build of the event.
+        :param handler: the event handler.
+        :param dict kwargs: the arguments of the event handler.
+        :param str idx: the description of the event used in the log messages.
+        """
+        # Group all the log messages associated with the module build in its build log
+        with module_build_log_context(module_build_id):
+            self._run_handler(module_build_id, handler, kwargs, idx)
+
+    def _run_handler(self, module_build_id, handler, kwargs, idx):
+        log.info("Calling %s", idx)
+
         try:
             if conf.celery_broker_url:
                 # handlers are also Celery tasks, when celery_broker_url is configured,
-                # call "delay" method to run the handlers as Celery async tasks
-                func = getattr(handler, "delay")
-                func(**kwargs)
+                # run the handlers as Celery async tasks routed by the module build id
+                apply_async_for_module_build(handler, module_build_id, **kwargs)
             else:
-                handler(**kwargs)
+                with profile_handler(module_build_id, handler.__name__):
+                    handler(**kwargs)
         except Exception as e:
             log.exception("Could not process message handler.")
             db_session.rollback()
-            db_session.refresh(build)
+            build = models.ModuleBuild.get_by_id(db_session, module_build_id)
             build.transition(
                 db_session,
                 conf,
@@ -292,7 +345,6 @@ class MBSConsumer(fedmsg.consumers.FedmsgConsumer):
             # Allow caller to do something when error is occurred.
             raise
         finally:
-            MBSConsumer.current_module_build_id = None
             log.debug("Done with %s", idx)
 
 
@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
 # SPDX-License-Identifier: MIT
 from __future__ import absolute_import
+from collections import OrderedDict
 import errno
+import glob
+import gzip
+import hashlib
+import json
 import os
 import shutil
 import tempfile
@@ -9,12 +14,14 @@ import tempfile
 import dnf
 import kobo.rpmlib
 import koji
+import requests
 import six.moves.xmlrpc_client as xmlrpclib
 
 from module_build_service.common import conf, log, models, scm
-from module_build_service.common.errors import UnprocessableEntity
+from module_build_service.common.cache import make_bounded_region
 from module_build_service.common.koji import get_session, koji_retrying_multicall_map
 from module_build_service.common.modulemd import Modulemd
+from module_build_service.common.request_utils import requests_session
 from module_build_service.common.resolve import (
     expand_single_mse_streams, get_compatible_base_module_mmds
 )
@@ -142,10 +149,28 @@ def add_default_modules(mmd):
     return defaults_added
 
 
+# The commits the branches of the default modules repos point to, by (SCM URL, stream)
+_default_modules_commits = make_bounded_region("dogpile.cache.memory", max_entries=256)
+# The default modules, by (SCM URL, commit). The content of a commit never changes.
+_default_modules = make_bounded_region("dogpile.cache.memory", max_entries=64)
+_rawhide_version = make_bounded_region("dogpile.cache.memory", max_entries=1)
+
+
+def clear_default_modules_caches():
+    """ Forget the cached default modules and rawhide version. """
+    _default_modules_commits.invalidate()
+    _default_modules.invalidate()
+    _rawhide_version.invalidate()
+
+
 def _get_default_modules(stream, default_modules_scm_url):
     """
     Get the base module's default modules.
 
+    The branch of the default modules repo is resolved to a commit at most every
+    ``default_modules_ref_ttl`` seconds, and the default modules of a commit are only retrieved
+    once.
+
     :param str stream: the stream of the base module
     :param str default_modules_scm_url: the SCM URL to the default modules
     :return: a dictionary where the keys are default module names and the values are default module
@@ -153,39 +178,82 @@ def _get_default_modules(stream, default_modules_scm_url):
     :rtype: dict
     :raise RuntimeError: if no default modules can be retrieved for that stream
     """
+    try:
+        commit = _default_modules_commits.get_or_create(
+            (default_modules_scm_url, stream),
+            lambda: _get_default_modules_commit(stream, default_modules_scm_url),
+            expiration_time=conf.default_modules_ref_ttl,
+        )
+        default_modules = _default_modules.get_or_create(
+            (default_modules_scm_url, commit),
+            lambda: _load_default_modules(commit, default_modules_scm_url),
+        )
+    except:  # noqa: E722
+        msg = "Failed to retrieve the default modules"
+        log.exception(msg)
+        raise RuntimeError(msg)
+    return dict(default_modules)
+
+
+def _get_default_modules_commit(stream, default_modules_scm_url):
+    """
+    Get the commit of the default modules repo branch of the base module stream.
+
+    :param str stream: the stream of the base module
+    :param str default_modules_scm_url: the SCM URL to the default modules
+    :return: the commit hash
+    :rtype: str
+    :raise RuntimeError: if the repo has no branch for that stream
+    """
+    scm_obj = scm.SCM(default_modules_scm_url)
+    branches = [stream]
+    if conf.uses_rawhide:
+        branches.append(conf.rawhide_branch)
+    log.debug("Getting the commits of the branches %s of %s", branches, default_modules_scm_url)
+    cmd = ["git", "ls-remote", scm_obj.repository] + ["refs/heads/" + b for b in branches]
+    output = scm.SCM._run(cmd)[1]
+    # git-ls-remote prints output like this:
+    # bf028e573e7c18533d89c7873a411de92d4d913e	refs/heads/master
+    commits = {}
+    for line in output.decode("utf-8").splitlines():
+        commit, _, ref = line.partition("\t")
+        commits[ref[len("refs/heads/"):]] = commit
+
+    if stream in commits:
+        return commits[stream]
+    # If there is no branch for the stream, try seeing if this is a rawhide build. In this case,
+    # the branch should actually be conf.rawhide_branch. The check to see if this is a rawhide
+    # build is done only then, since it avoids an unnecessary query to Koji.
+    if conf.rawhide_branch in commits:
+        log.debug(
+            "The default modules repo has no branch %s. Trying to determine if this stream "
+            "represents rawhide.",
+            stream,
+        )
+        if _get_rawhide_version() == stream:
+            log.debug("The stream represents rawhide, will use the branch %s", conf.rawhide_branch)
+            return commits[conf.rawhide_branch]
+    raise RuntimeError(
+        "The default modules repo {} has no branch {}".format(default_modules_scm_url, stream))
+
+
+def _load_default_modules(commit, default_modules_scm_url):
+    """
+    Get the default modules defined in a commit of the default modules repo.
+
+    :param str commit: the commit hash
+    :param str default_modules_scm_url: the SCM URL to the default modules
+    :return: a dictionary where the keys are default module names and the values are default module
+        streams
+    :rtype: dict
+    """
     scm_obj = scm.SCM(default_modules_scm_url)
     temp_dir = tempfile.mkdtemp()
     try:
         log.debug("Cloning the default modules repo at %s", default_modules_scm_url)
         scm_obj.clone(temp_dir)
-        log.debug("Checking out the branch %s", stream)
-        try:
-            scm_obj.checkout_ref(stream)
-        except UnprocessableEntity:
-            # If the checkout fails, try seeing if this is a rawhide build. In this case, the branch
-            # should actually be conf.rawhide_branch. The check to see if this is a rawhide build
-            # is done after the first checkout failure for performance reasons, since it avoids an
-            # unnecessary connection and query to Koji.
-            if conf.uses_rawhide:
-                log.debug(
-                    "Checking out the branch %s from the default modules repo failed. Trying to "
-                    "determine if this stream represents rawhide.",
-                    stream,
-                )
-                if _get_rawhide_version() == stream:
-                    log.debug(
-                        "The stream represents rawhide, will try checking out %s",
-                        conf.rawhide_branch,
-                    )
-                    # There's no try/except here because we want the outer except block to
-                    # catch this in the event the rawhide branch doesn't exist
-                    scm_obj.checkout_ref(conf.rawhide_branch)
-                else:
-                    # If it's not a rawhide build, then the branch should have existed
-                    raise
-            else:
-                # If it's not a rawhide build, then the branch should have existed
-                raise
+        log.debug("Checking out the commit %s", commit)
+        scm_obj.checkout_ref(commit)
 
         idx = Modulemd.ModuleIndex.new()
         idx.update_from_defaults_directory(
@@ -194,16 +262,24 @@ def _get_default_modules(stream, default_modules_scm_url):
             strict=True,
         )
         return idx.get_default_streams()
-    except:  # noqa: E722
-        msg = "Failed to retrieve the default modules"
-        log.exception(msg)
-        raise RuntimeError(msg)
     finally:
         shutil.rmtree(temp_dir)
 
 
-@retry(wait_on=(xmlrpclib.ProtocolError, koji.GenericError))
 def _get_rawhide_version():
+    """
+    Get the rawhide version, which is queried from Koji at most every ``rawhide_version_ttl``
+    seconds.
+
+    :return: the rawhide version (e.g. "f32")
+    :rtype: str
+    """
+    return _rawhide_version.get_or_create(
+        "rawhide", _query_rawhide_version, expiration_time=conf.rawhide_version_ttl)
+
+
+@retry(wait_on=(xmlrpclib.ProtocolError, koji.GenericError))
+def _query_rawhide_version():
     """
     Query Koji to find the rawhide version from the build target.
 
@@ -254,28 +330,22 @@ def handle_collisions_with_base_module_rpms(mmd, arches):
         ", ".join(bm_tags),
     )
     koji_session = get_session(conf, login=False)
-    bm_rpms = _get_rpms_from_tags(koji_session, list(bm_tags), arches)
-    # The keys are base module RPM names and the values are sets of RPM NEVRAs with that name
-    name_to_nevras = {}
-    for bm_rpm in bm_rpms:
-        rpm_name = kobo.rpmlib.parse_nvra(bm_rpm)["name"]
-        name_to_nevras.setdefault(rpm_name, set())
-        name_to_nevras[rpm_name].add(bm_rpm)
-    # Clear this out of RAM as soon as possible since this value can be huge
-    del bm_rpms
+    bm_indexes = _get_rpm_indexes(koji_session, list(bm_tags), arches)
 
     log.debug(
         "Querying Koji for the latest RPMs from the other buildrequired modules from the tags: %s",
         ", ".join(non_bm_tags),
     )
+    non_bm_names = set()
+    for index in _get_rpm_indexes(koji_session, list(non_bm_tags), arches):
+        non_bm_names.update(index)
+
     # This will contain any NEVRAs of RPMs in the base module tag with the same name as those in the
     # buildrequired modules
     conflicts = set()
-    non_bm_rpms = _get_rpms_from_tags(koji_session, list(non_bm_tags), arches)
-    for rpm in non_bm_rpms:
-        rpm_name = kobo.rpmlib.parse_nvra(rpm)["name"]
-        if rpm_name in name_to_nevras:
-            conflicts = conflicts | name_to_nevras[rpm_name]
+    for index in bm_indexes:
+        for rpm_name in non_bm_names.intersection(index):
+            conflicts.update(index[rpm_name])
 
     # Add the conflicting NEVRAs to `ursine_rpms` so the Conflicts are later generated for them
     # in the KojiModuleBuilder.
@@ -283,36 +353,128 @@ def handle_collisions_with_base_module_rpms(mmd, arches):
     mmd.set_xmd(xmd)
 
 
-def _get_rpms_from_tags(koji_session, tags, arches):
+class _RPMIndexes(object):
+    """
+    Indexes of the RPM NEVRAs by RPM name, stored in ``{conf.cache_dir}/rpm_index`` so that they
+    are shared by all the MBS processes on the host.
+
+    An index is identified by a kind, a name and a version, e.g. a Koji tag and the event of its
+    last change. When an index of a newer version is stored, the older versions are removed.
+
+    The indexes are loaded from the disk whenever they are used rather than kept in memory, since
+    the indexes of the base module tags are large.
+    """
+
+    @staticmethod
+    def _get_paths(kind, name, version):
+        name_hash = hashlib.sha1(name.encode("utf-8")).hexdigest()[:16]
+        prefix = os.path.join(conf.cache_dir, "rpm_index", "{}-{}-".format(kind, name_hash))
+        return prefix, "{}{}.json.gz".format(prefix, version)
+
+    def get(self, kind, name, version):
+        """
+        Returns the stored index.
+
+        :param str kind: the kind of the index, e.g. "tag".
+        :param str name: the name of the indexed RPMs source, e.g. the name of the Koji tag.
+        :param str version: the version of the indexed RPMs source.
+        :return: a dictionary where the keys are RPM names and the values are lists of NEVRAs,
+            or None if no index of that version is stored.
+        :rtype: dict
+        """
+        _, path = self._get_paths(kind, name, version)
+        try:
+            with gzip.open(path, "rb") as f:
+                return json.loads(f.read().decode("utf-8"))
+        except (EOFError, IOError, OSError, ValueError):
+            return None
+
+    def add(self, kind, name, version, nevras):
+        """
+        Indexes the NEVRAs and stores the index.
+
+        :param str kind: the kind of the index, e.g. "tag".
+        :param str name: the name of the indexed RPMs source, e.g. the name of the Koji tag.
+        :param str version: the version of the indexed RPMs source.
+        :param list nevras: the NEVRAs to index.
+        :return: a dictionary where the keys are RPM names and the values are lists of NEVRAs.
+        :rtype: dict
+        """
+        log.debug("Indexing the RPMs of the %s %s at %s", kind, name, version)
+        index = {}
+        for nevra in nevras:
+            index.setdefault(kobo.rpmlib.parse_nvra(nevra)["name"], []).append(nevra)
+        prefix, path = self._get_paths(kind, name, version)
+        self._store(prefix, path, index)
+        return index
+
+    @staticmethod
+    def _store(prefix, path, index):
+        index_dir = os.path.dirname(path)
+        try:
+            # exist_ok=True can't be used in Python 2
+            os.makedirs(index_dir, mode=0o0770)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                log.exception("Failed to create the cache directory %s", index_dir)
+                return
+        try:
+            # Write to a temporary file first, so that other processes never load a partial index
+            fd, temp_path = tempfile.mkstemp(dir=index_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f, gzip.GzipFile(fileobj=f, mode="wb") as gz:
+                gz.write(json.dumps(index).encode("utf-8"))
+            os.rename(temp_path, path)
+        except (IOError, OSError):
+            log.exception("Failed to store the RPM index %s", path)
+            return
+        for old_path in glob.glob(prefix + "*.json.gz"):
+            if old_path != path:
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+
+
+rpm_indexes = _RPMIndexes()
+
+
+def _get_rpm_indexes(koji_session, tags, arches):
     """
-    Get the RPMs in NEVRA form (tagged or external repos) of the input tags.
+    Get the indexes of the RPMs (tagged or in external repos) of the input tags.
+
+    The index of the tagged RPMs of a tag is reused until the tag changes, and the index of an
+    external repo until its repodata changes. The tagged RPMs of all the changed tags are listed
+    in a single Koji multicall.
 
     :param koji.ClientSession koji_session: the Koji session to use to query
     :param list tags: the list of tags to get the RPMs from
     :param list arches: the arches to limit the external repo queries to
-    :return: the set of RPMs in NEVRA form of the input tags
-    :rtype: set
+    :return: the list of indexes, which are dictionaries where the keys are RPM names and the
+        values are lists of RPM NEVRAs
+    :rtype: list
     :raises RuntimeError: if the Koji query fails
     """
     log.debug("Get the latest RPMs from the tags: %s", ", ".join(tags))
-    kwargs = [{"latest": True, "inherit": True}] * len(tags)
-    tagged_results = koji_retrying_multicall_map(
-        koji_session, koji_session.listTaggedRPMS, tags, kwargs,
+    events = koji_retrying_multicall_map(
+        koji_session, koji_session.tagLastChangeEvent, tags, [{"inherit": True}] * len(tags),
+        method="tagLastChangeEvent",
     )
-    if not tagged_results:
+    if not events:
         raise RuntimeError(
-            "Getting the tagged RPMs of the following Koji tags failed: {}"
+            "Getting the last change events of the following Koji tags failed: {}"
             .format(", ".join(tags))
         )
 
-    nevras = set()
-    for tagged_result in tagged_results:
-        rpms, _ = tagged_result
-        for rpm_dict in rpms:
-            nevra = kobo.rpmlib.make_nvra(rpm_dict, force_epoch=True)
-            nevras.add(nevra)
+    indexes = [rpm_indexes.get("tag", tag, str(event)) for tag, event in zip(tags, events)]
+    changed = [i for i, index in enumerate(indexes) if index is None]
+    if changed:
+        changed_tags = [tags[i] for i in changed]
+        tagged_rpms = _get_tagged_rpms(koji_session, changed_tags, [events[i] for i in changed])
+        for i, tag, nevras in zip(changed, changed_tags, tagged_rpms):
+            indexes[i] = rpm_indexes.add("tag", tag, str(events[i]), nevras)
 
-    repo_results = koji_retrying_multicall_map(koji_session, koji_session.getExternalRepoList, tags)
+    repo_results = koji_retrying_multicall_map(
+        koji_session, koji_session.getExternalRepoList, tags, method="getExternalRepoList")
     if not repo_results:
         raise RuntimeError(
             "Getting the external repos of the following Koji tags failed: {}"
@@ -320,12 +482,91 @@ def _get_rpms_from_tags(koji_session, tags, arches):
         )
     for repos in repo_results:
         for repo in repos:
-            # Use the repo ID in the cache directory name in case there is more than one external
-            # repo associated with the tag
-            cache_dir_name = "{}-{}".format(repo["tag_name"], repo["external_repo_id"])
-            nevras = nevras | _get_rpms_in_external_repo(repo["url"], arches, cache_dir_name)
+            version = _get_repodata_checksum(repo["url"], arches)
+            index = rpm_indexes.get("repo", repo["url"], version)
+            if index is None:
+                # Use the repo ID in the cache directory name in case there is more than one
+                # external repo associated with the tag
+                cache_dir_name = "{}-{}".format(repo["tag_name"], repo["external_repo_id"])
+                nevras = _get_rpms_in_external_repo(repo["url"], arches, cache_dir_name)
+                index = rpm_indexes.add("repo", repo["url"], version, nevras)
+            indexes.append(index)
+
+    return indexes
+
+
+def _get_tagged_rpms(koji_session, tags, events):
+    """
+    Get the latest RPMs in NEVRA form tagged in the input tags at the input events.
+
+    :param koji.ClientSession koji_session: the Koji session to use to query
+    :param list tags: the tags to get the RPMs from
+    :param list events: the Koji events, one per tag
+    :return: the lists of RPMs in NEVRA form, one per tag
+    :rtype: list
+    :raises RuntimeError: if the Koji query fails
+    """
+    tagged_results = koji_retrying_multicall_map(
+        koji_session, koji_session.listTaggedRPMS, tags,
+        [{"latest": True, "inherit": True, "event": event} for event in events],
+        method="listTaggedRPMS",
+    )
+    if not tagged_results:
+        raise RuntimeError(
+            "Getting the tagged RPMs of the following Koji tags failed: {}"
+            .format(", ".join(tags))
+        )
+    return [
+        [kobo.rpmlib.make_nvra(rpm_dict, force_epoch=True) for rpm_dict in rpms]
+        for rpms, _ in tagged_results
+    ]
 
-    return nevras
+
+def _get_repo_arch_urls(repo_url, arches):
+    """
+    Get the URLs of the external repo for the provided arches.
+
+    :param str repo_url: the URL of the external repo with the "$arch" variable included
+    :param list arches: the list of arches
+    :return: a dictionary where the keys are the canonical arches and the values are the URLs
+    :rtype: dict
+    :raises ValueError: if there is no "$arch" variable in repo URL
+    """
+    if "$arch" not in repo_url:
+        raise ValueError(
+            "The external repo {} does not contain the $arch variable".format(repo_url)
+        )
+    # Convert arch to canon_arch. This handles cases where Koji "i686" arch is mapped to
+    # "i386" when generating RPM repository.
+    return OrderedDict(
+        (koji.canonArch(arch), repo_url.replace("$arch", koji.canonArch(arch))) for arch in arches)
+
+
+def _get_repodata_checksum(repo_url, arches):
+    """
+    Get a checksum of the repodata of the external repo for the provided arches, which changes
+    whenever the content of the external repo changes.
+
+    :param str repo_url: the URL of the external repo with the "$arch" variable included
+    :param list arches: the list of arches to query the external repo for
+    :return: the checksum
+    :rtype: str
+    :raise RuntimeError: if the repodata couldn't be downloaded
+    :raises ValueError: if there is no "$arch" variable in repo URL
+    """
+    checksum = hashlib.sha256()
+    for canon_arch, repo_arch_url in _get_repo_arch_urls(repo_url, arches).items():
+        repomd_url = repo_arch_url.rstrip("/") + "/repodata/repomd.xml"
+        try:
+            rv = requests_session.get(repomd_url, timeout=conf.dnf_timeout)
+            rv.raise_for_status()
+        except requests.exceptions.RequestException:
+            msg = "Failed to load the external repos"
+            log.exception(msg)
+            raise RuntimeError(msg)
+        checksum.update(canon_arch.encode("utf-8"))
+        checksum.update(rv.content)
+    return checksum.hexdigest()
 
 
 def _get_rpms_in_external_repo(repo_url, arches, cache_dir_name):
@@ -340,10 +581,7 @@ def _get_rpms_in_external_repo(repo_url, arches, cache_dir_name):
     :raise RuntimeError: if the cache is not writeable or the external repo couldn't be loaded
     :raises ValueError: if there is no "$arch" variable in repo URL
     """
-    if "$arch" not in repo_url:
-        raise ValueError(
-            "The external repo {} does not contain the $arch variable".format(repo_url)
-        )
+    repo_arch_urls = _get_repo_arch_urls(repo_url, arches)
 
     base = dnf.Base()
     try:
@@ -372,12 +610,8 @@ def _get_rpms_in_external_repo(repo_url, arches, cache_dir_name):
         base.reset(repos=True, goal=True, sack=True)
 
         # Add a separate repo for each architecture
-        for arch in arches:
-            # Convert arch to canon_arch. This handles cases where Koji "i686" arch is mapped to
-            # "i386" when generating RPM repository.
-            canon_arch = koji.canonArch(arch)
+        for canon_arch, repo_arch_url in repo_arch_urls.items():
             repo_name = "repo_{}".format(canon_arch)
-            repo_arch_url = repo_url.replace("$arch", canon_arch)
             base.repos.add_new_repo(
                 repo_name, dnf_conf, baseurl=[repo_arch_url], minrate=conf.dnf_minrate,
             )
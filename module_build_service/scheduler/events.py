@@ -14,10 +14,13 @@ however Brew sends to topic brew.build.complete, etc.
 
 from __future__ import absolute_import
 from functools import wraps
+import inspect
 import sched
+import threading
 import time
 
 from module_build_service.common import log
+import module_build_service.common.monitor as monitor
 
 
 KOJI_BUILD_CHANGE = "koji_build_change"
@@ -26,8 +29,20 @@ KOJI_REPO_CHANGE = "koji_repo_change"
 MBS_MODULE_STATE_CHANGE = "mbs_module_state_change"
 GREENWAVE_DECISION_UPDATE = "greenwave_decision_update"
 
+try:
+    # python3
+    getargspec = inspect.getfullargspec
+except AttributeError:
+    # python2
+    getargspec = inspect.getargspec
 
-class Scheduler(sched.scheduler):
+# The argument names of the MBS event handlers, by the names of their Celery tasks. They are
+# recorded when the handlers are defined, so that routing the tasks does not need to import and
+# inspect the handlers again.
+handler_args = {}
+
+
+class Scheduler(sched.scheduler, object):
     """
     Subclass of `sched.scheduler` allowing to schedule handlers calls.
 
@@ -39,8 +54,46 @@ class Scheduler(sched.scheduler):
     the `add` method. The handlers should use `mbs_event_handler` decorator which ensures that
     the `run` method is called at the end of handler's execution and other scheduler handlers
     are executed.
+
+    All the threads share the same queue of scheduled handlers, unless a thread binds its own
+    queue using the `bind_queue` method. This is used when handlers run in parallel threads, so
+    that each of them only runs the handlers it scheduled itself.
     """
 
+    def __init__(self, *args, **kwargs):
+        self._local = threading.local()
+        self._shared_queue = []
+        sched.scheduler.__init__(self, *args, **kwargs)
+
+    @property
+    def _queue(self):
+        return getattr(self._local, "queue", self._shared_queue)
+
+    @_queue.setter
+    def _queue(self, value):
+        self._shared_queue = value
+
+    def get_queue(self):
+        """
+        Returns the queue of scheduled handlers used by the current thread.
+        """
+        return self._queue
+
+    def bind_queue(self, queue=None):
+        """
+        Use a separate queue of scheduled handlers in the current thread.
+
+        :param list queue: the queue to use, as returned by `get_queue` called in another
+            thread. When not set, a new empty queue is used.
+        """
+        self._local.queue = [] if queue is None else queue
+
+    def unbind_queue(self):
+        """
+        Use the queue shared by all the threads again in the current thread.
+        """
+        self._local.__dict__.pop("queue", None)
+
     def add(self, handler, arguments=()):
         """
         Schedule execution of `handler` with `arguments`.
@@ -72,15 +125,29 @@ def mbs_event_handler(func):
     A decorator for MBS event handlers. It implements common tasks which should otherwise
     be repeated in every MBS event handler, for example:
 
+      - buffer the log messages stored by the handler and insert them at once at its end.
+        When the handler raises an exception, the changes it did not commit itself are rolled
+        back (see buffered_log_messages).
+      - observe the duration of the handler in the event_handler_duration_seconds histogram.
+      - count the SQL queries run by the handler.
       - at the end of handler, call events.scheduler.run().
     """
+    timed_func = monitor.timed(monitor.event_handler_histogram, handler=func.__name__)(func)
+
     @wraps(func)
     def wrapper(*args, **kwargs):
-        try:
-            return func(*args, **kwargs)
-        finally:
-            scheduler.run()
+        # Imported here because of importing cycle between models and events
+        from module_build_service.common.models import buffered_log_messages
+        from module_build_service.scheduler.db_session import db_session
+
+        with buffered_log_messages(db_session):
+            try:
+                with monitor.QueryStats("handler", func.__name__):
+                    return timed_func(*args, **kwargs)
+            finally:
+                scheduler.run()
     # save origin function as functools.wraps from python2 doesn't preserve the signature
     if not hasattr(wrapper, "__wrapped__"):
         wrapper.__wrapped__ = func
+    handler_args["{}.{}".format(func.__module__, func.__name__)] = getargspec(func).args
     return wrapper
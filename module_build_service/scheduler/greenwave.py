@@ -1,13 +1,17 @@
 # -*- coding: utf-8 -*-
 # SPDX-License-Identifier: MIT
 from __future__ import absolute_import
+import concurrent.futures
 from functools import reduce
 import json
+import threading
+import time
 
 import requests
 
 from module_build_service.common import log, conf
 from module_build_service.common.errors import GreenwaveError
+from module_build_service.common.request_utils import get_requests_session
 
 
 class Greenwave(object):
@@ -22,6 +26,11 @@ class Greenwave(object):
         self._subj_type = conf.greenwave_subject_type
         self._gw_timeout = conf.greenwave_timeout
         self.error_occurred = False
+        # The connections to Greenwave are reused by all the queries
+        self._session = get_requests_session()
+        # The product versions of the policies and the time they were queried
+        self._product_versions = None
+        self._product_versions_lock = threading.Lock()
 
     def _greenwave_query(self, query_type, payload=None):
         """
@@ -33,7 +42,7 @@ class Greenwave(object):
         :return: response
         :rtype: dict
         """
-        query_func = requests.post if payload else requests.get
+        query_func = self._session.post if payload else self._session.get
         kwargs = {"url": "{0}/{1}".format(self.url, query_type), "timeout": self.timeout}
 
         if payload:
@@ -84,11 +93,14 @@ class Greenwave(object):
         :return: response
         :rtype: dict
         """
+        return self._query_decision(build.nvr_string, prod_version)
+
+    def _query_decision(self, nvr, prod_version):
         payload = {
             "decision_context": self.decision_context,
             "product_version": prod_version,
             "subject_type": self.subject_type,
-            "subject_identifier": build.nvr_string
+            "subject_identifier": nvr
         }
         return self._greenwave_query('decision', json.dumps(payload))
 
@@ -120,42 +132,86 @@ class Greenwave(object):
 
     def get_product_versions(self):
         """
-        Return a set of product versions according to decision_context and subject_type
+        Return a set of product versions according to decision_context and subject_type.
+        The policies are queried at most once per greenwave_policies_ttl seconds.
         :return: product versions
         :rtype: set
         """
-        return reduce(
-            lambda old, new: old.union(new),
-            [pol["product_versions"] for pol in self.query_policies()["policies"]],
-            set()
-        )
+        with self._product_versions_lock:
+            if self._product_versions is not None:
+                time_queried, versions = self._product_versions
+                if time.time() - time_queried < conf.greenwave_policies_ttl:
+                    return set(versions)
+
+            versions = reduce(
+                lambda old, new: old.union(new),
+                [pol["product_versions"] for pol in self.query_policies()["policies"]],
+                set()
+            )
+            self._product_versions = (time.time(), versions)
+            return set(versions)
+
+    def clear_product_versions(self):
+        """
+        Forget the cached product versions
+        """
+        with self._product_versions_lock:
+            self._product_versions = None
 
-    def check_gating(self, build):
+    def get_gating_decision(self, nvr):
         """
-        Query decision to greenwave
-        :param build: build object
-        :type build: module_build_service.common.models.ModuleBuild
-        :return: True if at least one GW response contains policies_satisfied set to true
-        :rtype: bool
+        Query decision to greenwave. Unlike check_gating, this does not change the state of
+        the instance, so it may be called from several threads.
+        :param nvr: NVR string of the module build
+        :type nvr: str
+        :return: a tuple of whether at least one GW response contains policies_satisfied set to
+            true, and whether an error occurred while querying Greenwave
+        :rtype: tuple(bool, bool)
         """
-        self.error_occurred = False
         try:
             versions = self.get_product_versions()
         except GreenwaveError:
             log.warning('An error occured while getting a product versions')
-            self.error_occurred = True
-            return False
+            return False, True
 
+        error_occurred = False
         for ver in versions:
             try:
-                if self.query_decision(build, ver)["policies_satisfied"]:
+                if self._query_decision(nvr, ver)["policies_satisfied"]:
                     # at least one positive result is enough
-                    return True
+                    return True, error_occurred
             except (KeyError, GreenwaveError) as exc:
-                self.error_occurred = True
+                error_occurred = True
                 log.warning('Incorrect greenwave result "%s", ignoring', str(exc))
 
-        return False
+        return False, error_occurred
+
+    def check_gating(self, build):
+        """
+        Query decision to greenwave
+        :param build: build object
+        :type build: module_build_service.common.models.ModuleBuild
+        :return: True if at least one GW response contains policies_satisfied set to true
+        :rtype: bool
+        """
+        passed, self.error_occurred = self.get_gating_decision(build.nvr_string)
+        return passed
+
+    def check_gating_of_builds(self, nvrs):
+        """
+        Query decisions to greenwave for several builds, with at most
+        greenwave_max_concurrent_queries builds checked at the same time
+        :param nvrs: NVR strings of the module builds
+        :type nvrs: list
+        :return: the results of get_gating_decision, in the order of nvrs
+        :rtype: list
+        """
+        if not nvrs:
+            return []
+
+        max_workers = max(1, min(conf.greenwave_max_concurrent_queries, len(nvrs)))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self.get_gating_decision, nvrs))
 
     @property
     def url(self):
@@ -23,7 +23,8 @@ import module_build_service.resolver
 from module_build_service.scheduler.submit import (
     record_component_builds,
     record_filtered_rpms,
-    record_module_build_arches
+    record_module_build_arches,
+    record_module_build_rpms,
 )
 from module_build_service.scheduler import celery_app, events
 from module_build_service.scheduler.db_session import db_session
@@ -126,6 +127,9 @@ def done(msg_id, module_build_id, module_build_state):
         # This is ok.. it's a race condition we can ignore.
         pass
 
+    record_module_build_rpms(build)
+    db_session.commit()
+
     # Scratch builds stay in 'done' state
     if not build.scratch:
         if greenwave is None or greenwave.check_gating(build):
@@ -25,6 +25,17 @@ class MessageParser(object):
 
 class FedmsgMessageParser(MessageParser):
 
+    def __init__(self, topic_categories):
+        super(FedmsgMessageParser, self).__init__(topic_categories)
+        # Compile the topic regex once instead of on every parsed message
+        categories_re = "|".join(map(re.escape, topic_categories))
+        self.topic_regex = re.compile(
+            r"(?P<category>" + categories_re + r")"
+            r"(?:(?:\.)(?P<object>build|repo|module|decision))?"
+            r"(?:(?:\.)(?P<subobject>state|build))?"
+            r"(?:\.)(?P<event>change|done|end|tag|update)$"
+        )
+
     def parse(self, msg):
         """
         Parse a received message and convert it to a consistent format
@@ -39,14 +50,7 @@ class FedmsgMessageParser(MessageParser):
         if "body" in msg:
             msg = msg["body"]
         topic = msg["topic"]
-        categories_re = "|".join(map(re.escape, self.topic_categories))
-        regex_pattern = re.compile(
-            r"(?P<category>" + categories_re + r")"
-            r"(?:(?:\.)(?P<object>build|repo|module|decision))?"
-            r"(?:(?:\.)(?P<subobject>state|build))?"
-            r"(?:\.)(?P<event>change|done|end|tag|update)$"
-        )
-        regex_results = re.search(regex_pattern, topic)
+        regex_results = self.topic_regex.search(topic)
 
         if regex_results:
             category = regex_results.group("category")
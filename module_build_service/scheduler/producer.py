@@ -5,10 +5,15 @@ from datetime import timedelta, datetime
 import operator
 
 import koji
+from sqlalchemy import and_, exists, func, literal, or_
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import lazyload, load_only
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.types import DateTime, Float
 
 
 from module_build_service.common import conf, log, models
+import module_build_service.common.monitor as monitor
 from module_build_service.builder import GenericBuilder
 from module_build_service.common.koji import get_session
 import module_build_service.scheduler
@@ -23,6 +28,13 @@ from module_build_service.scheduler.db_session import db_session
 from module_build_service.scheduler.greenwave import greenwave
 from module_build_service.scheduler.handlers.components import build_task_finalize
 from module_build_service.scheduler.handlers.tags import tagged
+from module_build_service.scheduler.route import apply_async_for_module_build
+
+
+def periodic_task(func):
+    """ Declares a Celery task of the producer, timed by producer_task_duration_seconds. """
+    return celery_app.task(
+        monitor.timed(monitor.producer_task_histogram, task=func.__name__)(func))
 
 
 @celery_app.on_after_finalize.connect
@@ -34,6 +46,7 @@ def setup_periodic_tasks(sender, **kwargs):
         (process_paused_module_builds, "Process paused module builds"),
         (delete_old_koji_targets, "Delete old koji targets"),
         (cleanup_stale_failed_builds, "Cleanup stale failed builds"),
+        (cleanup_log_messages, "Cleanup old log messages"),
         (cancel_stuck_module_builds, "Cancel stuck module builds"),
         (sync_koji_build_tags, "Sync Koji build tags"),
         (poll_greenwave, "Gating module build to ready state"),
@@ -43,24 +56,46 @@ def setup_periodic_tasks(sender, **kwargs):
         sender.add_periodic_task(conf.polling_interval, task.s(), name=name)
 
 
-@celery_app.task
+@periodic_task
 def log_summary():
     states = sorted(models.BUILD_STATES.items(), key=operator.itemgetter(1))
+    counts = dict(
+        db_session.query(models.ModuleBuild.state, func.count(models.ModuleBuild.id))
+        .group_by(models.ModuleBuild.state)
+    )
     for name, code in states:
-        query = db_session.query(models.ModuleBuild).filter_by(state=code)
-        count = query.count()
+        count = counts.get(code, 0)
         if count:
             log.info("  * %s module builds in the %s state", count, name)
-        if name == "build":
-            for module_build in query.all():
+        if name == "build" and count:
+            module_builds = (
+                db_session.query(models.ModuleBuild)
+                .filter_by(state=code)
+                .order_by(models.ModuleBuild.id)
+                .all()
+            )
+            batch_counts = dict(
+                ((module_id, batch), n)
+                for module_id, batch, n in (
+                    db_session.query(
+                        models.ComponentBuild.module_id,
+                        models.ComponentBuild.batch,
+                        func.count(models.ComponentBuild.id),
+                    )
+                    .join(models.ModuleBuild, models.ComponentBuild.module_build)
+                    .filter(models.ModuleBuild.state == code)
+                    .group_by(models.ComponentBuild.module_id, models.ComponentBuild.batch)
+                )
+            )
+            for module_build in module_builds:
                 log.info("    * %r", module_build)
                 # First batch is number '1'.
                 for i in range(1, module_build.batch + 1):
-                    n = len([c for c in module_build.component_builds if c.batch == i])
+                    n = batch_counts.get((module_build.id, i), 0)
                     log.info("      * %s components in batch %s", n, i)
 
 
-@celery_app.task
+@periodic_task
 def process_waiting_module_builds():
     for state in ["init", "wait"]:
         nudge_module_builds_in_state(state, 10)
@@ -73,31 +108,37 @@ def nudge_module_builds_in_state(state_name, older_than_minutes):
     work queue.
     """
     log.info("Looking for module builds stuck in the %s state", state_name)
-    builds = models.ModuleBuild.by_state(db_session, state_name)
-    log.info(" %r module builds in the %s state...", len(builds), state_name)
+    state = module_build_service.common.models.BUILD_STATES[state_name]
     now = datetime.utcnow()
-    time_modified_threshold = timedelta(minutes=older_than_minutes)
-    for build in builds:
-
-        # Only give builds a nudge if stuck for more than ten minutes
-        if (now - build.time_modified) < time_modified_threshold:
-            continue
+    build_ids = [
+        build_id for build_id, in db_session.query(models.ModuleBuild.id).filter(
+            models.ModuleBuild.state == state,
+            models.ModuleBuild.time_modified <= now - timedelta(minutes=older_than_minutes),
+        )
+    ]
+    log.info(
+        " %r module builds in the %s state for more than %d minutes...",
+        len(build_ids), state_name, older_than_minutes)
+    if not build_ids:
+        return
 
-        # Pretend the build is modified, so we don't tight spin.
-        build.time_modified = now
-        db_session.commit()
+    # Pretend the builds are modified, so we don't tight spin.
+    db_session.query(models.ModuleBuild).filter(models.ModuleBuild.id.in_(build_ids)).update(
+        {models.ModuleBuild.time_modified: now}, synchronize_session=False)
+    db_session.commit()
 
-        # Fake a message to kickstart the build anew in the consumer
-        state = module_build_service.common.models.BUILD_STATES[state_name]
-        handler = ON_MODULE_CHANGE_HANDLERS[state]
-        handler.delay("internal:mbs.module.state.change", build.id, state)
+    # Fake a message to kickstart the builds anew in the consumer
+    handler = ON_MODULE_CHANGE_HANDLERS[state]
+    for build_id in build_ids:
+        apply_async_for_module_build(
+            handler, build_id, "internal:mbs.module.state.change", build_id, state)
 
 
 def process_open_component_builds():
     log.warning("process_open_component_builds is not yet implemented...")
 
 
-@celery_app.task
+@periodic_task
 def fail_lost_builds():
     # This function is supposed to be handling only the part which can't be
     # updated through messaging (e.g. srpm-build failures). Please keep it
@@ -158,7 +199,9 @@ def fail_lost_builds():
 
             log.info("  task %r is in state %r", task_id, task_info["state"])
             if task_info["state"] in state_mapping:
-                build_task_finalize.delay(
+                apply_async_for_module_build(
+                    build_task_finalize,
+                    component_build.module_id,
                     msg_id="producer::fail_lost_builds fake msg",
                     task_id=component_build.task_id,
                     build_new_state=state_mapping[task_info["state"]],
@@ -171,7 +214,7 @@ def fail_lost_builds():
         pass
 
 
-@celery_app.task
+@periodic_task
 def process_paused_module_builds():
     log.info("Looking for paused module builds in the build state")
     if at_concurrent_component_threshold(conf):
@@ -181,38 +224,36 @@ def process_paused_module_builds():
         )
         return
 
-    ten_minutes = timedelta(minutes=10)
-    # Check for module builds that are in the build state but don't have any active component
-    # builds. Exclude module builds in batch 0. This is likely a build of a module without
-    # components.
+    # Check for module builds that are in the build state for more than ten minutes but don't
+    # have any component build in the build state in the current batch, so no possible event
+    # will start off new component builds. Exclude module builds in batch 0. This is likely a
+    # build of a module without components.
+    building_in_current_batch = exists().where(and_(
+        models.ComponentBuild.module_id == models.ModuleBuild.id,
+        models.ComponentBuild.batch == models.ModuleBuild.batch,
+        models.ComponentBuild.state == koji.BUILD_STATES["BUILDING"],
+    ))
     module_builds = db_session.query(models.ModuleBuild).filter(
         models.ModuleBuild.state == models.BUILD_STATES["build"],
         models.ModuleBuild.batch > 0,
+        models.ModuleBuild.time_modified <= datetime.utcnow() - timedelta(minutes=10),
+        ~building_in_current_batch,
     ).all()
     for module_build in module_builds:
-        now = datetime.utcnow()
-        # Only give builds a nudge if stuck for more than ten minutes
-        if (now - module_build.time_modified) < ten_minutes:
-            continue
-        # If there are no components in the build state on the module build,
-        # then no possible event will start off new component builds.
-        # But do not try to start new builds when we are waiting for the
-        # repo-regen.
-        if not module_build.current_batch(koji.BUILD_STATES["BUILDING"]):
-            # Initialize the builder...
-            builder = GenericBuilder.create_from_module(
-                db_session, module_build, conf)
+        # Do not try to start new builds when we are waiting for the repo-regen.
+        builder = GenericBuilder.create_from_module(
+            db_session, module_build, conf)
 
-            if has_missed_new_repo_message(module_build, builder.koji_session):
-                log.info("  Processing the paused module build %r", module_build)
-                start_next_batch_build(conf, module_build, builder)
+        if has_missed_new_repo_message(module_build, builder.koji_session):
+            log.info("  Processing the paused module build %r", module_build)
+            start_next_batch_build(conf, module_build, builder)
 
         # Check if we have met the threshold.
         if at_concurrent_component_threshold(conf):
             break
 
 
-@celery_app.task
+@periodic_task
 def retrigger_new_repo_on_failure():
     """
     Retrigger failed new repo tasks for module builds in the build state.
@@ -243,7 +284,7 @@ def retrigger_new_repo_on_failure():
     db_session.commit()
 
 
-@celery_app.task
+@periodic_task
 def delete_old_koji_targets():
     """
     Deletes targets older than `config.koji_target_delete_time` seconds
@@ -257,19 +298,27 @@ def delete_old_koji_targets():
     now = datetime.utcnow()
 
     koji_session = get_session(conf)
-    for target in koji_session.getBuildTargets():
-        module = db_session.query(models.ModuleBuild).filter(
-            models.ModuleBuild.koji_tag == target["dest_tag_name"],
-            models.ModuleBuild.name.notin_(conf.base_module_names),
-            models.ModuleBuild.state.notin_([
-                models.BUILD_STATES["init"],
-                models.BUILD_STATES["wait"],
-                models.BUILD_STATES["build"],
-            ]),
-        ).options(
-            load_only("time_completed"),
-        ).first()
+    targets = koji_session.getBuildTargets()
+    if not targets:
+        return
+
+    modules_by_tag = {}
+    module_builds = db_session.query(models.ModuleBuild).filter(
+        models.ModuleBuild.koji_tag.in_({target["dest_tag_name"] for target in targets}),
+        models.ModuleBuild.name.notin_(conf.base_module_names),
+        models.ModuleBuild.state.notin_([
+            models.BUILD_STATES["init"],
+            models.BUILD_STATES["wait"],
+            models.BUILD_STATES["build"],
+        ]),
+    ).options(
+        load_only("koji_tag", "time_completed"),
+    ).order_by(models.ModuleBuild.id)
+    for module_build in module_builds:
+        modules_by_tag.setdefault(module_build.koji_tag, module_build)
 
+    for target in targets:
+        module = modules_by_tag.get(target["dest_tag_name"])
         if module is None:
             continue
 
@@ -289,7 +338,7 @@ def delete_old_koji_targets():
             koji_session.deleteBuildTarget(target["id"])
 
 
-@celery_app.task
+@periodic_task
 def cleanup_stale_failed_builds():
     """Does various clean up tasks on stale failed module builds"""
 
@@ -337,7 +386,79 @@ def cleanup_stale_failed_builds():
         db_session.commit()
 
 
-@celery_app.task
+def _delete_log_messages(id_query):
+    ids = [log_message_id for log_message_id, in id_query]
+    if ids:
+        db_session.query(models.LogMessage).filter(models.LogMessage.id.in_(ids)).delete(
+            synchronize_session=False)
+    return len(ids)
+
+
+@periodic_task
+def cleanup_log_messages():
+    """
+    Deletes the log messages older than log_messages_retention_days of the module builds which
+    are not being built anymore, and the oldest log messages of the module builds having more
+    than log_messages_max_per_module_build of them.
+
+    At most log_messages_cleanup_batch_size log messages are deleted by a run to keep the
+    transaction short, the rest is deleted by the next runs.
+    """
+    limit = conf.log_messages_cleanup_batch_size
+    deleted = 0
+
+    if conf.log_messages_retention_days:
+        cutoff = datetime.utcnow() - timedelta(days=conf.log_messages_retention_days)
+        query = (
+            db_session.query(models.LogMessage.id)
+            .join(models.ModuleBuild, models.ModuleBuild.id == models.LogMessage.module_build_id)
+            .filter(
+                models.LogMessage.time_created < cutoff,
+                models.ModuleBuild.state.in_([
+                    models.BUILD_STATES["ready"],
+                    models.BUILD_STATES["failed"],
+                    models.BUILD_STATES["garbage"],
+                ]),
+            )
+            .order_by(models.LogMessage.id)
+            .limit(limit)
+        )
+        deleted += _delete_log_messages(query)
+
+    if conf.log_messages_max_per_module_build and deleted < limit:
+        # Only rank the messages of the module builds which have too many of them
+        module_build_ids = [
+            module_build_id for module_build_id, in (
+                db_session.query(models.LogMessage.module_build_id)
+                .group_by(models.LogMessage.module_build_id)
+                .having(func.count(models.LogMessage.id) > conf.log_messages_max_per_module_build)
+            )
+        ]
+    else:
+        module_build_ids = []
+
+    if module_build_ids:
+        ranked = db_session.query(
+            models.LogMessage.id.label("id"),
+            func.row_number().over(
+                partition_by=models.LogMessage.module_build_id,
+                order_by=models.LogMessage.id.desc(),
+            ).label("position"),
+        ).filter(models.LogMessage.module_build_id.in_(module_build_ids)).subquery()
+        query = (
+            db_session.query(ranked.c.id)
+            .filter(ranked.c.position > conf.log_messages_max_per_module_build)
+            .order_by(ranked.c.id)
+            .limit(limit - deleted)
+        )
+        deleted += _delete_log_messages(query)
+
+    if deleted:
+        log.info("Deleted %d old log messages", deleted)
+        db_session.commit()
+
+
+@periodic_task
 def cancel_stuck_module_builds():
     """
     Method transitions builds which are stuck in one state too long to the "failed" state.
@@ -381,7 +502,7 @@ def cancel_stuck_module_builds():
         db_session.commit()
 
 
-@celery_app.task
+@periodic_task
 def sync_koji_build_tags():
     """
     Method checking the "tagged" and "tagged_in_final" attributes of
@@ -426,7 +547,9 @@ def sync_koji_build_tags():
                 log.info(
                     "Apply tag %s to module build %r",
                     module_build.koji_tag, module_build)
-                tagged.delay("internal:sync_koji_build_tags", module_build.koji_tag, c.nvr)
+                apply_async_for_module_build(
+                    tagged, module_build.id,
+                    "internal:sync_koji_build_tags", module_build.koji_tag, c.nvr)
 
             # If it is tagged in the build tag, but MBS does not think so,
             # schedule fake message.
@@ -435,35 +558,80 @@ def sync_koji_build_tags():
                 log.info(
                     "Apply build tag %s to module build %r",
                     build_tag, module_build)
-                tagged.delay("internal:sync_koji_build_tags", build_tag, c.nvr)
+                apply_async_for_module_build(
+                    tagged, module_build.id, "internal:sync_koji_build_tags", build_tag, c.nvr)
 
 
-@celery_app.task
+@periodic_task
 def poll_greenwave():
-    """Polls Greenwave for all builds in done state"""
+    """Polls Greenwave for the builds in done state whose gating should be checked again"""
     if greenwave is None:
         return
 
-    module_builds = db_session.query(models.ModuleBuild).filter_by(
-        state=models.BUILD_STATES["done"],
-        scratch=False
+    # The builds are checked again once the time of the last check minus the time of completion
+    # (see get_gating_check_delay) has passed since the last check
+    now = datetime.utcnow()
+    time_completed = models.ModuleBuild.time_completed
+    time_modified = models.ModuleBuild.time_modified
+    module_builds = db_session.query(models.ModuleBuild).filter(
+        models.ModuleBuild.state == models.BUILD_STATES["done"],
+        models.ModuleBuild.scratch.is_(False),
+        or_(
+            time_completed.is_(None),
+            time_modified.is_(None),
+            time_modified <= now - timedelta(seconds=conf.greenwave_poll_max_interval),
+            _epoch_seconds(time_modified) - _epoch_seconds(time_completed)
+            <= _epoch_seconds(literal(now, DateTime)) - _epoch_seconds(time_modified),
+        ),
     ).all()
 
     log.info("Checking Greenwave for %d builds", len(module_builds))
 
-    for build in module_builds:
-        if greenwave.check_gating(build):
+    decisions = greenwave.check_gating_of_builds([build.nvr_string for build in module_builds])
+    for build, (passed, error_occurred) in zip(module_builds, decisions):
+        if passed:
             build.transition(db_session, conf, state=models.BUILD_STATES["ready"])
         else:
+            build.time_modified = datetime.utcnow()
+            retry_in = max(conf.polling_interval, get_gating_check_delay(build).total_seconds())
             build.state_reason = "Gating failed (MBS will retry in {0} seconds)".format(
-                conf.polling_interval
+                int(retry_in)
             )
-            if greenwave.error_occurred:
+            if error_occurred:
                 build.state_reason += " (Error occured while querying Greenwave)"
-            build.time_modified = datetime.utcnow()
         db_session.commit()
 
 
+class _epoch_seconds(FunctionElement):
+    """ The number of seconds since the epoch of a datetime, usable in arithmetic. """
+    type = Float()
+    name = "epoch_seconds"
+
+
+@compiles(_epoch_seconds)
+def _compile_epoch_seconds(element, compiler, **kw):
+    return "EXTRACT(EPOCH FROM {})".format(compiler.process(element.clauses, **kw))
+
+
+@compiles(_epoch_seconds, "sqlite")
+def _compile_epoch_seconds_sqlite(element, compiler, **kw):
+    return "((julianday({}) - 2440587.5) * 86400.0)".format(
+        compiler.process(element.clauses, **kw))
+
+
+def get_gating_check_delay(module_build):
+    """
+    Returns the time to wait since the last gating check of a module build in the done state
+    before checking it again. This is the time the module build has already waited for the
+    gating, so the checks of the builds which keep failing the gating become exponentially
+    rarer, up to greenwave_poll_max_interval seconds.
+    """
+    if not module_build.time_completed or not module_build.time_modified:
+        return timedelta(0)
+    waited = module_build.time_modified - module_build.time_completed
+    return max(timedelta(0), min(waited, timedelta(seconds=conf.greenwave_poll_max_interval)))
+
+
 def has_missed_new_repo_message(module_build, koji_session):
     """
     Returns whether or not a new repo message has probably been missed.
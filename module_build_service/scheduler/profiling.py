@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+""" Profiling of the event handlers of chosen or sampled module builds. """
+
+from __future__ import absolute_import
+from contextlib import contextmanager
+import random
+
+from celery.signals import task_postrun, task_prerun
+
+from module_build_service.common import conf
+from module_build_service.common.profiling import Profile
+from module_build_service.scheduler.shards import MODULE_BUILD_ID_HEADER
+
+# The profiles of the Celery tasks in progress by task ID
+_task_profiles = {}
+
+
+def should_profile_module_build(module_build_id):
+    """
+    Returns whether an event handler of the module build should be profiled, either because the
+    module build is in ``profiling_module_build_ids`` or because the handler run is sampled.
+
+    :param int module_build_id: the ID of the module build.
+    :rtype: bool
+    """
+    if not conf.profiling_dir:
+        return False
+    if str(module_build_id) in [str(i) for i in conf.profiling_module_build_ids]:
+        return True
+    return conf.profiling_sample_one_in > 0 and random.randrange(conf.profiling_sample_one_in) == 0
+
+
+def _profile_name(handler_name, module_build_id):
+    return "{0}.module_build_{1}".format(handler_name, module_build_id)
+
+
+@contextmanager
+def profile_handler(module_build_id, handler_name):
+    """
+    Profile the block running an event handler if the module build should be profiled.
+
+    :param int module_build_id: the ID of the module build.
+    :param str handler_name: the name of the handler.
+    """
+    if not should_profile_module_build(module_build_id):
+        yield None
+        return
+    with Profile("handler", _profile_name(handler_name, module_build_id)) as profile:
+        yield profile
+
+
+@task_prerun.connect
+def start_task_profile(task_id=None, task=None, **kwargs):
+    """ Start profiling the Celery task if its module build should be profiled. """
+    if task is None:
+        return
+    module_build_id = getattr(task.request, MODULE_BUILD_ID_HEADER, None)
+    if module_build_id is None or not should_profile_module_build(module_build_id):
+        return
+    name = _profile_name(task.name.rsplit(".", 1)[-1], module_build_id)
+    _task_profiles[task_id] = Profile("handler", name).start()
+
+
+@task_postrun.connect
+def stop_task_profile(task_id=None, **kwargs):
+    profile = _task_profiles.pop(task_id, None)
+    if profile is not None:
+        profile.stop()
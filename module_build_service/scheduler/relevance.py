@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+""" An in-memory index used to drop the messages unrelated to MBS before any database query.
+
+MBS subscribes to every Koji message, but almost all of them are about builds, tags and repos
+which have nothing to do with module builds. The index keeps the Koji task IDs of the component
+builds and the Koji tags of the module builds that messages can be related to.
+"""
+
+from __future__ import absolute_import
+import threading
+import time
+
+import koji
+import sqlalchemy.event
+from sqlalchemy import or_
+
+from module_build_service.common import conf, log, models
+from module_build_service.scheduler import events
+from module_build_service.scheduler.db_session import db_session
+
+__all__ = ("relevance_index",)
+
+
+class RelevanceIndex(object):
+    """
+    The task IDs and Koji tags the messages from Koji can be related to.
+
+    The index is rebuilt from the database every ``message_relevance_refresh_interval`` seconds,
+    which also forgets the builds which are not in flight anymore. In between, the changes
+    flushed through the scheduler database session are added as they happen. The messages are
+    checked against the index only, without any database query, so the builds changed by other
+    processes are only known after the next refresh.
+    """
+
+    # The states of the module builds whose component builds can still be handled
+    active_module_states = (
+        models.BUILD_STATES["init"],
+        models.BUILD_STATES["wait"],
+        models.BUILD_STATES["build"],
+    )
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.invalidate()
+
+    def invalidate(self):
+        """Forget everything, so that the index is rebuilt on the next lookup."""
+        with self._lock:
+            self.task_ids = set()
+            self.koji_tags = set()
+            self._last_refresh = None
+
+    def _task_ids_query(self, session):
+        return (
+            session.query(models.ComponentBuild.task_id)
+            .join(models.ModuleBuild, models.ComponentBuild.module_id == models.ModuleBuild.id)
+            .filter(models.ComponentBuild.task_id.isnot(None))
+            .filter(or_(
+                models.ModuleBuild.state.in_(self.active_module_states),
+                # The tasks of the module builds which failed meanwhile are canceled
+                models.ComponentBuild.state.is_(None),
+                models.ComponentBuild.state == koji.BUILD_STATES["BUILDING"],
+            ))
+        )
+
+    def _koji_tags_query(self, session):
+        return (
+            session.query(models.ModuleBuild.koji_tag)
+            .filter(models.ModuleBuild.koji_tag.isnot(None))
+            .filter(models.ModuleBuild.state == models.BUILD_STATES["build"])
+        )
+
+    def refresh(self, session):
+        """
+        Rebuild the index from the database.
+
+        :param session: SQLAlchemy session object.
+        """
+        with self._lock:
+            self.task_ids = {task_id for task_id, in self._task_ids_query(session)}
+            self.koji_tags = {koji_tag for koji_tag, in self._koji_tags_query(session)}
+            self._last_refresh = time.time()
+            log.debug(
+                "Refreshed the message relevance index with %d task IDs and %d Koji tags",
+                len(self.task_ids), len(self.koji_tags))
+
+    def record_session_changes(self, session, flush_context):
+        """
+        Add the task IDs and Koji tags of the builds flushed through the session.
+
+        This is a listener of the SQLAlchemy after_flush event, the new and dirty objects of the
+        session are not reset yet when it is called.
+        """
+        with self._lock:
+            for item in set(session.new) | set(session.dirty):
+                # Only look at the loaded attributes, this must not emit any query
+                loaded = sqlalchemy.inspect(item).dict
+                if isinstance(item, models.ComponentBuild) and loaded.get("task_id") is not None:
+                    self.task_ids.add(loaded["task_id"])
+                elif isinstance(item, models.ModuleBuild) and loaded.get("koji_tag"):
+                    self.koji_tags.add(loaded["koji_tag"])
+
+    def is_relevant(self, session, event_info):
+        """
+        Check if a message can be related to any module build.
+
+        :param session: SQLAlchemy session object, only used when the index has to be refreshed.
+        :param dict event_info: the event parsed from the message.
+        :return: False if the message is known to be unrelated to MBS, True otherwise.
+        :rtype: bool
+        """
+        event = event_info["event"]
+        if event == events.KOJI_BUILD_CHANGE:
+            if event_info.get("module_build_id") is not None:
+                return True
+            index_name, key = "task_ids", event_info["task_id"]
+        elif event in (events.KOJI_REPO_CHANGE, events.KOJI_TAG_CHANGE):
+            tag_name = event_info["tag_name"] or ""
+            # The messages about the build tags are handled like the ones about the module tags
+            if tag_name.endswith("-build"):
+                tag_name = tag_name[:-6]
+            index_name, key = "koji_tags", tag_name
+        else:
+            return True
+
+        with self._lock:
+            if (
+                self._last_refresh is None
+                or time.time() - self._last_refresh >= conf.message_relevance_refresh_interval
+            ):
+                self.refresh(session)
+            return key in getattr(self, index_name)
+
+
+relevance_index = RelevanceIndex()
+sqlalchemy.event.listen(db_session, "after_flush", relevance_index.record_session_changes)
@@ -183,8 +183,7 @@ def attempt_to_reuse_all_components(builder, module):
     if not previous_module_build:
         return False
 
-    mmd = module.mmd()
-    old_mmd = previous_module_build.mmd()
+    planner = ReusePlanner(module, previous_module_build)
 
     # [(component, component_to_reuse), ...]
     component_pairs = []
@@ -194,13 +193,7 @@ def attempt_to_reuse_all_components(builder, module):
     for c in module.component_builds:
         if c.package == "module-build-macros":
             continue
-        component_to_reuse = get_reusable_component(
-            module,
-            c.package,
-            previous_module_build=previous_module_build,
-            mmd=mmd,
-            old_mmd=old_mmd,
-        )
+        component_to_reuse = planner.get_reusable_component(c.package)
         if not component_to_reuse:
             return False
 
@@ -254,17 +247,8 @@ def get_reusable_components(module, component_names, previous_module_build=None)
     if not previous_module_build:
         return [None] * len(component_names)
 
-    mmd = module.mmd()
-    old_mmd = previous_module_build.mmd()
-
-    ret = []
-    for component_name in component_names:
-        ret.append(
-            get_reusable_component(
-                module, component_name, previous_module_build, mmd, old_mmd)
-        )
-
-    return ret
+    planner = ReusePlanner(module, previous_module_build)
+    return [planner.get_reusable_component(name) for name in component_names]
 
 
 def get_reusable_component(
@@ -293,19 +277,6 @@ def get_reusable_component(
     :return: the component (RPM) build SQLAlchemy object, if one is not found,
         None is returned
     """
-
-    # We support component reusing only for koji and test backend.
-    if conf.system not in ["koji", "test"]:
-        return None
-
-    # If the rebuild strategy is "all", that means that nothing can be reused
-    if module.rebuild_strategy == "all":
-        message = ("Cannot reuse the component {component_name} because the module "
-                   "rebuild strategy is \"all\".").format(
-                       component_name=component_name)
-        module.log_message(db_session, message)
-        return None
-
     if not previous_module_build:
         previous_module_build = get_reusable_module(module)
         if not previous_module_build:
@@ -315,135 +286,198 @@ def get_reusable_component(
             module.log_message(db_session, message)
             return None
 
-    if not mmd:
-        mmd = module.mmd()
-    if not old_mmd:
-        old_mmd = previous_module_build.mmd()
-
-    # If the chosen component for some reason was not found in the database,
-    # or the ref is missing, something has gone wrong and the component cannot
-    # be reused
-    new_module_build_component = models.ComponentBuild.from_component_name(
-        db_session, component_name, module.id)
-    if (
-        not new_module_build_component
-        or not new_module_build_component.batch
-        or not new_module_build_component.ref
-    ):
-        message = ("Cannot reuse the component {} because it can't be found in the "
-                   "database").format(component_name)
-        module.log_message(db_session, message)
-        return None
+    planner = ReusePlanner(module, previous_module_build, mmd, old_mmd)
+    return planner.get_reusable_component(component_name)
 
-    prev_module_build_component = models.ComponentBuild.from_component_name(
-        db_session, component_name, previous_module_build.id
-    )
-    # If the component to reuse for some reason was not found in the database,
-    # or the ref is missing, something has gone wrong and the component cannot
-    # be reused
-    if (
-        not prev_module_build_component
-        or not prev_module_build_component.batch
-        or not prev_module_build_component.ref
-    ):
-        message = ("Cannot reuse the component {} because a previous build of "
-                   "it can't be found in the database").format(component_name)
-        new_module_build_component.log_message(db_session, message)
-        return None
 
-    # Make sure the ref for the component that is trying to be reused
-    # hasn't changed since the last build
-    if prev_module_build_component.ref != new_module_build_component.ref:
-        message = ("Cannot reuse the component because the commit hash changed"
-                   " since the last build")
-        new_module_build_component.log_message(db_session, message)
-        return None
+class ReusePlanner(object):
+    """
+    Finds the component builds of a previous module build which can be reused by the components
+    of a module build.
 
-    # At this point we've determined that both module builds contain the component
-    # and the components share the same commit hash
-    if module.rebuild_strategy == "changed-and-after":
-        # Make sure the batch number for the component that is trying to be reused
-        # hasn't changed since the last build
-        if prev_module_build_component.batch != new_module_build_component.batch:
-            message = ("Cannot reuse the component because it is being built in "
-                       "a different batch than in the compatible module build")
-            new_module_build_component.log_message(db_session, message)
-            return None
+    Everything which does not depend on the component, like the component builds of both module
+    builds and the batches they have in common, is computed only once, so that finding the
+    reusable components of a whole module build does not cost more than the module build size.
+    """
 
-        # If the mmd.buildopts.macros.rpms changed, we cannot reuse
+    def __init__(self, module, previous_module_build, mmd=None, old_mmd=None):
+        """
+        :param module: the ModuleBuild object of module being built with a formatted mmd.
+        :param previous_module_build: the ModuleBuild instance of a module build which contains
+            the components to reuse.
+        :param mmd: Modulemd.ModuleStream of `module`. If not passed, it is taken from
+            module.mmd().
+        :param old_mmd: Modulemd.ModuleStream of `previous_module_build`. If not passed, it is
+            taken from previous_module_build.mmd().
+        """
+        self.module = module
+        self.previous_module_build = previous_module_build
+        self.mmd = mmd or module.mmd()
+        self.old_mmd = old_mmd or previous_module_build.mmd()
+        self._new_components = self._get_components(module)
+        self._prev_components = self._get_components(previous_module_build)
+        self._macros_changed = None
+        self._first_changed_batch = None
+
+    @staticmethod
+    def _get_components(module):
+        components = {}
+        for component in module.component_builds:
+            components.setdefault(component.package, component)
+        return components
+
+    @staticmethod
+    def _get_rpm_macros(mmd):
         buildopts = mmd.get_buildopts()
         if buildopts:
-            modulemd_macros = buildopts.get_rpm_macros()
-        else:
-            modulemd_macros = None
+            return buildopts.get_rpm_macros()
+        return None
 
-        old_buildopts = old_mmd.get_buildopts()
-        if old_buildopts:
-            old_modulemd_macros = old_buildopts.get_rpm_macros()
-        else:
-            old_modulemd_macros = None
+    @staticmethod
+    def _get_arches(mmd, package):
+        rpm_component = mmd.get_rpm_component(package)
+        return tuple(sorted(rpm_component.get_arches())) if rpm_component else ()
+
+    @classmethod
+    def _get_batch_signatures(cls, components, mmd):
+        """
+        Returns a dict with the batch numbers as keys and the sets of "(name, ref, arches)" of
+        the components in the batch as values.
+        """
+        signatures = {}
+        for component in components.values():
+            if component.batch:
+                signatures.setdefault(component.batch, set()).add(
+                    (component.package, component.ref, cls._get_arches(mmd, component.package)))
+        return signatures
+
+    @property
+    def macros_changed(self):
+        """ True if the mmd.buildopts.macros.rpms changed since the previous module build. """
+        if self._macros_changed is None:
+            self._macros_changed = (
+                self._get_rpm_macros(self.mmd) != self._get_rpm_macros(self.old_mmd))
+        return self._macros_changed
+
+    @property
+    def first_changed_batch(self):
+        """
+        The number of the first batch with components which have been added, removed or rebuilt
+        since the previous module build. The first batch is never considered as changed, since it
+        only contains the module-build-macros RPM, which gets built every time.
+        """
+        if self._first_changed_batch is None:
+            new_signatures = self._get_batch_signatures(self._new_components, self.mmd)
+            prev_signatures = self._get_batch_signatures(self._prev_components, self.old_mmd)
+            last_batch = max(list(new_signatures) + list(prev_signatures) + [1])
+            batch = 2
+            while batch <= last_batch and (
+                new_signatures.get(batch, set()) == prev_signatures.get(batch, set())
+            ):
+                batch += 1
+            self._first_changed_batch = batch
+        return self._first_changed_batch
+
+    def get_reusable_component(self, component_name):
+        """
+        Returns the component (RPM) build of the previous module build that can be reused
+        instead of needing to rebuild the component.
+
+        :param component_name: the name of the component (RPM) that you'd like to
+            reuse a previous build of
+        :return: the component (RPM) build SQLAlchemy object, if one is not found,
+            None is returned
+        """
+        module = self.module
+        mmd = self.mmd
+        old_mmd = self.old_mmd
+
+        # We support component reusing only for koji and test backend.
+        if conf.system not in ["koji", "test"]:
+            return None
 
-        if modulemd_macros != old_modulemd_macros:
-            message = ("Cannot reuse the component because the modulemd's macros are"
-                       " different than those of the compatible module build")
-            new_module_build_component.log_message(db_session, message)
+        # If the rebuild strategy is "all", that means that nothing can be reused
+        if module.rebuild_strategy == "all":
+            message = ("Cannot reuse the component {component_name} because the module "
+                       "rebuild strategy is \"all\".").format(
+                           component_name=component_name)
+            module.log_message(db_session, message)
             return None
 
-        # At this point we've determined that both module builds contain the component
-        # with the same commit hash and they are in the same batch. We've also determined
-        # that both module builds depend(ed) on the same exact module builds. Now it's time
-        # to determine if the components before it have changed.
-        #
-        # Convert the component_builds to a list and sort them by batch
-        new_component_builds = list(module.component_builds)
-        new_component_builds.sort(key=lambda x: x.batch)
-        prev_component_builds = list(previous_module_build.component_builds)
-        prev_component_builds.sort(key=lambda x: x.batch)
-
-        new_module_build_components = []
-        previous_module_build_components = []
-        # Create separate lists for the new and previous module build. These lists
-        # will have an entry for every build batch *before* the component's
-        # batch except for 1, which is reserved for the module-build-macros RPM.
-        # Each batch entry will contain a set of "(name, ref, arches)" with the name,
-        # ref (commit), and arches of the component.
-        for i in range(new_module_build_component.batch - 1):
-            # This is the first batch which we want to skip since it will always
-            # contain only the module-build-macros RPM and it gets built every time
-            if i == 0:
-                continue
+        # If the chosen component for some reason was not found in the database,
+        # or the ref is missing, something has gone wrong and the component cannot
+        # be reused
+        new_module_build_component = self._new_components.get(component_name)
+        if (
+            not new_module_build_component
+            or not new_module_build_component.batch
+            or not new_module_build_component.ref
+        ):
+            message = ("Cannot reuse the component {} because it can't be found in the "
+                       "database").format(component_name)
+            module.log_message(db_session, message)
+            return None
 
-            new_module_build_components.append({
-                (value.package, value.ref,
-                    tuple(sorted(mmd.get_rpm_component(value.package).get_arches())))
-                for value in new_component_builds
-                if value.batch == i + 1
-            })
-
-            previous_module_build_components.append({
-                (value.package, value.ref,
-                    tuple(sorted(old_mmd.get_rpm_component(value.package).get_arches())))
-                for value in prev_component_builds
-                if value.batch == i + 1
-            })
-
-        # If the previous batches don't have the same ordering, hashes, and arches, then the
-        # component can't be reused
-        if previous_module_build_components != new_module_build_components:
-            message = ("Cannot reuse the component because a component in a previous"
-                       " batch has been added, removed, or rebuilt")
+        prev_module_build_component = self._prev_components.get(component_name)
+        # If the component to reuse for some reason was not found in the database,
+        # or the ref is missing, something has gone wrong and the component cannot
+        # be reused
+        if (
+            not prev_module_build_component
+            or not prev_module_build_component.batch
+            or not prev_module_build_component.ref
+        ):
+            message = ("Cannot reuse the component {} because a previous build of "
+                       "it can't be found in the database").format(component_name)
             new_module_build_component.log_message(db_session, message)
             return None
 
-    # check that arches have not changed
-    pkg = mmd.get_rpm_component(component_name)
-    if set(pkg.get_arches()) != set(old_mmd.get_rpm_component(component_name).get_arches()):
-        message = ("Cannot reuse the component because its architectures"
-                   " have changed since the compatible module build").format(component_name)
-        new_module_build_component.log_message(db_session, message)
-        return None
+        # Make sure the ref for the component that is trying to be reused
+        # hasn't changed since the last build
+        if prev_module_build_component.ref != new_module_build_component.ref:
+            message = ("Cannot reuse the component because the commit hash changed"
+                       " since the last build")
+            new_module_build_component.log_message(db_session, message)
+            return None
+
+        # At this point we've determined that both module builds contain the component
+        # and the components share the same commit hash
+        if module.rebuild_strategy == "changed-and-after":
+            # Make sure the batch number for the component that is trying to be reused
+            # hasn't changed since the last build
+            if prev_module_build_component.batch != new_module_build_component.batch:
+                message = ("Cannot reuse the component because it is being built in "
+                           "a different batch than in the compatible module build")
+                new_module_build_component.log_message(db_session, message)
+                return None
+
+            # If the mmd.buildopts.macros.rpms changed, we cannot reuse
+            if self.macros_changed:
+                message = ("Cannot reuse the component because the modulemd's macros are"
+                           " different than those of the compatible module build")
+                new_module_build_component.log_message(db_session, message)
+                return None
+
+            # At this point we've determined that both module builds contain the component
+            # with the same commit hash and they are in the same batch. We've also determined
+            # that both module builds depend(ed) on the same exact module builds. Now it's time
+            # to determine if the components before it have changed.
+            #
+            # If the previous batches don't have the same ordering, hashes, and arches, then the
+            # component can't be reused
+            if new_module_build_component.batch > self.first_changed_batch:
+                message = ("Cannot reuse the component because a component in a previous"
+                           " batch has been added, removed, or rebuilt")
+                new_module_build_component.log_message(db_session, message)
+                return None
+
+        # check that arches have not changed
+        pkg = mmd.get_rpm_component(component_name)
+        if set(pkg.get_arches()) != set(old_mmd.get_rpm_component(component_name).get_arches()):
+            message = ("Cannot reuse the component because its architectures"
+                       " have changed since the compatible module build").format(component_name)
+            new_module_build_component.log_message(db_session, message)
+            return None
 
-    reusable_component = db_session.query(models.ComponentBuild).filter_by(
-        package=component_name, module_id=previous_module_build.id).one()
-    log.debug("Found reusable component!")
-    return reusable_component
+        log.debug("Found reusable component!")
+        return prev_module_build_component
@@ -3,11 +3,51 @@
 """ Define the router used to route Celery tasks to queues."""
 
 from __future__ import absolute_import
-import inspect
 
 from module_build_service.common import conf, log, models
+from module_build_service.scheduler import events
 from module_build_service.scheduler.db_session import db_session
 from module_build_service.scheduler.handlers.greenwave import get_corresponding_module_build
+from module_build_service.scheduler.shards import MODULE_BUILD_ID_HEADER, assign_shard
+
+
+def get_handler_args(name):
+    """
+    Get the argument names of the task handler.
+
+    The arguments of the MBS event handlers are recorded when they are defined, the other tasks
+    are imported and inspected once and then cached too.
+
+    :param str name: the name of the Celery task.
+    :return: the argument names of the task handler.
+    :rtype: list
+    """
+    handler_args = events.handler_args.get(name)
+    if handler_args is None:
+        module, handler_name = name.rsplit(".", 1)
+        handler = getattr(__import__(module, fromlist=[handler_name]), handler_name)
+        # handlers can be decorated, inspect the original function
+        while getattr(handler, "__wrapped__", None):
+            handler = handler.__wrapped__
+        handler_args = events.getargspec(handler).args
+        events.handler_args[name] = handler_args
+    return handler_args
+
+
+def apply_async_for_module_build(task, module_build_id, *args, **kwargs):
+    """
+    Run the task asynchronously, with the id of its module build attached as a message header.
+
+    The module build is usually already known when a task is sent, attaching its id allows
+    `route_task` to route the task without looking the module build up again.
+
+    :param task: the Celery task.
+    :param int module_build_id: the id of the module build the task is associated with.
+    :param args: the positional arguments of the task.
+    :param kwargs: the keyword arguments of the task.
+    """
+    return task.apply_async(
+        args=args, kwargs=kwargs, headers={MODULE_BUILD_ID_HEADER: module_build_id})
 
 
 def route_task(name, args, kwargs, options, task=None, **kw):
@@ -17,22 +57,21 @@ def route_task(name, args, kwargs, options, task=None, **kw):
 
     Each celery worker will listens on two queues:
         1. mbs-default
-        2. mbs-{number}  # where number is "module_build_id % conf.num_workers"
+        2. mbs-{number}  # where number is the shard of the module build
     If a task is associated with a module build, route it to the queue
     named "mbs-{number}", otherwise, route it to "mbs-default", this is to ensure
-    tasks for a module build can run on the same worker serially.
+    tasks for a module build can run on the same worker serially. The shard is
+    chosen as configured by "shard_assignment", see scheduler/shards.py.
+
+    The module build id is taken from the message header set by `apply_async_for_module_build`
+    or from the task arguments. Only when neither has it, it is looked up in the database.
     """
     queue_name = "mbs-default"
 
-    module_build_id = None
     num_workers = conf.num_workers
 
-    module, handler_name = name.rsplit(".", 1)
-    handler = getattr(__import__(module, fromlist=[handler_name]), handler_name)
-    # handlers can be decorated, inspect the original function
-    while getattr(handler, "__wrapped__", None):
-        handler = handler.__wrapped__
-    handler_args = inspect.getargspec(handler).args
+    module_build_id = (options.get("headers") or {}).get(MODULE_BUILD_ID_HEADER)
+    handler_args = get_handler_args(name)
 
     def _get_handler_arg(name):
         index = handler_args.index(name)
@@ -41,7 +80,7 @@ def route_task(name, args, kwargs, options, task=None, **kw):
             arg_value = args[index]
         return arg_value
 
-    if "module_build_id" in handler_args:
+    if module_build_id is None and "module_build_id" in handler_args:
         module_build_id = _get_handler_arg("module_build_id")
 
     # if module_build_id is not found, we may be able to figure it out
@@ -63,9 +102,14 @@ def route_task(name, args, kwargs, options, task=None, **kw):
             if module_build is not None:
                 module_build_id = module_build.id
 
+    route = {}
     if module_build_id is not None:
-        queue_name = "mbs-{}".format(module_build_id % num_workers)
+        queue_name = "mbs-{}".format(assign_shard(module_build_id, num_workers))
+        if not options.get("headers"):
+            # The worker needs the module build id to release the shard lease
+            route["headers"] = {MODULE_BUILD_ID_HEADER: module_build_id}
 
     taskinfo = {"name": name, "args": args, "kwargs": kwargs, "options": options, "kw": kw}
-    log.debug("Routing task '{}' to queue '{}'. Task info:\n{}".format(name, queue_name, taskinfo))
-    return {"queue": queue_name}
+    log.debug("Routing task '%s' to queue '%s'. Task info:\n%s", name, queue_name, taskinfo)
+    route["queue"] = queue_name
+    return route
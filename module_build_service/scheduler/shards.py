@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+""" Assignment of the module builds to the queues of the Celery workers.
+
+Every Celery worker handles its own queue serially, so all the tasks of a module build are
+routed to the queue of a single worker, called its shard. How the shard is chosen depends on the
+``shard_assignment`` configuration option:
+
+- ``modulo``: the module build id modulo the number of workers.
+- ``hash_ring``: a consistent hash ring, so that changing the number of workers only moves about
+  ``1 / num_workers`` of the module builds to other workers.
+- ``lease``: the shard from the hash ring is leased to the module build in the database for as
+  long as the module build has tasks which are not done yet. When the module build has no such
+  task, it can be assigned to the least busy worker instead, if its own one is behind.
+"""
+
+from __future__ import absolute_import
+import bisect
+from datetime import datetime, timedelta
+import hashlib
+import threading
+import time
+
+from celery.signals import task_postrun
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from module_build_service.common import conf, log, models
+import module_build_service.common.monitor as monitor
+from module_build_service.scheduler.db_session import session_factory
+
+__all__ = ("assign_shard",)
+
+# The name of the message header carrying the id of the module build a task is associated with
+MODULE_BUILD_ID_HEADER = "module_build_id"
+
+
+class HashRing(object):
+    """
+    Consistent hash ring mapping the module build ids to shards.
+
+    Every shard owns ``replicas`` points on the ring, and a module build id is mapped to the shard
+    owning the first point following the hash of the id.
+    """
+
+    def __init__(self, num_shards, replicas):
+        points = sorted(
+            (self._hash("{}-{}".format(shard, replica)), shard)
+            for shard in range(num_shards)
+            for replica in range(replicas)
+        )
+        self._points = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:8], 16)
+
+    def get_shard(self, module_build_id):
+        """
+        :param int module_build_id: the id of the module build.
+        :return: the shard of the module build.
+        :rtype: int
+        """
+        index = bisect.bisect(self._points, self._hash(str(module_build_id)))
+        return self._shards[index % len(self._shards)]
+
+
+_hash_rings = {}
+_hash_rings_lock = threading.Lock()
+
+
+def get_hash_ring(num_shards):
+    """
+    Returns the hash ring for ``num_shards`` shards, which is built only once.
+    """
+    key = (num_shards, conf.shard_ring_replicas)
+    hash_ring = _hash_rings.get(key)
+    if hash_ring is None:
+        with _hash_rings_lock:
+            hash_ring = _hash_rings.get(key)
+            if hash_ring is None:
+                hash_ring = _hash_rings[key] = HashRing(num_shards, conf.shard_ring_replicas)
+    return hash_ring
+
+
+def choose_shard(preferred, loads, steal_threshold):
+    """
+    Choose the shard of a module build with no task in progress.
+
+    :param int preferred: the shard of the module build on the hash ring.
+    :param list loads: the number of tasks in progress of every shard.
+    :param int steal_threshold: how many tasks more than the least busy shard the preferred
+        shard must have to choose the least busy shard instead.
+    :return: the chosen shard.
+    :rtype: int
+    """
+    least_busy = min(range(len(loads)), key=lambda shard: (loads[shard], shard))
+    if loads[preferred] - loads[least_busy] >= steal_threshold:
+        return least_busy
+    return preferred
+
+
+class _CachedLease(object):
+    """ A shard lease cached by the process, see ShardLeases. """
+
+    __slots__ = ("shard", "num_shards", "time_cached")
+
+    def __init__(self, shard, num_shards, time_cached):
+        self.shard = shard
+        self.num_shards = num_shards
+        self.time_cached = time_cached
+
+
+class ShardLeases(object):
+    """
+    The shards leased to the module builds, stored in the module_build_shards table.
+
+    A separate database session is used, so that routing a task never commits or rolls back the
+    session of the code sending the task.
+
+    The leases are cached by the process for ``shard_lease_cache_ttl`` seconds. A task routed
+    using a cached lease is still counted in the database, but by a single UPDATE of the lease
+    which does not lock it nor look at the loads of the shards.
+    """
+
+    def __init__(self, session_factory):
+        self._session_factory = session_factory
+        self._cached = {}
+        self._lock = threading.Lock()
+
+    def _get_loads(self, session, num_shards, lease_cutoff):
+        loads = [0] * num_shards
+        query = (
+            session.query(models.ModuleBuildShard.shard, func.sum(models.ModuleBuildShard.pending))
+            .filter(models.ModuleBuildShard.pending > 0)
+            .filter(models.ModuleBuildShard.time_leased >= lease_cutoff)
+            .group_by(models.ModuleBuildShard.shard)
+        )
+        for shard, pending in query:
+            if shard < num_shards:
+                loads[shard] = pending
+        return loads
+
+    def acquire(self, module_build_id, num_shards):
+        """
+        Get the shard of a module build for a new task and count the task as in progress.
+
+        :param int module_build_id: the id of the module build.
+        :param int num_shards: the number of shards.
+        :return: the shard of the module build.
+        :rtype: int
+        """
+        now = time.time()
+        with self._lock:
+            cached = self._cached.pop(module_build_id, None)
+            # Forget the expired leases
+            for cached_id, lease in list(self._cached.items()):
+                if now - lease.time_cached >= conf.shard_lease_cache_ttl:
+                    del self._cached[cached_id]
+
+        session = self._session_factory()
+        try:
+            if (
+                cached is not None
+                and cached.num_shards == num_shards
+                and now - cached.time_cached < conf.shard_lease_cache_ttl
+                and self._count_task(session, module_build_id, cached.shard)
+            ):
+                shard = cached.shard
+            else:
+                # The lease is not cached, or it expired or was moved meanwhile
+                try:
+                    shard = self._acquire(session, module_build_id, num_shards)
+                except IntegrityError:
+                    # Another process leased a shard to the same module build meanwhile
+                    session.rollback()
+                    shard = self._acquire(session, module_build_id, num_shards)
+                cached = _CachedLease(shard, num_shards, now)
+        finally:
+            session.close()
+
+        with self._lock:
+            self._cached[module_build_id] = cached
+        return shard
+
+    def _count_task(self, session, module_build_id, shard):
+        """
+        Count a task in the lease of the module build, if the lease is still in progress in the
+        shard.
+
+        :return: True if the task was counted.
+        :rtype: bool
+        """
+        now = datetime.utcnow()
+        lease_cutoff = now - timedelta(seconds=conf.shard_lease_timeout)
+        counted = (
+            session.query(models.ModuleBuildShard)
+            .filter_by(module_build_id=module_build_id, shard=shard)
+            .filter(models.ModuleBuildShard.pending > 0)
+            .filter(models.ModuleBuildShard.time_leased >= lease_cutoff)
+            .update(
+                {
+                    models.ModuleBuildShard.pending: models.ModuleBuildShard.pending + 1,
+                    models.ModuleBuildShard.time_leased: now,
+                },
+                synchronize_session=False,
+            )
+        )
+        session.commit()
+        return counted > 0
+
+    def _acquire(self, session, module_build_id, num_shards):
+        now = datetime.utcnow()
+        lease_cutoff = now - timedelta(seconds=conf.shard_lease_timeout)
+        lease = (
+            session.query(models.ModuleBuildShard)
+            .filter_by(module_build_id=module_build_id)
+            .with_for_update()
+            .first()
+        )
+        if (
+            lease is not None
+            and lease.pending > 0
+            and lease.time_leased >= lease_cutoff
+            and lease.shard < num_shards
+        ):
+            # Keep the tasks of the module build in order in the same queue
+            lease.pending += 1
+        else:
+            preferred = get_hash_ring(num_shards).get_shard(module_build_id)
+            loads = self._get_loads(session, num_shards, lease_cutoff)
+            shard = choose_shard(preferred, loads, conf.shard_steal_threshold)
+            if shard != preferred:
+                log.info(
+                    "Assigning module build %d to the shard %d instead of %d, which has %d "
+                    "tasks in progress", module_build_id, shard, preferred, loads[preferred])
+                monitor.shard_lease_stolen_counter.inc()
+            if lease is None:
+                lease = models.ModuleBuildShard(module_build_id=module_build_id)
+                session.add(lease)
+            lease.shard = shard
+            lease.pending = 1
+        lease.time_leased = now
+        shard = lease.shard
+        session.commit()
+        return shard
+
+    def release(self, module_build_id):
+        """
+        Count a task of the module build as done.
+
+        :param int module_build_id: the id of the module build.
+        """
+        session = self._session_factory()
+        try:
+            (
+                session.query(models.ModuleBuildShard)
+                .filter_by(module_build_id=module_build_id)
+                .filter(models.ModuleBuildShard.pending > 0)
+                .update(
+                    {models.ModuleBuildShard.pending: models.ModuleBuildShard.pending - 1},
+                    synchronize_session=False,
+                )
+            )
+            session.commit()
+        finally:
+            session.close()
+
+
+shard_leases = ShardLeases(session_factory)
+
+
+def assign_shard(module_build_id, num_shards):
+    """
+    Get the shard of a module build for a new task, as configured by ``shard_assignment``.
+
+    :param int module_build_id: the id of the module build.
+    :param int num_shards: the number of shards.
+    :return: the shard of the module build.
+    :rtype: int
+    """
+    if conf.shard_assignment == "hash_ring":
+        return get_hash_ring(num_shards).get_shard(module_build_id)
+    if conf.shard_assignment == "lease":
+        return shard_leases.acquire(module_build_id, num_shards)
+    return module_build_id % num_shards
+
+
+@task_postrun.connect
+def release_shard_lease(task=None, **kwargs):
+    """ Count the task as done in the lease of its module build. """
+    if conf.shard_assignment != "lease" or task is None or task.request.is_eager:
+        return
+    module_build_id = getattr(task.request, MODULE_BUILD_ID_HEADER, None)
+    if module_build_id is None:
+        return
+    try:
+        shard_leases.release(module_build_id)
+    except Exception:
+        # The lease expires after shard_lease_timeout anyway
+        log.exception("Failed to release the shard lease of module build %d", module_build_id)
@@ -162,6 +162,32 @@ def record_filtered_rpms(mmd):
     return mmd
 
 
+def record_module_build_rpms(build):
+    """Record the RPMs built in the module build to the RPM index
+
+    The index is used to find the module builds containing particular RPM
+    without querying the build system. The changes are not committed.
+
+    :param ModuleBuild build: the module build which reached the done state.
+    """
+    # Imported here to allow import of utils in GenericBuilder.
+    from module_build_service.builder import GenericBuilder
+
+    builder = GenericBuilder.backends[conf.system]
+    try:
+        rpms = builder.get_module_build_rpms(build)
+    except NotImplementedError:
+        log.debug("The %s builder does not support listing of the built RPMs", conf.system)
+        return
+    except Exception:
+        # The index can be backfilled later, so do not fail the module build because of it.
+        log.exception("Failed to list the RPMs built in %r", build)
+        return
+
+    models.ModuleBuildRPM.record(db_session, build, rpms)
+    log.info("Recorded %d RPMs built in %r", len(rpms), build)
+
+
 def _scm_get_latest(pkg):
     try:
         # If the modulemd specifies that the 'f25' branch is what
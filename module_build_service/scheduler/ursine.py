@@ -2,9 +2,11 @@
 # SPDX-License-Identifier: MIT
 from __future__ import absolute_import
 import re
+import threading
+import time
 
 from module_build_service.common import conf, log
-from module_build_service.common.koji import get_session
+from module_build_service.common.koji import get_session, koji_retrying_multicall_map
 from module_build_service.resolver import GenericResolver
 from module_build_service.scheduler.db_session import db_session
 
@@ -89,6 +91,96 @@ def find_module_koji_tags(koji_session, build_tag):
     ]
 
 
+class UrsineContent(object):
+    """
+    The modules found in the ursine content of a base module's koji_tag, and the RPMs built by
+    them, which are found lazily.
+    """
+
+    def __init__(self, tags, events, modulemds):
+        """
+        :param list tags: the base module's koji_tag and the build tags of its external repos.
+        :param list events: the last change event of every tag, or None if it is unknown.
+        :param list modulemds: the module metadata found in the ursine content.
+        """
+        self.tags = tags
+        self.events = events
+        self.modulemds = modulemds
+        self.time_checked = time.time()
+        # The built RPMs of the modules as NEVRs, by koji_tag of the module
+        self.built_rpms = {}
+
+
+# The latest ursine content found, by base module's koji_tag
+_ursine_contents = {}
+_ursine_contents_lock = threading.Lock()
+
+
+def clear_ursine_contents():
+    """ Forget the ursine content found for all the base modules. """
+    with _ursine_contents_lock:
+        _ursine_contents.clear()
+
+
+def _get_tags_last_change_events(koji_session, tags):
+    return koji_retrying_multicall_map(
+        koji_session, koji_session.tagLastChangeEvent, tags, [{"inherit": True}] * len(tags),
+        method="tagLastChangeEvent",
+    )
+
+
+def get_ursine_content(tag):
+    """
+    Get the ursine content of a base module's koji_tag.
+
+    The ursine content found previously is reused for ``ursine_content_ttl`` seconds. After that,
+    it is reused only if none of the tags it was found from changed since then.
+
+    :param str tag: a base module's koji_tag.
+    :rtype: UrsineContent
+    """
+    with _ursine_contents_lock:
+        content = _ursine_contents.get(tag)
+        if content is not None and time.time() - content.time_checked < conf.ursine_content_ttl:
+            return content
+
+        koji_session = get_session(conf, login=False)
+        if content is not None and content.events is not None:
+            events = _get_tags_last_change_events(koji_session, content.tags)
+            if events == content.events:
+                log.debug("The ursine content of %s did not change.", tag)
+                content.time_checked = time.time()
+                return content
+
+        content = _find_ursine_content(koji_session, tag)
+        _ursine_contents[tag] = content
+        return content
+
+
+def _find_ursine_content(koji_session, tag):
+    resolver = GenericResolver.create(db_session, conf)
+
+    repos = koji_session.getExternalRepoList(tag)
+    build_tags = find_build_tags_from_external_repos(koji_session, repos)
+    tags = [tag] + build_tags
+    # Get the events before finding the modules, so that any change made meanwhile is noticed
+    # the next time the content is checked.
+    events = _get_tags_last_change_events(koji_session, tags)
+    if not build_tags:
+        log.debug("No external repo containing ursine content is found.")
+        return UrsineContent(tags, events, [])
+    modulemds = []
+    for build_tag in build_tags:
+        koji_tags = find_module_koji_tags(koji_session, build_tag)
+        for koji_tag in koji_tags:
+            md = resolver.get_modulemd_by_koji_tag(koji_tag)
+            if md:
+                modulemds.append(md)
+            else:
+                log.warning("No module is found by koji_tag '%s'", koji_tag)
+    return UrsineContent(tags, events, modulemds)
+
+
 def get_modulemds_from_ursine_content(tag):
     """Get all modules metadata which were added to ursine content
 
@@ -111,24 +203,7 @@ def get_modulemds_from_ursine_content(tag):
         modules metadata is found.
     :rtype: list[Modulemd.Module]
     """
-    resolver = GenericResolver.create(db_session, conf)
-
-    koji_session = get_session(conf, login=False)
-    repos = koji_session.getExternalRepoList(tag)
-    build_tags = find_build_tags_from_external_repos(koji_session, repos)
-    if not build_tags:
-        log.debug("No external repo containing ursine content is found.")
-        return []
-    modulemds = []
-    for tag in build_tags:
-        koji_tags = find_module_koji_tags(koji_session, tag)
-        for koji_tag in koji_tags:
-            md = resolver.get_modulemd_by_koji_tag(koji_tag)
-            if md:
-                modulemds.append(md)
-            else:
-                log.warning("No module is found by koji_tag '%s'", koji_tag)
-    return modulemds
+    return list(get_ursine_content(tag).modulemds)
 
 
 def find_stream_collision_modules(buildrequired_modules, koji_tag):
@@ -232,7 +307,8 @@ def handle_stream_collision_modules(mmd):
             # Save modules NSVC for later use in subsequent event handlers to
             # log readable messages.
             base_module_info["stream_collision_modules"] = modules_nsvc
-            base_module_info["ursine_rpms"] = find_module_built_rpms(modules_nsvc)
+            base_module_info["ursine_rpms"] = find_module_built_rpms(
+                modules_nsvc, get_ursine_content(base_module_info["koji_tag"]).built_rpms)
         else:
             log.info("No stream collision module is found against base module %s.", module_name)
             # Always set in order to mark it as handled already.
@@ -242,27 +318,45 @@ def handle_stream_collision_modules(mmd):
     mmd.set_xmd(xmd)
 
 
-def find_module_built_rpms(modules_nsvc):
+def find_module_built_rpms(modules_nsvc, built_rpms=None):
     """Find out built RPMs of given modules
 
     :param modules_nsvc: a list of modules' NSVC to find out built RPMs for
         each of them.
     :type modules_nsvc: list[str]
+    :param dict built_rpms: the built RPMs already found, by koji_tag of the module. The RPMs
+        found by this call are added to it.
     :return: a sorted list of RPMs, each of them is represented as NEVR.
     :rtype: list[str]
+    :raises RuntimeError: if the Koji query fails
     """
     import kobo.rpmlib
     resolver = GenericResolver.create(db_session, conf)
+    if built_rpms is None:
+        built_rpms = {}
 
-    built_rpms = []
-    koji_session = get_session(conf, login=False)
-
+    koji_tags = []
     for nsvc in modules_nsvc:
         name, stream, version, context = nsvc.split(":")
         module = resolver.get_module(name, stream, version, context, strict=True)
-        rpms = koji_session.listTaggedRPMS(module["koji_tag"], latest=True)[0]
-        built_rpms.extend(kobo.rpmlib.make_nvr(rpm, force_epoch=True) for rpm in rpms)
+        koji_tags.append(module["koji_tag"])
+
+    missing_tags = sorted(set(koji_tags) - set(built_rpms))
+    if missing_tags:
+        koji_session = get_session(conf, login=False)
+        results = koji_retrying_multicall_map(
+            koji_session, koji_session.listTaggedRPMS, missing_tags,
+            [{"latest": True}] * len(missing_tags),
+            method="listTaggedRPMS",
+        )
+        if not results:
+            raise RuntimeError(
+                "Getting the tagged RPMs of the following Koji tags failed: {}"
+                .format(", ".join(missing_tags))
+            )
+        for koji_tag, (rpms, _) in zip(missing_tags, results):
+            built_rpms[koji_tag] = [kobo.rpmlib.make_nvr(rpm, force_epoch=True) for rpm in rpms]
 
     # In case there is duplicate NEVRs, ensure every NEVR is unique in the final list.
     # And, sometimes, sorted list of RPMs would be easier to read.
-    return sorted(set(built_rpms))
+    return sorted(set(nevr for koji_tag in koji_tags for nevr in built_rpms[koji_tag]))
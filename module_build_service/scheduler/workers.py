@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+""" A pool of threads handling the events received by the consumer in parallel. """
+
+from __future__ import absolute_import
+import threading
+import time
+
+try:
+    # python3
+    import queue
+except ImportError:
+    # python2
+    import Queue as queue
+
+from module_build_service.common import log
+import module_build_service.common.monitor as monitor
+from module_build_service.scheduler import events
+from module_build_service.scheduler.db_session import db_session
+
+
+class ModuleBuildWorkerPool(object):
+    """
+    Runs the event handlers in a fixed number of threads.
+
+    Each event is assigned to a worker thread by the ID of its module build, so the events of a
+    module build are always handled in the order they were received, while the events of
+    different module builds are handled in parallel. Every worker thread uses its own database
+    session, because ``db_session`` is a thread-local scoped session, and its own queue of
+    handlers scheduled by the handlers.
+    """
+
+    _stop = object()
+
+    def __init__(self, num_workers, run_handler):
+        """
+        :param int num_workers: the number of worker threads.
+        :param run_handler: the callable running an event handler. It is called in the worker
+            threads with the arguments passed to ``submit``, after the module build ID.
+        """
+        if num_workers < 1:
+            raise ValueError("The worker pool needs at least one worker")
+        self._run_handler = run_handler
+        self._shutting_down = False
+        self.queues = [queue.Queue() for _ in range(num_workers)]
+        self.threads = []
+        for index, work_queue in enumerate(self.queues):
+            thread = threading.Thread(
+                target=self._work, args=(index, work_queue), name="mbs-worker-{}".format(index))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, module_build_id, *args):
+        """
+        Queue an event to be handled by the worker thread of its module build.
+
+        :param int module_build_id: the ID of the module build of the event.
+        :param args: the arguments passed to ``run_handler`` after the module build ID.
+        """
+        if self._shutting_down:
+            raise RuntimeError("The worker pool is shutting down")
+        index = module_build_id % len(self.queues)
+        self.queues[index].put((time.time(), module_build_id, args))
+        monitor.consumer_worker_queue_depth_gauge.labels(worker=str(index)).inc()
+
+    def _work(self, index, work_queue):
+        events.scheduler.bind_queue()
+        while True:
+            item = work_queue.get()
+            if item is self._stop:
+                break
+            queued_at, module_build_id, args = item
+            monitor.consumer_worker_queue_depth_gauge.labels(worker=str(index)).dec()
+            monitor.consumer_worker_queue_wait_histogram.observe(time.time() - queued_at)
+            try:
+                self._run_handler(module_build_id, *args)
+            except Exception:
+                monitor.messaging_rx_failed_counter.inc()
+                log.exception("Failed to handle an event of module build %d", module_build_id)
+            finally:
+                db_session.remove()
+
+    def shutdown(self):
+        """
+        Stop accepting new events and wait until all the queued events are handled.
+        """
+        self._shutting_down = True
+        for work_queue in self.queues:
+            work_queue.put(self._stop)
+        for thread in self.threads:
+            thread.join()
@@ -3,16 +3,24 @@
 """Auth system based on the client certificate and FAS account"""
 
 from __future__ import absolute_import
+import hashlib
 import json
 import ssl
+import time
 
-from dogpile.cache import make_region
+from dogpile.cache.api import NO_VALUE
 from flask import g
-import requests
 
 from module_build_service import app
 from module_build_service.common import conf, log
+from module_build_service.common.cache import make_bounded_region
 from module_build_service.common.errors import Unauthorized, Forbidden
+from module_build_service.common.monitor import (
+    auth_oidc_cache_hit_counter,
+    auth_oidc_cache_miss_counter,
+    auth_oidc_request_histogram,
+)
+from module_build_service.common.request_utils import get_requests_session
 
 
 try:
@@ -22,7 +30,10 @@ except ImportError:
 
 
 client_secrets = None
-region = make_region().configure("dogpile.cache.memory")
+region = make_bounded_region(
+    conf.auth_cache_backend, conf.auth_cache_arguments, conf.auth_cache_max_entries)
+# Pooled HTTP session used for the requests to the OIDC identity provider
+oidc_session = get_requests_session()
 
 
 def _json_loads(content):
@@ -58,7 +69,10 @@ def _get_token_info(token):
     }
     headers = {"Content-type": "application/x-www-form-urlencoded"}
 
-    resp = requests.post(client_secrets["token_introspection_uri"], data=request, headers=headers)
+    with auth_oidc_request_histogram.labels(endpoint="introspection").time():
+        resp = oidc_session.post(
+            client_secrets["token_introspection_uri"], data=request, headers=headers,
+            timeout=conf.net_timeout)
     return resp.json()
 
 
@@ -70,10 +84,52 @@ def _get_user_info(token):
         return None
 
     headers = {"authorization": "Bearer " + token}
-    resp = requests.get(client_secrets["userinfo_uri"], headers=headers)
+    with auth_oidc_request_histogram.labels(endpoint="userinfo").time():
+        resp = oidc_session.get(
+            client_secrets["userinfo_uri"], headers=headers, timeout=conf.net_timeout)
     return resp.json()
 
 
+def _get_token_cache_key(token):
+    """
+    Returns the cache key of the OIDC token. Only the hash of the token is stored in the cache.
+    """
+    return "oidc_token_" + hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _get_cached_token_data(token):
+    """
+    Returns the cached tuple of the token info and user info of the OIDC token or None
+    when it is not cached or when the cached data expired.
+    """
+    if conf.oidc_token_cache_max_ttl <= 0:
+        return None
+
+    cached = region.get(_get_token_cache_key(token))
+    if cached is NO_VALUE:
+        return None
+
+    expires_at, data, extended_data = cached
+    if expires_at <= time.time():
+        region.delete(_get_token_cache_key(token))
+        return None
+    return data, extended_data
+
+
+def _cache_token_data(token, data, extended_data):
+    """
+    Caches the token info and user info of the validated OIDC token. The data are cached
+    until the token expires, but at most for OIDC_TOKEN_CACHE_MAX_TTL seconds.
+    """
+    if conf.oidc_token_cache_max_ttl <= 0:
+        return
+
+    expires_at = time.time() + conf.oidc_token_cache_max_ttl
+    if data.get("exp"):
+        expires_at = min(expires_at, float(data["exp"]))
+    region.set(_get_token_cache_key(token), (expires_at, data, extended_data))
+
+
 def get_user_oidc(request):
     """
     Returns the client's username and groups based on the OIDC token provided.
@@ -89,12 +145,18 @@ def get_user_oidc(request):
         raise Unauthorized("Authorization headers must start with %r" % prefix)
 
     token = header[len(prefix):].strip()
-    try:
-        data = _get_token_info(token)
-    except Exception as e:
-        error = "Cannot verify OIDC token: %s" % str(e)
-        log.exception(error)
-        raise Exception(error)
+    cached = _get_cached_token_data(token)
+    if cached:
+        auth_oidc_cache_hit_counter.inc()
+        data, extended_data = cached
+    else:
+        auth_oidc_cache_miss_counter.inc()
+        try:
+            data = _get_token_info(token)
+        except Exception as e:
+            error = "Cannot verify OIDC token: %s" % str(e)
+            log.exception(error)
+            raise Exception(error)
 
     if not data or "active" not in data or not data["active"]:
         raise Unauthorized("OIDC token invalid or expired.")
@@ -112,12 +174,14 @@ def get_user_oidc(request):
         if scope not in presented_scopes:
             raise Unauthorized("Required OIDC scope %r not present: %r" % (scope, presented_scopes))
 
-    try:
-        extended_data = _get_user_info(token)
-    except Exception:
-        error = "OpenIDC auth error: Cannot determine the user's groups"
-        log.exception(error)
-        raise Unauthorized(error)
+    if not cached:
+        try:
+            extended_data = _get_user_info(token)
+        except Exception:
+            error = "OpenIDC auth error: Cannot determine the user's groups"
+            log.exception(error)
+            raise Unauthorized(error)
+        _cache_token_data(token, data, extended_data)
 
     username = data["username"]
     # If the user is part of the whitelist, then the group membership check is skipped
@@ -1,12 +1,20 @@
 # -*- coding: utf-8 -*-
 # SPDX-License-Identifier: MIT
 from __future__ import absolute_import
+import concurrent.futures
+import copy
+import hashlib
+import json
+import time
+
+from sqlalchemy import func
 
 from module_build_service.common import conf, log, models
+from module_build_service.common.cache import LRUDict
+import module_build_service.common.monitor as monitor
 from module_build_service.common.errors import StreamAmbigous, UnprocessableEntity
 from module_build_service.common.modulemd import Modulemd
 from module_build_service.common.resolve import expand_single_mse_streams, get_base_module_mmds
-from module_build_service.common.utils import mmd_to_str
 from module_build_service.resolver import GenericResolver
 from module_build_service.web.mmd_resolver import MMDResolver
 from module_build_service.web.utils import deps_to_dict
@@ -54,83 +62,115 @@ def expand_mse_streams(db_session, mmd, default_streams=None, raise_if_stream_am
         mmd.add_dependencies(new_deps)
 
 
-def _get_mmds_from_requires(
-    db_session,
-    requires,
-    mmds,
-    recursive=False,
-    default_streams=None,
-    raise_if_stream_ambigous=False,
-    base_module_mmds=None,
-):
+class _RequiresGatherer(object):
     """
-    Helper method for get_mmds_required_by_module_recursively returning
-    the list of module metadata objects defined by `requires` dict.
+    Helper of get_mmds_required_by_module_recursively gathering the module metadata objects
+    of the required modules.
 
-    :param db_session: SQLAlchemy database session.
-    :param dict requires: requires or buildrequires in the form {module: [streams]}
-    :param mmds: Dictionary with already handled name:streams as a keys and lists
-        of resulting mmds as values.
-    :param recursive: If True, the requires are checked recursively.
-    :param dict default_streams: Dict in {module_name: module_stream, ...} format defining
-        the default stream to choose for module in case when there are multiple streams to
-        choose from.
-    :param bool raise_if_stream_ambigous: When True, raises a StreamAmbigous exception in case
-        there are multiple streams for some dependency of module and the module name is not
-        defined in `default_streams`, so it is not clear which stream should be used.
-    :param list base_module_mmds: List of modulemd metadata instances. When set, the
-        returned list contains MMDs build against each base module defined in
-        `base_module_mmds` list.
-    :return: Dict with name:stream as a key and list with mmds as value.
+    The modules are looked up in the resolver once per name, stream and base module, and the
+    results are kept for the whole submission. The independent lookups run concurrently when
+    the resolver allows it.
     """
-    default_streams = default_streams or {}
-    # To be able to call itself recursively, we need to store list of mmds
-    # we have added to global mmds list in this particular call.
-    added_mmds = {}
-    resolver = GenericResolver.create(db_session, conf)
-
-    for name, streams in requires.items():
-        # Base modules are already added to `mmds`.
-        if name in conf.base_module_names:
-            continue
-
-        streams_to_try = streams
-        if name in default_streams:
-            streams_to_try = [default_streams[name]]
-        elif len(streams_to_try) > 1 and raise_if_stream_ambigous:
-            raise StreamAmbigous(
-                "There are multiple streams %r to choose from for module %s."
-                % (streams_to_try, name)
-            )
 
-        # For each valid stream, find the last build in a stream and also all
-        # its contexts and add mmds of these builds to `mmds` and `added_mmds`.
-        # Of course only do that if we have not done that already in some
-        # previous call of this method.
-        for stream in streams:
-            ns = "%s:%s" % (name, stream)
-            if ns not in mmds:
-                mmds[ns] = []
-            if ns not in added_mmds:
-                added_mmds[ns] = []
-
-            if base_module_mmds:
-                for base_module_mmd in base_module_mmds:
-                    mmds[ns] += resolver.get_buildrequired_modulemds(name, stream, base_module_mmd)
-            else:
-                mmds[ns] = resolver.get_module_modulemds(name, stream, strict=True)
-            added_mmds[ns] += mmds[ns]
-
-    # Get the requires recursively.
-    if recursive:
-        for mmd_list in added_mmds.values():
-            for mmd in mmd_list:
-                for deps in mmd.get_dependencies():
-                    deps_dict = deps_to_dict(deps, 'runtime')
-                    mmds = _get_mmds_from_requires(
-                        db_session, deps_dict, mmds, True, base_module_mmds=base_module_mmds)
-
-    return mmds
+    def __init__(self, db_session, base_module_mmds=None):
+        """
+        :param db_session: SQLAlchemy database session.
+        :param list base_module_mmds: List of modulemd metadata instances. When set, the
+            gathered mmds are the ones built against each base module defined in
+            `base_module_mmds` list.
+        """
+        self.resolver = GenericResolver.create(db_session, conf)
+        self.base_module_mmds = base_module_mmds
+        # Dict with (name, stream, base module NSVC) as a key and list with mmds as value.
+        self.memo = {}
+        # Number of lookups in the resolver
+        self.lookups = 0
+        # Number of required name:streams which were already gathered
+        self.memo_hits = 0
+
+    def _lookup(self, name, stream, base_module_mmd):
+        if base_module_mmd is None:
+            return self.resolver.get_module_modulemds(name, stream, strict=True)
+        return self.resolver.get_buildrequired_modulemds(name, stream, base_module_mmd)
+
+    def lookup(self, name_streams):
+        """
+        Looks up the mmds of the modules which are not in the memo yet.
+
+        :param list name_streams: List of (name, stream) tuples.
+        :return: List with the list of mmds of every name:stream.
+        """
+        base_module_mmds = self.base_module_mmds or [None]
+        tasks = {}
+        for name, stream in name_streams:
+            for base_module_mmd in base_module_mmds:
+                base_module_nsvc = base_module_mmd.get_nsvc() if base_module_mmd else None
+                key = (name, stream, base_module_nsvc)
+                if key not in self.memo:
+                    tasks[key] = (name, stream, base_module_mmd)
+
+        keys = list(tasks.keys())
+        workers = min(conf.resolver_lookup_workers, len(keys))
+        if workers > 1 and self.resolver.concurrent_lookups:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(lambda key: self._lookup(*tasks[key]), keys))
+        else:
+            results = [self._lookup(*tasks[key]) for key in keys]
+        self.memo.update(zip(keys, results))
+        self.lookups += len(keys)
+
+        ret = []
+        for name, stream in name_streams:
+            mmds = []
+            for base_module_mmd in base_module_mmds:
+                base_module_nsvc = base_module_mmd.get_nsvc() if base_module_mmd else None
+                mmds += self.memo[(name, stream, base_module_nsvc)]
+            ret.append(mmds)
+        return ret
+
+    def gather(self, requires_list, mmds, default_streams=None, raise_if_stream_ambigous=False):
+        """
+        Adds the mmds of the modules defined by the `requires_list` dicts to `mmds`.
+
+        :param list requires_list: List of requires or buildrequires in the form
+            {module: [streams]}.
+        :param mmds: Dictionary with already handled name:streams as a keys and lists
+            of resulting mmds as values.
+        :param dict default_streams: Dict in {module_name: module_stream, ...} format defining
+            the default stream to choose for module in case when there are multiple streams to
+            choose from.
+        :param bool raise_if_stream_ambigous: When True, raises a StreamAmbigous exception in
+            case there are multiple streams for some dependency of module and the module name
+            is not defined in `default_streams`, so it is not clear which stream should be used.
+        :return: List with the mmds added to `mmds`.
+        """
+        default_streams = default_streams or {}
+        name_streams = []
+        for requires in requires_list:
+            for name, streams in requires.items():
+                # Base modules are already added to `mmds`.
+                if name in conf.base_module_names:
+                    continue
+
+                if name not in default_streams and len(streams) > 1 and raise_if_stream_ambigous:
+                    raise StreamAmbigous(
+                        "There are multiple streams %r to choose from for module %s."
+                        % (streams, name)
+                    )
+
+                for stream in streams:
+                    ns = "%s:%s" % (name, stream)
+                    if ns in mmds:
+                        self.memo_hits += 1
+                        continue
+                    mmds[ns] = []
+                    name_streams.append((name, stream))
+
+        added_mmds = []
+        for (name, stream), ns_mmds in zip(name_streams, self.lookup(name_streams)):
+            mmds["%s:%s" % (name, stream)] = ns_mmds
+            added_mmds += ns_mmds
+        return added_mmds
 
 
 def get_mmds_required_by_module_recursively(
@@ -187,21 +227,33 @@ def get_mmds_required_by_module_recursively(
     # also EOL platform streams.
     all_base_module_mmds = base_module_mmds["ready"] + base_module_mmds["garbage"]
 
+    gatherer = _RequiresGatherer(db_session, all_base_module_mmds)
+
     # Get all the buildrequires of the module of interest.
-    for deps in mmd.get_dependencies():
-        deps_dict = deps_to_dict(deps, 'buildtime')
-        mmds = _get_mmds_from_requires(
-            db_session, deps_dict, mmds, False, default_streams, raise_if_stream_ambigous,
-            all_base_module_mmds)
-
-    # Now get the requires of buildrequires recursively.
-    for mmd_key in list(mmds.keys()):
-        for mmd in mmds[mmd_key]:
-            for deps in mmd.get_dependencies():
-                deps_dict = deps_to_dict(deps, 'runtime')
-                mmds = _get_mmds_from_requires(
-                    db_session, deps_dict, mmds, True, default_streams,
-                    raise_if_stream_ambigous, all_base_module_mmds)
+    buildrequires = [deps_to_dict(deps, "buildtime") for deps in mmd.get_dependencies()]
+    gatherer.gather(buildrequires, mmds, default_streams, raise_if_stream_ambigous)
+
+    # Now get the requires of buildrequires recursively, level by level. The streams are checked
+    # for ambiguity only in the requires of the buildrequires and of the base modules.
+    to_expand = [m for mmds_list in mmds.values() for m in mmds_list]
+    expanded = set()
+    level_args = (default_streams, raise_if_stream_ambigous)
+    while to_expand:
+        requires = []
+        for m in to_expand:
+            nsvc = m.get_nsvc()
+            if nsvc in expanded:
+                continue
+            expanded.add(nsvc)
+            requires += [deps_to_dict(deps, "runtime") for deps in m.get_dependencies()]
+        to_expand = gatherer.gather(requires, mmds, *level_args)
+        level_args = ()
+
+    log.info(
+        "Gathered the modules required by %s:%s with %d resolver lookups, %d requires were "
+        "already gathered", mmd.get_module_name(), mmd.get_stream_name(), gatherer.lookups,
+        gatherer.memo_hits)
+    monitor.mse_resolver_lookups_histogram.observe(gatherer.lookups)
 
     # Make single list from dict of lists.
     res = []
@@ -212,34 +264,98 @@ def get_mmds_required_by_module_recursively(
     return res
 
 
-def generate_expanded_mmds(db_session, mmd, raise_if_stream_ambigous=False, default_streams=None):
+class ExpansionPlanCache(object):
     """
-    Returns list with MMDs with buildrequires and requires set according
-    to module stream expansion rules. These module metadata can be directly
-    built using MBS.
+    Cache of the expansion plans computed by `generate_expanded_mmds`.
 
-    :param db_session: SQLAlchemy DB session.
-    :param Modulemd.ModuleStream mmd: Modulemd metadata with original unexpanded module.
-    :param bool raise_if_stream_ambigous: When True, raises a StreamAmbigous exception in case
-        there are multiple streams for some dependency of module and the module name is not
-        defined in `default_streams`, so it is not clear which stream should be used.
-    :param dict default_streams: Dict in {module_name: module_stream, ...} format defining
-        the default stream to choose for module in case when there are multiple streams to
-        choose from.
+    The plans are keyed by the name, stream and expanded dependencies of the module, and they
+    are valid only as long as the ready module builds of the modules the plan was computed
+    from are the same, so they are invalidated when one of those modules becomes ready (or
+    stops being ready). The cache is used only with the "db" resolver, because the modules
+    of the other resolvers do not all come from the MBS database.
     """
-    if not default_streams:
-        default_streams = {}
-
-    # Create local copy of mmd, because we will expand its dependencies,
-    # which would change the module.
-    current_mmd = mmd.copy()
 
-    # MMDResolver expects the input MMD to have no context.
-    current_mmd.set_context(None)
-
-    # Expands the MSE streams. This mainly handles '-' prefix in MSE streams.
-    expand_mse_streams(db_session, current_mmd, default_streams, raise_if_stream_ambigous)
+    def __init__(self, max_entries):
+        # Dict with key as a key and (time created, module names, fingerprint, plan) tuple as
+        # value.
+        self._plans = LRUDict(max_entries)
+
+    @staticmethod
+    def enabled():
+        return conf.expansion_plan_cache_ttl > 0 and conf.resolver == "db"
+
+    @staticmethod
+    def get_key(mmd, default_streams, raise_if_stream_ambigous):
+        """
+        Returns the key of the expansion plan of the module with expanded streams `mmd`.
+        """
+        deps = [
+            [deps_to_dict(d, "buildtime"), deps_to_dict(d, "runtime")]
+            for d in mmd.get_dependencies()
+        ]
+        data = [
+            mmd.get_module_name(), mmd.get_stream_name(), deps, default_streams or {},
+            raise_if_stream_ambigous,
+        ]
+        return hashlib.sha1(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def get_fingerprint(db_session, names):
+        """
+        Returns the number and the highest id of the ready module builds of every module.
+        """
+        query = (
+            db_session.query(
+                models.ModuleBuild.name,
+                func.count(models.ModuleBuild.id),
+                func.max(models.ModuleBuild.id),
+            )
+            .filter(models.ModuleBuild.name.in_(names))
+            .filter(models.ModuleBuild.state == models.BUILD_STATES["ready"])
+            .group_by(models.ModuleBuild.name)
+        )
+        return {name: (count, max_id) for name, count, max_id in query}
+
+    def get(self, db_session, key):
+        """
+        Returns a copy of the expansion plan, or None when it is not cached or not valid anymore.
+        """
+        entry = self._plans.get(key)
+        if entry is None:
+            return None
+        time_created, names, fingerprint, plan = entry
+        if (
+            time.time() - time_created >= conf.expansion_plan_cache_ttl
+            or self.get_fingerprint(db_session, names) != fingerprint
+        ):
+            self._plans.pop(key, None)
+            return None
+        return copy.deepcopy(plan)
+
+    def add(self, db_session, key, names, plan):
+        """
+        Caches the expansion plan computed from the modules `names`.
+        """
+        names = sorted(names)
+        entry = (time.time(), names, self.get_fingerprint(db_session, names), copy.deepcopy(plan))
+        self._plans[key] = entry
+
+    def clear(self):
+        self._plans.clear()
+
+
+expansion_plans = ExpansionPlanCache(conf.expansion_plan_cache_size)
+
+
+def _get_expansion_plan(db_session, current_mmd, default_streams, raise_if_stream_ambigous):
+    """
+    Computes the expansion plan of the module with expanded streams `current_mmd`.
 
+    :return: tuple with the plan and the set with the names of the modules it is computed from.
+        The plan is a list with a dict for every module build to create, with the index of the
+        dependencies in "dependencies_id", the buildrequired stream of every module in
+        "streams" and the resolved buildrequires in "buildrequires".
+    """
     # Get the list of all MMDs which this module can be possibly built against
     # and add them to MMDResolver.
     mmd_resolver = MMDResolver()
@@ -257,13 +373,9 @@ def generate_expanded_mmds(db_session, mmd, raise_if_stream_ambigous=False, defa
     requires_combinations = mmd_resolver.solve(current_mmd)
     log.info("Resolving done, possible requires: %r", requires_combinations)
 
-    # This is where we are going to store the generated MMDs.
-    mmds = []
+    plan = []
+    resolver = GenericResolver.create(db_session, conf)
     for requires in requires_combinations:
-        # Each generated MMD must be new Module object...
-        mmd_copy = mmd.copy()
-        xmd = mmd_copy.get_xmd()
-
         # Requires contain the NSVC representing the input mmd.
         # The 'context' of this NSVC defines the id of buildrequires/requires
         # pair in the mmd.get_dependencies().
@@ -295,6 +407,84 @@ def generate_expanded_mmds(db_session, mmd, raise_if_stream_ambigous=False, defa
                 % (current_mmd.get_module_name(), current_mmd.get_stream_name(), requires)
             )
 
+        # The Modulemd.Dependencies() stores only streams, but to really build this
+        # module, we need NSVC of buildrequires, so we have to store this data in XMD.
+        # We also need additional data like for example list of filtered_rpms. We will
+        # get them using module_build_service.resolver.GenericResolver.resolve_requires,
+        # so prepare list with NSVCs of buildrequires as an input for this method.
+        br_list = []
+        for nsvca in requires:
+            if nsvca == self_nsvca:
+                continue
+            # Remove the arch from nsvca
+            nsvc = ":".join(nsvca.split(":")[:-1])
+            br_list.append(nsvc)
+
+        plan.append({
+            "dependencies_id": dependencies_id,
+            "streams": req_name_stream,
+            "buildrequires": resolver.resolve_requires(br_list),
+        })
+
+    names = {m.get_module_name() for m in mmds_for_resolving}
+    for deps in current_mmd.get_dependencies():
+        names.update(deps.get_buildtime_modules())
+        names.update(deps.get_runtime_modules())
+    return plan, names
+
+
+def generate_expanded_mmds(db_session, mmd, raise_if_stream_ambigous=False, default_streams=None):
+    """
+    Returns list with MMDs with buildrequires and requires set according
+    to module stream expansion rules. These module metadata can be directly
+    built using MBS.
+
+    :param db_session: SQLAlchemy DB session.
+    :param Modulemd.ModuleStream mmd: Modulemd metadata with original unexpanded module.
+    :param bool raise_if_stream_ambigous: When True, raises a StreamAmbigous exception in case
+        there are multiple streams for some dependency of module and the module name is not
+        defined in `default_streams`, so it is not clear which stream should be used.
+    :param dict default_streams: Dict in {module_name: module_stream, ...} format defining
+        the default stream to choose for module in case when there are multiple streams to
+        choose from.
+    """
+    if not default_streams:
+        default_streams = {}
+
+    # Create local copy of mmd, because we will expand its dependencies,
+    # which would change the module.
+    current_mmd = mmd.copy()
+
+    # MMDResolver expects the input MMD to have no context.
+    current_mmd.set_context(None)
+
+    # Expands the MSE streams. This mainly handles '-' prefix in MSE streams.
+    expand_mse_streams(db_session, current_mmd, default_streams, raise_if_stream_ambigous)
+
+    # Repeated submissions of the same module against the same modules reuse the plan.
+    plan = None
+    use_cache = expansion_plans.enabled()
+    if use_cache:
+        key = expansion_plans.get_key(current_mmd, default_streams, raise_if_stream_ambigous)
+        plan = expansion_plans.get(db_session, key)
+        if plan is not None:
+            log.info(
+                "Using the cached expansion plan of %s:%s",
+                current_mmd.get_module_name(), current_mmd.get_stream_name())
+    if plan is None:
+        plan, names = _get_expansion_plan(
+            db_session, current_mmd, default_streams, raise_if_stream_ambigous)
+        if use_cache:
+            expansion_plans.add(db_session, key, names, plan)
+
+    # This is where we are going to store the generated MMDs.
+    mmds = []
+    for item in plan:
+        # Each generated MMD must be new Module object...
+        mmd_copy = mmd.copy()
+        xmd = mmd_copy.get_xmd()
+        req_name_stream = item["streams"]
+
         # The name:[streams, ...] pairs do not have to be the same in both
         # buildrequires/requires. In case they are the same, we replace the streams
         # in requires section with a single stream against which we will build this MMD.
@@ -302,7 +492,7 @@ def generate_expanded_mmds(db_session, mmd, raise_if_stream_ambigous=False, defa
         # section.  We always replace stream(s) for build-requirement with the one we
         # will build this MMD against.
         new_deps = Modulemd.Dependencies()
-        deps = mmd_copy.get_dependencies()[dependencies_id]
+        deps = mmd_copy.get_dependencies()[item["dependencies_id"]]
         deps_requires = deps_to_dict(deps, 'runtime')
         deps_buildrequires = deps_to_dict(deps, 'buildtime')
         for req_name, req_streams in deps_requires.items():
@@ -341,30 +531,16 @@ def generate_expanded_mmds(db_session, mmd, raise_if_stream_ambigous=False, defa
         mmd_copy.remove_dependencies(deps)
         mmd_copy.add_dependencies(new_deps)
 
-        # The Modulemd.Dependencies() stores only streams, but to really build this
-        # module, we need NSVC of buildrequires, so we have to store this data in XMD.
-        # We also need additional data like for example list of filtered_rpms. We will
-        # get them using module_build_service.resolver.GenericResolver.resolve_requires,
-        # so prepare list with NSVCs of buildrequires as an input for this method.
-        br_list = []
-        for nsvca in requires:
-            if nsvca == self_nsvca:
-                continue
-            # Remove the arch from nsvca
-            nsvc = ":".join(nsvca.split(":")[:-1])
-            br_list.append(nsvc)
-
-        # Resolve the buildrequires and store the result in XMD.
+        # Store the resolved buildrequires in XMD.
         if "mbs" not in xmd:
             xmd["mbs"] = {}
-        resolver = GenericResolver.create(db_session, conf)
-        xmd["mbs"]["buildrequires"] = resolver.resolve_requires(br_list)
+        xmd["mbs"]["buildrequires"] = item["buildrequires"]
         xmd["mbs"]["mse"] = True
 
         mmd_copy.set_xmd(xmd)
 
         # Now we have all the info to actually compute context of this module.
-        context = models.ModuleBuild.contexts_from_mmd(mmd_to_str(mmd_copy)).context
+        context = models.ModuleBuild.calculate_contexts(mmd_copy).context
         mmd_copy.set_context(context)
 
         mmds.append(mmd_copy)
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+""" Module build submissions processed in the background.
+
+Fetching the modulemd, expanding its streams and recording the module builds can take long for
+large submissions. With the ``submission_async`` option enabled, the clients can ask for an
+asynchronous submission. It is recorded as a ``ModuleSubmissionJob`` and processed by a bounded
+pool of threads of the frontend process. The client then polls the job until it is done, or waits
+for the state change messages of the new module builds.
+"""
+
+from __future__ import absolute_import
+import concurrent.futures
+from datetime import datetime
+import threading
+
+from module_build_service import app, db
+from module_build_service.common import conf, log, models
+from module_build_service.common.errors import (
+    Conflict, Forbidden, NotFound, Unauthorized, UnprocessableEntity, ValidationError
+)
+
+# The HTTP status of the errors failing a submission, matching the API error handlers
+_ERROR_STATUSES = (
+    (ValidationError, 400),
+    (Unauthorized, 401),
+    (Forbidden, 403),
+    (NotFound, 404),
+    (Conflict, 409),
+    (UnprocessableEntity, 422),
+)
+
+
+def _get_error_status(error):
+    for error_class, status in _ERROR_STATUSES:
+        if isinstance(error, error_class):
+            return status
+    return 500
+
+
+class SubmissionJobs(object):
+    """ The pool of threads processing the submission jobs of the frontend process. """
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, username, submit_func):
+        """
+        Records a new submission job and queues it for processing.
+
+        :param str username: the owner of the submitted module builds.
+        :param submit_func: the function submitting the module builds, called with the database
+            session and returning the list of the submitted module builds.
+        :return: the submission job.
+        :rtype: ModuleSubmissionJob
+        """
+        job = models.ModuleSubmissionJob(
+            owner=username,
+            state=models.SUBMISSION_JOB_STATES["queued"],
+            time_submitted=datetime.utcnow(),
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=conf.submission_workers)
+            self._executor.submit(self._process, job.id, submit_func)
+        return job
+
+    def shutdown(self):
+        """ Waits for the queued submission jobs to be processed. """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    @staticmethod
+    def _process(job_id, submit_func):
+        with app.app_context():
+            job = db.session.query(models.ModuleSubmissionJob).get(job_id)
+            job.state = models.SUBMISSION_JOB_STATES["running"]
+            db.session.commit()
+
+            try:
+                module_builds = submit_func(db.session)
+            except Exception as e:
+                db.session.rollback()
+                job.error_status = _get_error_status(e)
+                if job.error_status == 500:
+                    log.exception("Failed to process the submission job %d", job_id)
+                job.error_message = str(e)
+                job.state = models.SUBMISSION_JOB_STATES["failed"]
+            else:
+                job.module_build_ids = [module_build.id for module_build in module_builds]
+                job.state = models.SUBMISSION_JOB_STATES["done"]
+            job.time_completed = datetime.utcnow()
+            db.session.commit()
+
+
+submission_jobs = SubmissionJobs()
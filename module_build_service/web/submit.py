@@ -107,9 +107,15 @@ def get_prefixed_version(mmd):
     return new_version
 
 
-def submit_module_build_from_yaml(
-    db_session, username, handle, params, stream=None, skiptests=False
-):
+def load_mmd_from_yaml(handle, stream=None, skiptests=False):
+    """
+    Loads the modulemd of a module submitted as a YAML file.
+
+    :param handle: the file object with the modulemd YAML.
+    :param str stream: the stream of the module overriding the one in the modulemd.
+    :param bool skiptests: whether to disable the %check section of the components.
+    :rtype: Modulemd.ModuleStream
+    """
     yaml_file = to_text_type(handle.read())
     mmd = load_mmd(yaml_file)
     dt = datetime.utcfromtimestamp(int(time.time()))
@@ -132,6 +138,13 @@ def submit_module_build_from_yaml(
         macros = buildopts.get_rpm_macros() or ""
         buildopts.set_rpm_macros(macros + "\n\n%__spec_check_pre exit 0\n")
         mmd.set_buildopts(buildopts)
+    return mmd
+
+
+def submit_module_build_from_yaml(
+    db_session, username, handle, params, stream=None, skiptests=False
+):
+    mmd = load_mmd_from_yaml(handle, stream, skiptests)
     return submit_module_build(db_session, username, mmd, params)
 
 
@@ -519,24 +532,16 @@ def _process_support_streams(db_session, mmd, params):
     _modify_buildtime_streams(db_session, mmd, new_streams_func)
 
 
-def submit_module_build(db_session, username, mmd, params):
+def _expand_module_build(db_session, mmd, params):
     """
-    Submits new module build.
+    Applies the dependency overrides on the submitted module and expands its streams.
 
     :param db_session: SQLAlchemy session object.
-    :param str username: Username of the build's owner.
     :param Modulemd.ModuleStream mmd: Modulemd defining the build.
     :param dict params: the API parameters passed in by the user
-    :rtype: list with ModuleBuild
-    :return: List with submitted module builds.
+    :rtype: list with Modulemd.ModuleStream
+    :return: List with the modulemds of the module builds to create.
     """
-    log.debug(
-        "Submitted %s module build for %s:%s:%s",
-        ("scratch" if params.get("scratch", False) else "normal"),
-        mmd.get_module_name(),
-        mmd.get_stream_name(),
-        mmd.get_version(),
-    )
     validate_mmd(mmd)
 
     raise_if_stream_ambigous = False
@@ -558,7 +563,31 @@ def submit_module_build(db_session, username, mmd, params):
             "No dependency combination was satisfied. Please verify the "
             "buildrequires in your modulemd have previously been built."
         )
+    return mmds
+
+
+def submit_module_build(db_session, username, mmd, params):
+    """
+    Submits new module build.
+
+    :param db_session: SQLAlchemy session object.
+    :param str username: Username of the build's owner.
+    :param Modulemd.ModuleStream mmd: Modulemd defining the build.
+    :param dict params: the API parameters passed in by the user
+    :rtype: list with ModuleBuild
+    :return: List with submitted module builds.
+    """
+    log.debug(
+        "Submitted %s module build for %s:%s:%s",
+        ("scratch" if params.get("scratch", False) else "normal"),
+        mmd.get_module_name(),
+        mmd.get_stream_name(),
+        mmd.get_version(),
+    )
+    mmds = _expand_module_build(db_session, mmd, params)
     modules = []
+    # The newly created module builds with their Modulemd metadata
+    new_modules = []
 
     # True if all module builds are skipped so MBS will actually not rebuild
     # anything. To keep the backward compatibility, we need to raise an exception
@@ -569,10 +598,29 @@ def submit_module_build(db_session, username, mmd, params):
         # Prefix the version of the modulemd based on the base module it buildrequires
         version = get_prefixed_version(mmd)
         mmd.set_version(version)
+
+    # Get all the module builds with the same name, stream and version as any of the module
+    # builds to submit at once, instead of querying them for every NSVC.
+    # All the expanded modulemds have the same name and stream.
+    nsv_builds = (
+        db_session.query(models.ModuleBuild)
+        .filter_by(name=mmds[0].get_module_name(), stream=mmds[0].get_stream_name())
+        .filter(models.ModuleBuild.version.in_({str(m.get_version()) for m in mmds}))
+        .all()
+    )
+
+    for mmd in mmds:
         nsvc = mmd.get_nsvc()
+        version = str(mmd.get_version())
 
         log.debug("Checking whether module build already exists: %s.", nsvc)
-        module = models.ModuleBuild.get_build_from_nsvc(db_session, *nsvc.split(":"))
+        module = next(
+            (
+                build for build in nsv_builds
+                if build.version == version and build.context == mmd.get_context()
+            ),
+            None,
+        )
         if module and not params.get("scratch", False):
             if module.state != models.BUILD_STATES["failed"]:
                 log.info(
@@ -611,8 +659,12 @@ def submit_module_build(db_session, username, mmd, params):
             context_suffix = ""
             if params.get("scratch", False):
                 log.debug("Checking for existing scratch module builds by NSVC")
-                scrmods = models.ModuleBuild.get_scratch_builds_from_nsvc(
-                    db_session, *nsvc.split(":"))
+                scrmods = [
+                    build for build in nsv_builds
+                    if build.scratch
+                    and build.version == version
+                    and build.context.startswith(mmd.get_context())
+                ]
                 scrmod_contexts = [scrmod.context for scrmod in scrmods]
                 log.debug(
                     "Found %d previous scratch module build context(s): %s",
@@ -648,16 +700,13 @@ def submit_module_build(db_session, username, mmd, params):
                 reused_module_id=params.get("reuse_components_from"),
                 scratch=params.get("scratch"),
                 srpms=params.get("srpms"),
+                mmd=mmd,
+                commit=False,
             )
             module.build_context, module.runtime_context, module.context, \
-                module.build_context_no_bms = module.contexts_from_mmd(module.modulemd)
+                module.build_context_no_bms = models.ModuleBuild.calculate_contexts(mmd)
             module.context += context_suffix
-            db_session.commit()
-
-            notify_on_module_state_change(
-                # Note the state is "init" here...
-                module.json(db_session, show_tasks=False)
-            )
+            new_modules.append((module, mmd))
 
         all_modules_skipped = False
         modules.append(module)
@@ -672,4 +721,54 @@ def submit_module_build(db_session, username, mmd, params):
         log.error(err_msg)
         raise Conflict(err_msg)
 
+    # Insert all the new module builds in a single transaction, and build their messages
+    # before the commit expires them.
+    db_session.flush()
+    all_builds = nsv_builds + [module for module, _ in new_modules]
+    messages = []
+    for module, mmd in new_modules:
+        siblings = [
+            build.id for build in all_builds
+            if build.version == module.version
+            and build.scratch == module.scratch
+            and build.id != module.id
+        ]
+        # Note the state is "init" here...
+        messages.append(module.new_build_json(mmd, siblings))
+    db_session.commit()
+
+    for message in messages:
+        notify_on_module_state_change(message)
+
     return modules
+
+
+def preview_module_build(db_session, mmd, params):
+    """
+    Returns the module builds which would be created by submitting the module, without creating
+    them. The base modules imported by the resolver while expanding the streams are stored, as
+    for a submission.
+
+    :param db_session: SQLAlchemy session object.
+    :param Modulemd.ModuleStream mmd: Modulemd defining the build.
+    :param dict params: the API parameters passed in by the user
+    :rtype: list with dict
+    :return: List with the NSVC and the buildrequires of every module build, and the id of the
+        existing module build with the same NSVC, if any.
+    """
+    rv = []
+    for mmd in _expand_module_build(db_session, mmd, params):
+        mmd.set_version(get_prefixed_version(mmd))
+        nsvc = mmd.get_nsvc()
+        module = models.ModuleBuild.get_build_from_nsvc(db_session, *nsvc.split(":"))
+        buildrequires = mmd.get_xmd()["mbs"]["buildrequires"]
+        rv.append({
+            "nsvc": nsvc,
+            "context": mmd.get_context(),
+            "buildrequires": {
+                name: ":".join([name, br["stream"], str(br["version"]), br["context"]])
+                for name, br in buildrequires.items()
+            },
+            "module_build_id": module.id if module else None,
+        })
+    return rv
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 # SPDX-License-Identifier: MIT
 from __future__ import absolute_import
+from collections import OrderedDict
 import copy
 from datetime import datetime
 from functools import wraps
@@ -8,7 +9,7 @@ import re
 
 from flask import request, url_for, Response
 import sqlalchemy
-from sqlalchemy.orm import aliased
+from sqlalchemy.orm import aliased, lazyload, load_only
 from sqlalchemy.sql.sqltypes import Boolean as sqlalchemy_boolean
 
 from module_build_service import api_version, db
@@ -156,6 +157,67 @@ def _add_order_by_clause(flask_request, query, column_source):
     return query.order_by(*order_args)
 
 
+def get_requested_fields(flask_request, model):
+    """
+    Returns the keys of the JSON representation requested with the "fields" GET argument
+    :param flask_request: a Flask request object
+    :param model: a SQLAlchemy database model with the json_field_columns attribute
+    :return: a list of the requested keys or None if the argument was not supplied
+    """
+    fields = []
+    for value in flask_request.args.getlist("fields"):
+        fields.extend(field.strip() for field in value.split(",") if field.strip())
+    if not fields:
+        return None
+
+    for field in fields:
+        if field not in model.json_field_columns:
+            raise ValidationError('An invalid field of "{}" was supplied'.format(field))
+    # Remove the duplicates but keep the order
+    return list(OrderedDict.fromkeys(fields))
+
+
+def load_only_requested_fields(flask_request, query, model):
+    """
+    Only loads the columns needed for the keys requested with the "fields" GET argument.
+
+    :param flask_request: a Flask request object
+    :param query: a SQLAlchemy query object
+    :param model: a SQLAlchemy database model with the json_field_columns attribute
+    :return: a SQLAlchemy query object
+    """
+    fields = get_requested_fields(flask_request, model)
+    if not fields:
+        return query
+
+    columns = {"id"}
+    for field in fields:
+        columns.update(model.json_field_columns[field])
+    # The relationships are only loaded when a requested key needs them
+    return query.options(load_only(*sorted(columns)), lazyload("*"))
+
+
+# This is used when filtering the date request parameters, but it is here to avoid recompiling
+utc_iso_datetime_regex = re.compile(
+    r"^(?P<datetime>\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.\d+)?(?:Z|[-+]00(?::00)?)?$")
+
+
+def parse_utc_iso_datetime(value, request_arg):
+    """
+    Parses a Zulu ISO 8601 timestamp supplied as a request parameter
+    :param str value: the timestamp e.g. 2016-08-23T09:40:07Z
+    :param str request_arg: the name of the request parameter, used in the error message
+    :return: a datetime object
+    :raises ValidationError: when the timestamp is not in the expected format
+    """
+    iso_datetime_matches = re.match(utc_iso_datetime_regex, value)
+    if not iso_datetime_matches or not iso_datetime_matches.group("datetime"):
+        raise ValidationError(
+            'An invalid Zulu ISO 8601 timestamp was provided for the "%s" parameter' % request_arg)
+    # Converts the ISO 8601 string to a datetime object for SQLAlchemy to use to filter
+    return datetime.strptime(iso_datetime_matches.group("datetime"), "%Y-%m-%dT%H:%M:%S")
+
+
 def str_to_bool(value):
     """
     Parses a string to determine its boolean value
@@ -165,11 +227,11 @@ def str_to_bool(value):
     return value.lower() in ["true", "1"]
 
 
-def filter_component_builds(flask_request):
+def get_component_builds_query(flask_request):
     """
-    Returns a flask_sqlalchemy.Pagination object based on the request parameters
+    Returns an unordered SQLAlchemy query of the component builds matching the request parameters
     :param request: Flask request object
-    :return: flask_sqlalchemy.Pagination
+    :return: a SQLAlchemy query object
     """
     search_query = dict()
     for key in request.args.keys():
@@ -211,18 +273,29 @@ def filter_component_builds(flask_request):
     if search_states:
         query = query.filter(models.ComponentBuild.state.in_(search_states))
 
+    return query
+
+
+def filter_component_builds(flask_request):
+    """
+    Returns a flask_sqlalchemy.Pagination object based on the request parameters
+    :param request: Flask request object
+    :return: flask_sqlalchemy.Pagination
+    """
+    query = get_component_builds_query(flask_request)
     query = _add_order_by_clause(flask_request, query, models.ComponentBuild)
+    query = load_only_requested_fields(flask_request, query, models.ComponentBuild)
 
     page = flask_request.args.get("page", 1, type=int)
     per_page = flask_request.args.get("per_page", 10, type=int)
     return query.paginate(page, per_page, False)
 
 
-def filter_module_builds(flask_request):
+def get_module_builds_query(flask_request):
     """
-    Returns a flask_sqlalchemy.Pagination object based on the request parameters
+    Returns an unordered SQLAlchemy query of the module builds matching the request parameters
     :param request: Flask request object
-    :return: flask_sqlalchemy.Pagination
+    :return: a SQLAlchemy query object
     """
     search_query = dict()
     special_columns = {
@@ -260,8 +333,19 @@ def filter_module_builds(flask_request):
             search_query[key] = part
 
     rpm = flask_request.args.get("rpm", None)
+    rpm_name = flask_request.args.get("rpm_name", None)
+    rpm_module_build_ids = None
     koji_tags = []
-    if rpm:
+    if rpm or rpm_name:
+        rpm_module_build_ids = models.ModuleBuildRPM.module_build_ids_query(
+            db.session, rpm=rpm, name=rpm_name)
+    if rpm and not db.session.query(rpm_module_build_ids.exists()).scalar():
+        # The module build containing this RPM might not have been indexed yet,
+        # so fallback to the build system. The rpm_name filter is still done using the index.
+        rpm_module_build_ids = None
+        if rpm_name:
+            rpm_module_build_ids = models.ModuleBuildRPM.module_build_ids_query(
+                db.session, name=rpm_name)
         if conf.system == "koji":
             # we are importing the koji builder here so we can search for the rpm metadata
             # from koji. If we imported this regulary we would have gotten a circular import error.
@@ -277,13 +361,11 @@ def filter_module_builds(flask_request):
         query = query.filter_by(**search_query)
     if search_states:
         query = query.filter(models.ModuleBuild.state.in_(search_states))
+    if rpm_module_build_ids is not None:
+        query = query.filter(models.ModuleBuild.id.in_(rpm_module_build_ids))
     if koji_tags:
         query = query.filter(models.ModuleBuild.koji_tag.in_(koji_tags)).filter_by(**search_query)
 
-    # This is used when filtering the date request parameters, but it is here to avoid recompiling
-    utc_iso_datetime_regex = re.compile(
-        r"^(?P<datetime>\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.\d+)?(?:Z|[-+]00(?::00)?)?$")
-
     # Filter the query based on date request parameters
     for item in ("submitted", "modified", "completed"):
         for context in ("before", "after"):
@@ -291,16 +373,7 @@ def filter_module_builds(flask_request):
             iso_datetime_arg = request.args.get(request_arg, None)
 
             if iso_datetime_arg:
-                iso_datetime_matches = re.match(utc_iso_datetime_regex, iso_datetime_arg)
-
-                if not iso_datetime_matches or not iso_datetime_matches.group("datetime"):
-                    raise ValidationError(
-                        'An invalid Zulu ISO 8601 timestamp was provided for the "%s" parameter'
-                        % request_arg
-                    )
-                # Converts the ISO 8601 string to a datetime object for SQLAlchemy to use to filter
-                item_datetime = datetime.strptime(
-                    iso_datetime_matches.group("datetime"), "%Y-%m-%dT%H:%M:%S")
+                item_datetime = parse_utc_iso_datetime(iso_datetime_arg, request_arg)
                 # Get the database column to filter against
                 column = getattr(models.ModuleBuild, "time_" + item)
 
@@ -386,7 +459,18 @@ def filter_module_builds(flask_request):
             column = getattr(module_br_alias, item)
             query = query.filter(column == request_arg)
 
+    return query
+
+
+def filter_module_builds(flask_request):
+    """
+    Returns a flask_sqlalchemy.Pagination object based on the request parameters
+    :param request: Flask request object
+    :return: flask_sqlalchemy.Pagination
+    """
+    query = get_module_builds_query(flask_request)
     query = _add_order_by_clause(flask_request, query, models.ModuleBuild)
+    query = load_only_requested_fields(flask_request, query, models.ModuleBuild)
 
     page = flask_request.args.get("page", 1, type=int)
     per_page = flask_request.args.get("per_page", 10, type=int)
@@ -7,9 +7,10 @@ This is the implementation of the orchestrator's public RESTful API.
 from __future__ import absolute_import
 from io import BytesIO
 import json
+import zlib
 import sqlalchemy.event
 
-from flask import request, url_for, Blueprint, Response
+from flask import g, request, url_for, Blueprint, Response, stream_with_context
 from flask.views import MethodView
 from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from six import string_types
@@ -21,25 +22,40 @@ from module_build_service.common.errors import (
     Unauthorized, UnprocessableEntity, Conflict
 )
 from module_build_service.common.models import send_message_after_module_build_state_change
-from module_build_service.common.monitor import registry
+from module_build_service.common.monitor import (
+    QueryStats, db_hook_event_listeners, exposed_registry
+)
+from module_build_service.common.profiling import Profile
 from module_build_service.common.submit import fetch_mmd
 from module_build_service.common.utils import import_mmd
 import module_build_service.web.auth
 from module_build_service.web.backports import jsonify
+from module_build_service.web.submission_jobs import submission_jobs
 from module_build_service.web.submit import (
-    submit_module_build_from_scm, submit_module_build_from_yaml
+    load_mmd_from_yaml,
+    preview_module_build,
+    submit_module_build_from_scm,
+    submit_module_build_from_yaml,
 )
 from module_build_service.web.utils import (
     cors_header,
     filter_component_builds,
     filter_module_builds,
+    get_component_builds_query,
+    get_module_builds_query,
+    get_requested_fields,
     get_scm_url_re,
+    load_only_requested_fields,
     pagination_metadata,
+    parse_utc_iso_datetime,
     str_to_bool,
     validate_api_version,
 )
 
 
+# The request header asking for profiling the request
+PROFILE_HEADER = "X-MBS-Profile"
+
 api_routes = {
     "module_builds": {
         "url": "/module-build-service/<int:api_version>/module-builds/",
@@ -53,6 +69,14 @@ api_routes = {
         "url": "/module-build-service/<int:api_version>/module-builds/<int:id>",
         "options": {"methods": ["GET", "PATCH"]},
     },
+    "module_builds_export": {
+        "url": "/module-build-service/<int:api_version>/module-builds/export",
+        "options": {"methods": ["GET"]},
+    },
+    "module_builds_preview": {
+        "url": "/module-build-service/<int:api_version>/module-builds/preview",
+        "options": {"methods": ["POST"]},
+    },
     "component_builds_list": {
         "url": "/module-build-service/<int:api_version>/component-builds/",
         "options": {"defaults": {"id": None}, "methods": ["GET"]},
@@ -61,6 +85,10 @@ api_routes = {
         "url": "/module-build-service/<int:api_version>/component-builds/<int:id>",
         "options": {"methods": ["GET"]},
     },
+    "component_builds_export": {
+        "url": "/module-build-service/<int:api_version>/component-builds/export",
+        "options": {"methods": ["GET"]},
+    },
     "about": {
         "url": "/module-build-service/<int:api_version>/about/",
         "options": {"methods": ["GET"]},
@@ -73,6 +101,10 @@ api_routes = {
         "url": "/module-build-service/<int:api_version>/import-module/",
         "options": {"methods": ["POST"]},
     },
+    "submission_job": {
+        "url": "/module-build-service/<int:api_version>/submission-jobs/<int:id>",
+        "options": {"methods": ["GET"]},
+    },
     "log_messages_module_build": {
         "url": "/module-build-service/<int:api_version>/module-builds/<int:id>/messages",
         "options": {"methods": ["GET"], "defaults": {"model": models.ModuleBuild}},
@@ -100,6 +132,7 @@ class AbstractQueryableBuildAPI(MethodView):
             )
         verbose_flag = request.args.get("verbose", "false").lower()
         short_flag = request.args.get("short", "false").lower()
+        fields = get_requested_fields(request, self.model)
         json_func_kwargs = {}
         json_func_name = "json"
 
@@ -108,15 +141,21 @@ class AbstractQueryableBuildAPI(MethodView):
             p_query = self.query_filter(request)
             json_data = {"meta": pagination_metadata(p_query, api_version, request.args)}
 
-            if verbose_flag == "true" or verbose_flag == "1":
+            if fields:
+                # Only the requested keys are computed, this takes precedence over verbose and short
+                json_func_name = "sparse_json"
+                json_func_kwargs["fields"] = fields
+                json_func_kwargs["show_state_url"] = True
+                json_func_kwargs["api_version"] = api_version
+            elif verbose_flag == "true" or verbose_flag == "1":
                 json_func_name = "extended_json"
                 json_func_kwargs["show_state_url"] = True
                 json_func_kwargs["api_version"] = api_version
             elif short_flag == "true" or short_flag == "1":
                 if p_query.items and hasattr(p_query.items[0], "short_json"):
                     json_func_name = "short_json"
-            if json_func_name == "json" or json_func_name == "extended_json":
-                # Only ModuleBuild.json and ModuleBuild.extended_json has argument db_session
+            if json_func_name != "short_json":
+                # Only ModuleBuild.short_json has no argument db_session
                 json_func_kwargs["db_session"] = db.session
             json_data["items"] = [
                 getattr(item, json_func_name)(**json_func_kwargs) for item in p_query.items
@@ -125,17 +164,23 @@ class AbstractQueryableBuildAPI(MethodView):
             return jsonify(json_data), 200
         else:
             # Lists details for the specified build
-            instance = self.model.query.filter_by(id=id).first()
+            query = self.model.query.filter_by(id=id)
+            instance = load_only_requested_fields(request, query, self.model).first()
             if instance:
-                if verbose_flag == "true" or verbose_flag == "1":
+                if fields:
+                    json_func_name = "sparse_json"
+                    json_func_kwargs["fields"] = fields
+                    json_func_kwargs["show_state_url"] = True
+                    json_func_kwargs["api_version"] = api_version
+                elif verbose_flag == "true" or verbose_flag == "1":
                     json_func_name = "extended_json"
                     json_func_kwargs["show_state_url"] = True
                     json_func_kwargs["api_version"] = api_version
                 elif short_flag == "true" or short_flag == "1":
                     if getattr(instance, "short_json", None):
                         json_func_name = "short_json"
-                if json_func_name == "json" or json_func_name == "extended_json":
-                    # Only ModuleBuild.json and ModuleBuild.extended_json has argument db_session
+                if json_func_name != "short_json":
+                    # Only ModuleBuild.short_json has no argument db_session
                     json_func_kwargs["db_session"] = db.session
                 return jsonify(getattr(instance, json_func_name)(**json_func_kwargs)), 200
             else:
@@ -176,6 +221,14 @@ class ModuleBuildAPI(AbstractQueryableBuildAPI):
         self.check_groups(handler.username, handler.groups)
 
         handler.validate()
+        if conf.submission_async and _prefers_async(request):
+            job = submission_jobs.submit(handler.username, handler.get_submit_func())
+            headers = {
+                "Location": url_for("submission_job", api_version=api_version, id=job.id),
+                "Preference-Applied": "respond-async",
+            }
+            return jsonify(job.json(api_version)), 202, headers
+
         modules = handler.post()
         if api_version == 1:
             # Only show the first module build for backwards-compatibility
@@ -243,6 +296,104 @@ class ModuleBuildAPI(AbstractQueryableBuildAPI):
         return jsonify(module.extended_json(db.session, True, api_version)), 200
 
 
+class AbstractExportBuildAPI(MethodView):
+    """
+    Streams all the builds matching the list API filters as newline-delimited JSON.
+
+    The rows are read through a server-side cursor and serialized one at a time, so the memory
+    used does not depend on the number of exported builds. The time does: the keys which are
+    not stored in the row of the build cost queries for every exported build. By default, a
+    module build costs the queries of its siblings and component builds, and the parsing of
+    its modulemd, the tasks are left out. The ``verbose`` export adds the queries of the tasks,
+    the state trace, the arches, the buildrequires and the virtual streams. Requesting only
+    the columns with ``fields`` runs no extra query.
+    """
+
+    # Keyword arguments of the json method of the model in the default export
+    json_kwargs = {}
+
+    @cors_header()
+    @validate_api_version()
+    def get(self, api_version):
+        query = self.query_filter(request)
+        since = request.args.get("since")
+        if since:
+            query = self.filter_since(query, parse_utc_iso_datetime(since, "since"))
+        query = query.order_by(*self.export_order)
+        query = load_only_requested_fields(request, query, self.model)
+        query = query.yield_per(conf.export_yield_per)
+
+        fields = get_requested_fields(request, self.model)
+        json_func_kwargs = {"db_session": db.session}
+        json_func_name = "json"
+        if fields:
+            json_func_name = "sparse_json"
+            json_func_kwargs["fields"] = fields
+            json_func_kwargs["show_state_url"] = True
+            json_func_kwargs["api_version"] = api_version
+        elif str_to_bool(request.args.get("verbose", "false")):
+            json_func_name = "extended_json"
+            json_func_kwargs["show_state_url"] = True
+            json_func_kwargs["api_version"] = api_version
+        else:
+            json_func_kwargs.update(self.json_kwargs)
+
+        def generate_lines():
+            for item in query:
+                data = getattr(item, json_func_name)(**json_func_kwargs)
+                yield (json.dumps(data, sort_keys=True) + "\n").encode("utf-8")
+
+        headers = {"Vary": "Accept-Encoding"}
+        content = generate_lines()
+        if "gzip" in request.accept_encodings:
+            headers["Content-Encoding"] = "gzip"
+            content = _gzip_stream(content)
+
+        return Response(
+            stream_with_context(content), mimetype="application/x-ndjson", headers=headers)
+
+
+class ComponentBuildExportAPI(AbstractExportBuildAPI):
+    query_filter = staticmethod(get_component_builds_query)
+    model = models.ComponentBuild
+    export_order = (models.ComponentBuild.id,)
+
+    @staticmethod
+    def filter_since(query, since):
+        # Component builds don't track their modification time, so export the components of
+        # the module builds modified since then
+        return query.join(
+            models.ModuleBuild, models.ComponentBuild.module_id == models.ModuleBuild.id
+        ).filter(models.ModuleBuild.time_modified >= since)
+
+
+class ModuleBuildExportAPI(AbstractExportBuildAPI):
+    query_filter = staticmethod(get_module_builds_query)
+    model = models.ModuleBuild
+    export_order = (models.ModuleBuild.time_modified, models.ModuleBuild.id)
+    # The tasks would cost one more query for every module build
+    json_kwargs = {"show_tasks": False}
+
+    @staticmethod
+    def filter_since(query, since):
+        return query.filter(models.ModuleBuild.time_modified >= since)
+
+
+def _gzip_stream(chunks):
+    """
+    Compresses the chunks of a streamed response on the fly.
+
+    :param chunks: an iterable of bytes
+    :return: a generator of the gzip compressed bytes
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
 class AboutAPI(MethodView):
     @cors_header()
     @validate_api_version()
@@ -285,6 +436,28 @@ class RebuildStrategies(MethodView):
         return jsonify({"items": items}), 200
 
 
+class ModuleBuildPreviewAPI(MethodView):
+
+    @validate_api_version()
+    def post(self, api_version):
+        data = _dict_from_request(request)
+        if "modulemd" in data or (hasattr(request, "files") and "yaml" in request.files):
+            handler = YAMLFileHandler(request, data)
+        else:
+            handler = SCMHandler(request, data)
+
+        ModuleBuildAPI.check_groups(handler.username, handler.groups)
+
+        handler.validate()
+        # No module build is created, the submission is only expanded. The mbs resolver still
+        # imports the buildrequired base modules it finds in the remote MBS.
+        try:
+            rv = handler.preview()
+        finally:
+            db.session.rollback()
+        return jsonify(rv), 200
+
+
 class ImportModuleAPI(MethodView):
     @validate_api_version()
     def post(self, api_version):
@@ -316,6 +489,17 @@ class ImportModuleAPI(MethodView):
         return jsonify(json_data), 201
 
 
+class SubmissionJobAPI(MethodView):
+
+    @cors_header()
+    @validate_api_version()
+    def get(self, api_version, id):
+        job = models.ModuleSubmissionJob.query.filter_by(id=id).first()
+        if not job:
+            raise NotFound("No such submission job found.")
+        return jsonify(job.json(api_version)), 200
+
+
 class LogMessageAPI(MethodView):
 
     @validate_api_version()
@@ -461,6 +645,24 @@ class BaseHandler(object):
             # Normalize the value so that it simplifies any code that uses this value
             self.data["reuse_components_from"] = reuse_module.id
 
+    def get_submit_func(self):
+        """
+        Returns the function submitting the module builds, called with the database session.
+        """
+        raise NotImplementedError()
+
+    def post(self):
+        return self.get_submit_func()(db.session)
+
+    def get_mmd(self):
+        """
+        Returns the modulemd of the submitted module.
+        """
+        raise NotImplementedError()
+
+    def preview(self):
+        return preview_module_build(db.session, self.get_mmd(), self.data)
+
 
 class SCMHandler(BaseHandler):
     def validate(self, skip_branch=False, skip_optional_params=False):
@@ -496,9 +698,14 @@ class SCMHandler(BaseHandler):
         if not skip_optional_params:
             self.validate_optional_params()
 
-    def post(self):
-        return submit_module_build_from_scm(
-            db.session, self.username, self.data, allow_local_url=False)
+    def get_submit_func(self):
+        username, data = self.username, self.data
+        return lambda session: submit_module_build_from_scm(
+            session, username, data, allow_local_url=False)
+
+    def get_mmd(self):
+        mmd, _ = fetch_mmd(self.data["scmurl"], self.data["branch"])
+        return mmd
 
 
 class YAMLFileHandler(BaseHandler):
@@ -516,16 +723,36 @@ class YAMLFileHandler(BaseHandler):
             raise ValidationError("Invalid file submitted")
         self.validate_optional_params()
 
-    def post(self):
+    def _get_handle(self):
         if "modulemd" in self.data:
             handle = BytesIO(self.data["modulemd"].encode("utf-8"))
         else:
-            handle = request.files["yaml"]
+            # Read the file right away, the submission may be processed after the request ends
+            yaml_file = request.files["yaml"]
+            handle = BytesIO(yaml_file.read())
+            handle.filename = yaml_file.filename
         if self.data.get("module_name"):
             handle.filename = self.data["module_name"]
+        return handle
+
+    def get_submit_func(self):
+        handle = self._get_handle()
         stream_name = self.data.get("module_stream", None)
-        return submit_module_build_from_yaml(
-            db.session, self.username, handle, self.data, stream=stream_name)
+        username, data = self.username, self.data
+        return lambda session: submit_module_build_from_yaml(
+            session, username, handle, data, stream=stream_name)
+
+    def get_mmd(self):
+        return load_mmd_from_yaml(self._get_handle(), stream=self.data.get("module_stream"))
+
+
+def _prefers_async(request):
+    """ Whether the request has the "Prefer: respond-async" header, see RFC 7240 """
+    preferences = request.headers.get("Prefer", "").split(",")
+    return any(
+        preference.split(";")[0].split("=")[0].strip().lower() == "respond-async"
+        for preference in preferences
+    )
 
 
 def _dict_from_request(request):
@@ -548,7 +775,7 @@ monitor_api = Blueprint(
 @validate_api_version()
 @monitor_api.route("/metrics")
 def metrics(api_version):
-    return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(exposed_registry), content_type=CONTENT_TYPE_LATEST)
 
 
 def register_api():
@@ -559,8 +786,24 @@ def register_api():
     rebuild_strategies_view = RebuildStrategies.as_view("rebuild_strategies")
     import_module = ImportModuleAPI.as_view("import_module")
     log_message = LogMessageAPI.as_view("log_messages")
+    submission_job_view = SubmissionJobAPI.as_view("submission_job")
+    module_export_view = ModuleBuildExportAPI.as_view("module_builds_export")
+    module_preview_view = ModuleBuildPreviewAPI.as_view("module_builds_preview")
+    component_export_view = ComponentBuildExportAPI.as_view("component_builds_export")
     for key, val in api_routes.items():
-        if key.startswith("component_build"):
+        if key == "component_builds_export":
+            app.add_url_rule(
+                val["url"], endpoint=key, view_func=component_export_view, **val["options"])
+        elif key == "submission_job":
+            app.add_url_rule(
+                val["url"], endpoint=key, view_func=submission_job_view, **val["options"])
+        elif key == "module_builds_export":
+            app.add_url_rule(
+                val["url"], endpoint=key, view_func=module_export_view, **val["options"])
+        elif key == "module_builds_preview":
+            app.add_url_rule(
+                val["url"], endpoint=key, view_func=module_preview_view, **val["options"])
+        elif key.startswith("component_build"):
             app.add_url_rule(val["url"], endpoint=key, view_func=component_view, **val["options"])
         elif key.startswith("module_build"):
             app.add_url_rule(val["url"], endpoint=key, view_func=module_view, **val["options"])
@@ -632,6 +875,51 @@ def notfound_error(e):
     return json_error(404, "Not Found", str(e))
 
 
+@app.before_request
+def start_profile():
+    """ Profiles the request of an MBS admin when it has the X-MBS-Profile header """
+    if not conf.profiling_dir or not request.headers.get(PROFILE_HEADER):
+        return
+    username, groups = module_build_service.web.auth.get_user(request)
+    if not (conf.admin_groups & groups):
+        raise Forbidden("Only the MBS admins are allowed to profile the requests.")
+    g.profile = Profile("request", "{0}.{1}".format(request.method, request.endpoint)).start()
+
+
+@app.before_request
+def start_query_stats():
+    g.query_stats = QueryStats("request", request.endpoint).start()
+
+
+@app.after_request
+def stop_query_stats(response):
+    """ Adds the SQL query stats of the request to the response headers in debug mode """
+    query_stats = g.pop("query_stats", None)
+    if query_stats is not None:
+        query_stats.stop()
+        if conf.debug:
+            response.headers["X-DB-Query-Count"] = str(query_stats.count)
+            response.headers["Server-Timing"] = 'db;desc="SQL queries";dur={0:.1f}'.format(
+                query_stats.duration * 1000)
+    return response
+
+
+@app.teardown_request
+def teardown_query_stats(exception):
+    # after_request is not called when the request failed with an unhandled exception
+    query_stats = g.pop("query_stats", None)
+    if query_stats is not None:
+        query_stats.stop()
+
+
+@app.teardown_request
+def stop_profile(exception):
+    profile = g.pop("profile", None)
+    if profile is not None:
+        profile.stop()
+
+
 # Ensure the event handler is called on db.session
 sqlalchemy.event.listen(
     db.session, "after_commit", send_message_after_module_build_state_change)
+db_hook_event_listeners(db.engine)
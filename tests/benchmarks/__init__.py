@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+"""
+Benchmarks of the MBS hot paths. These are not part of the test suite, run them
+directly, for example:
+
+    python -m tests.benchmarks.oidc_auth
+"""
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+"""
+Measures the latency of the OIDC authentication with the identity provider
+stubbed by a fixed delay, with and without the token cache.
+"""
+from __future__ import absolute_import, print_function
+import argparse
+from os import path
+import time
+
+from mock import patch, PropertyMock
+
+from module_build_service import app
+import module_build_service.common.config as mbs_config
+import module_build_service.web.auth as auth
+
+CLIENT_SECRETS = path.join(
+    path.dirname(path.dirname(path.abspath(__file__))), "test_web", "client_secrets.json")
+
+
+class StubbedIdP(object):
+    """ Identity provider answering after `delay` seconds. """
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.requests = 0
+
+    def token_info(self, token):
+        self.requests += 1
+        time.sleep(self.delay)
+        return {
+            "active": True,
+            "username": "user-" + token,
+            "scope": "openid https://id.fedoraproject.org/scope/groups mbs-scope",
+            "exp": time.time() + 3600,
+        }
+
+    def user_info(self, token):
+        self.requests += 1
+        time.sleep(self.delay)
+        return {"groups": ["packager"]}
+
+
+class Request(object):
+    def __init__(self, token):
+        self.headers = {"authorization": "Bearer " + token}
+
+
+def run(requests_count, users_count, delay, cache_ttl):
+    idp = StubbedIdP(delay)
+    auth.region.invalidate()
+    with patch.object(auth, "_get_token_info", new=idp.token_info), \
+            patch.object(auth, "_get_user_info", new=idp.user_info), \
+            patch.object(mbs_config.Config, "oidc_token_cache_max_ttl",
+                         new_callable=PropertyMock, return_value=cache_ttl), \
+            patch.dict(app.config, {
+                "OIDC_CLIENT_SECRETS": CLIENT_SECRETS, "OIDC_REQUIRED_SCOPE": "mbs-scope"}):
+        latencies = []
+        for i in range(requests_count):
+            request = Request("token%d" % (i % users_count))
+            start = time.time()
+            auth.get_user_oidc(request)
+            latencies.append(time.time() - start)
+
+    latencies.sort()
+    return {
+        "mean": sum(latencies) / len(latencies),
+        "p50": latencies[len(latencies) // 2],
+        "p99": latencies[int(len(latencies) * 0.99)],
+        "idp_requests": idp.requests,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--idp-delay", type=float, default=0.02,
+                        help="Latency of a single identity provider request, in seconds")
+    args = parser.parse_args()
+
+    for label, cache_ttl in (("no cache", 0), ("cache", 300)):
+        result = run(args.requests, args.users, args.idp_delay, cache_ttl)
+        print(
+            "{0:>8}: mean {mean:.4f}s, p50 {p50:.4f}s, p99 {p99:.4f}s, "
+            "{idp_requests} IdP requests".format(label, **result))
+
+
+if __name__ == "__main__":
+    main()
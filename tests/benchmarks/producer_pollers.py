@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+"""
+Measures the producer pollers on a database filled with synthetic module builds and component
+builds, comparing them with their previous implementations, which loaded whole state buckets
+and filtered them in Python.
+
+The database configured for the tests is used, and all its data is dropped.
+"""
+from __future__ import absolute_import, print_function
+import argparse
+from datetime import datetime, timedelta
+import operator
+import random
+import time
+
+import koji
+from mock import patch, MagicMock
+import sqlalchemy.event
+
+from module_build_service.common import conf, models
+from module_build_service.scheduler import producer
+from module_build_service.scheduler.db_session import db_session
+from tests import clean_database
+
+
+def populate(rows, components_per_module, seed):
+    """ Insert about `rows` rows into the module_builds and component_builds tables. """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    states = list(models.BUILD_STATES.values())
+    module_builds_count = rows // (components_per_module + 1)
+    module_builds = []
+    component_builds = []
+    for module_id in range(1, module_builds_count + 1):
+        state = rng.choice(states)
+        batch = rng.randint(1, 4)
+        module_builds.append({
+            "id": module_id,
+            "name": "module{}".format(module_id),
+            "stream": "master",
+            "version": "1",
+            "context": "00000000",
+            "state": state,
+            "modulemd": "",
+            "koji_tag": "module-module{}-master-1-00000000".format(module_id),
+            "owner": "user",
+            "time_submitted": now,
+            "time_modified": now - timedelta(minutes=rng.randint(0, 60)),
+            "time_completed": now - timedelta(days=2),
+            "rebuild_strategy": "all",
+            "batch": batch,
+            "scratch": False,
+        })
+        for i in range(components_per_module):
+            component_batch = rng.randint(1, 4)
+            component_builds.append({
+                "module_id": module_id,
+                "package": "package{}".format(i),
+                "scmurl": "https://src.example.com/rpms/package{}.git?#master".format(i),
+                "format": "rpms",
+                "batch": component_batch,
+                "state": (
+                    rng.choice([None, koji.BUILD_STATES["BUILDING"]])
+                    if component_batch == batch else koji.BUILD_STATES["COMPLETE"]
+                ),
+            })
+    db_session.execute(models.ModuleBuild.__table__.insert(), module_builds)
+    db_session.execute(models.ComponentBuild.__table__.insert(), component_builds)
+    db_session.commit()
+    return module_builds_count
+
+
+def legacy_log_summary():
+    states = sorted(models.BUILD_STATES.items(), key=operator.itemgetter(1))
+    for name, code in states:
+        query = db_session.query(models.ModuleBuild).filter_by(state=code)
+        count = query.count()
+        if name == "build" and count:
+            for module_build in query.all():
+                for i in range(1, module_build.batch + 1):
+                    len([c for c in module_build.component_builds if c.batch == i])
+
+
+def legacy_nudge_module_builds_in_state(state_name, older_than_minutes):
+    builds = models.ModuleBuild.by_state(db_session, state_name)
+    now = datetime.utcnow()
+    return [
+        build for build in builds
+        if now - build.time_modified >= timedelta(minutes=older_than_minutes)
+    ]
+
+
+def legacy_process_paused_module_builds():
+    module_builds = db_session.query(models.ModuleBuild).filter(
+        models.ModuleBuild.state == models.BUILD_STATES["build"],
+        models.ModuleBuild.batch > 0,
+    ).all()
+    paused = []
+    for module_build in module_builds:
+        if datetime.utcnow() - module_build.time_modified < timedelta(minutes=10):
+            continue
+        if not module_build.current_batch(koji.BUILD_STATES["BUILDING"]):
+            paused.append(module_build)
+    return paused
+
+
+def legacy_delete_old_koji_targets(targets):
+    for target in targets:
+        db_session.query(models.ModuleBuild).filter(
+            models.ModuleBuild.koji_tag == target["dest_tag_name"],
+            models.ModuleBuild.name.notin_(conf.base_module_names),
+            models.ModuleBuild.state.notin_([
+                models.BUILD_STATES["init"],
+                models.BUILD_STATES["wait"],
+                models.BUILD_STATES["build"],
+            ]),
+        ).first()
+
+
+class QueryCounter(object):
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+def measure(func, *args):
+    """ Returns the duration and the number of queries of the call, on an empty session. """
+    db_session.expire_all()
+    db_session.expunge_all()
+    counter = QueryCounter()
+    engine = db_session.get_bind()
+    sqlalchemy.event.listen(engine, "before_cursor_execute", counter)
+    try:
+        start = time.time()
+        func(*args)
+        duration = time.time() - start
+    finally:
+        sqlalchemy.event.remove(engine, "before_cursor_execute", counter)
+        db_session.rollback()
+    return duration, counter.count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--components-per-module", type=int, default=9)
+    parser.add_argument("--targets", type=int, default=2000,
+                        help="Number of build targets returned by Koji")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    clean_database(add_platform_module=False, add_default_arches=False)
+    module_builds_count = populate(args.rows, args.components_per_module, args.seed)
+    targets = [
+        {
+            "id": i,
+            "name": "module-module{}-master-1-00000000".format(i),
+            "dest_tag_name": "module-module{}-master-1-00000000".format(i),
+        }
+        for i in range(1, min(args.targets, module_builds_count) + 1)
+    ]
+    koji_session = MagicMock()
+    koji_session.getBuildTargets.return_value = targets
+
+    with patch.object(conf, "system", new="koji"), \
+            patch.object(producer, "get_session", return_value=koji_session), \
+            patch.object(producer, "apply_async_for_module_build"), \
+            patch.object(producer, "at_concurrent_component_threshold", return_value=False), \
+            patch.object(producer, "has_missed_new_repo_message", return_value=False), \
+            patch.object(producer.GenericBuilder, "create_from_module"):
+        benchmarks = (
+            ("log_summary", legacy_log_summary, (), producer.log_summary, ()),
+            (
+                "nudge_module_builds_in_state",
+                legacy_nudge_module_builds_in_state, ("wait", 10),
+                producer.nudge_module_builds_in_state, ("wait", 10),
+            ),
+            (
+                "process_paused_module_builds",
+                legacy_process_paused_module_builds, (),
+                producer.process_paused_module_builds, (),
+            ),
+            (
+                "delete_old_koji_targets",
+                legacy_delete_old_koji_targets, (targets,),
+                producer.delete_old_koji_targets, (),
+            ),
+        )
+        for name, legacy, legacy_args, current, current_args in benchmarks:
+            legacy_duration, legacy_queries = measure(legacy, *legacy_args)
+            duration, queries = measure(current, *current_args)
+            print(
+                "{0:>30}: before {1:.3f}s, {2} queries; after {3:.3f}s, {4} queries".format(
+                    name, legacy_duration, legacy_queries, duration, queries))
+
+
+if __name__ == "__main__":
+    main()
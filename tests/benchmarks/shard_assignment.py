@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+"""
+Simulates the Celery workers handling the tasks of module builds with the "modulo",
+"hash_ring" and "lease" shard assignments, on a workload where a few huge module builds
+come along with many small ones.
+
+Every worker handles its queue serially. The tasks of a module build come in batches, like the
+events of the components of a build batch, and the next batch comes when the previous one is
+done. All the tasks of a batch stay in the queue of a single worker.
+"""
+from __future__ import absolute_import, print_function
+import argparse
+import collections
+import heapq
+import random
+
+from module_build_service.scheduler.shards import HashRing, choose_shard
+
+
+def generate_workload(rng, module_builds, huge_ratio, arrival_window):
+    """ Returns the list of (arrival time, module build id, batches) sorted by arrival time. """
+    workload = []
+    for module_build_id in range(1, module_builds + 1):
+        if rng.random() < huge_ratio:
+            batches = [rng.randint(5, 20) for _ in range(rng.randint(10, 30))]
+        else:
+            batches = [rng.randint(1, 3) for _ in range(rng.randint(1, 3))]
+        durations = [[rng.expovariate(1.0) for _ in range(tasks)] for tasks in batches]
+        workload.append((rng.uniform(0, arrival_window), module_build_id, durations))
+    workload.sort()
+    return workload
+
+
+class Worker(object):
+    def __init__(self):
+        self.free_at = 0.0
+        self.busy = 0.0
+        # Finish times of the queued tasks, in order
+        self.finishing = collections.deque()
+
+    def load(self, now):
+        while self.finishing and self.finishing[0] <= now:
+            self.finishing.popleft()
+        return len(self.finishing)
+
+    def run(self, now, duration):
+        start = max(now, self.free_at)
+        self.free_at = start + duration
+        self.busy += duration
+        self.finishing.append(self.free_at)
+        return start, self.free_at
+
+
+def simulate(workload, num_workers, strategy, replicas, steal_threshold):
+    ring = HashRing(num_workers, replicas)
+    workers = [Worker() for _ in range(num_workers)]
+    events = [(arrival, module_build_id, 0, durations, arrival)
+              for arrival, module_build_id, durations in workload]
+    heapq.heapify(events)
+    waits = []
+    latencies = []
+    stolen = 0
+
+    while events:
+        now, module_build_id, batch, durations, arrival = heapq.heappop(events)
+        if strategy == "modulo":
+            shard = module_build_id % num_workers
+        else:
+            shard = ring.get_shard(module_build_id)
+            if strategy == "lease":
+                # The previous batch is done, so the module build can move
+                loads = [worker.load(now) for worker in workers]
+                chosen = choose_shard(shard, loads, steal_threshold)
+                stolen += chosen != shard
+                shard = chosen
+
+        done = now
+        for duration in durations[batch]:
+            start, done = workers[shard].run(now, duration)
+            waits.append(start - now)
+
+        if batch + 1 < len(durations):
+            heapq.heappush(events, (done, module_build_id, batch + 1, durations, arrival))
+        else:
+            latencies.append(done - arrival)
+
+    latencies.sort()
+    makespan = max(worker.free_at for worker in workers)
+    busy = [worker.busy for worker in workers]
+    return {
+        "mean_latency": sum(latencies) / len(latencies),
+        "p95_latency": latencies[int(len(latencies) * 0.95)],
+        "mean_wait": sum(waits) / len(waits),
+        "makespan": makespan,
+        "imbalance": max(busy) / (sum(busy) / len(busy)),
+        "stolen": stolen,
+    }
+
+
+def moved_ratio(module_builds, num_workers, strategy, replicas):
+    """ The ratio of the module builds moved to another worker when one more is added. """
+    if strategy == "modulo":
+        def before(i):
+            return i % num_workers
+
+        def after(i):
+            return i % (num_workers + 1)
+    else:
+        before = HashRing(num_workers, replicas).get_shard
+        after = HashRing(num_workers + 1, replicas).get_shard
+    moved = sum(1 for i in range(1, module_builds + 1) if before(i) != after(i))
+    return float(moved) / module_builds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module-builds", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--huge-ratio", type=float, default=0.03,
+                        help="Ratio of the module builds with many batches of many components")
+    parser.add_argument("--arrival-window", type=float, default=3000.0,
+                        help="The module builds are submitted during this time")
+    parser.add_argument("--replicas", type=int, default=64)
+    parser.add_argument("--steal-threshold", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    workload = generate_workload(
+        random.Random(args.seed), args.module_builds, args.huge_ratio, args.arrival_window)
+    for strategy in ("modulo", "hash_ring", "lease"):
+        result = simulate(
+            workload, args.workers, strategy, args.replicas, args.steal_threshold)
+        moved = moved_ratio(args.module_builds, args.workers, strategy, args.replicas)
+        print(
+            "{0:>9}: module build latency mean {mean_latency:.1f} p95 {p95_latency:.1f}, "
+            "task wait mean {mean_wait:.1f}, makespan {makespan:.0f}, busiest worker "
+            "{imbalance:.2f}x the mean, {stolen} moves, {1:.0%} moved when adding a "
+            "worker".format(strategy, moved, **result))
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,11 @@ import module_build_service
 from module_build_service.builder.utils import get_rpm_release
 from module_build_service.common.models import BUILD_STATES
 from module_build_service.common.utils import load_mmd, mmd_to_str
+from module_build_service.resolver.KojiResolver import clear_koji_caches
+from module_build_service.scheduler.default_modules import clear_default_modules_caches
+from module_build_service.scheduler.greenwave import greenwave
+from module_build_service.scheduler.ursine import clear_ursine_contents
+from module_build_service.web.mse import expansion_plans
 from module_build_service.scheduler.db_session import db_session
 from tests import clean_database, read_staged_data, module_build_from_modulemd
 
@@ -390,10 +395,24 @@ def cleanup_build_logs(request):
     """
 
     def _cleanup_build_logs():
-        build_ids = list(module_build_service.common.build_logs.handlers.keys())
+        build_ids = module_build_service.common.build_logs.build_ids
         for build_id in build_ids:
             mock_build = mock.Mock()
             mock_build.id = build_id
             module_build_service.common.build_logs.stop(mock_build)
 
     request.addfinalizer(_cleanup_build_logs)
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """
+    Forget the Koji tag snapshots, Koji builds, expansion plans, default modules, ursine
+    content and Greenwave policies cached in the previous tests.
+    """
+    clear_koji_caches()
+    expansion_plans.clear()
+    clear_default_modules_caches()
+    clear_ursine_contents()
+    if greenwave is not None:
+        greenwave.clear_product_versions()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+from __future__ import absolute_import
+
+from dogpile.cache.api import NO_VALUE
+import pytest
+
+from module_build_service.common.cache import LRUDict, make_bounded_region
+
+
+class TestLRUDict:
+
+    def test_least_recently_used_removed(self):
+        cache = LRUDict(2)
+        cache["a"] = 1
+        cache["b"] = 2
+        # Mark "a" as recently used.
+        assert cache.get("a") == 1
+        cache["c"] = 3
+
+        assert len(cache) == 2
+        assert "b" not in cache
+        assert cache["a"] == 1
+        assert cache["c"] == 3
+
+    def test_pop(self):
+        cache = LRUDict(2)
+        cache["a"] = 1
+        assert cache.pop("a") == 1
+        assert cache.pop("a", None) is None
+        assert cache.get("a", "default") == "default"
+
+    def test_invalid_max_entries(self):
+        with pytest.raises(ValueError):
+            LRUDict(0)
+
+
+def test_make_bounded_region_memory():
+    region = make_bounded_region("dogpile.cache.memory", max_entries=2)
+    for key in ("a", "b", "c"):
+        region.set(key, key.upper())
+
+    assert region.get("a") is NO_VALUE
+    assert region.get("b") == "B"
+    assert region.get("c") == "C"
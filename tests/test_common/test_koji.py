@@ -4,7 +4,8 @@ from __future__ import absolute_import
 
 import mock
 
-from module_build_service.common.koji import get_session
+from module_build_service.common.koji import get_session, koji_multicall_map
+from module_build_service.common.monitor import registry
 
 
 @mock.patch("koji.ClientSession")
@@ -13,3 +14,20 @@ def test_get_anonymous_session(mock_session):
     session = get_session(mbs_config, login=False)
     assert mock_session.return_value == session
     assert mock_session.return_value.krb_login.assert_not_called
+
+
+def test_koji_multicall_map_method_label():
+    koji_session = mock.Mock()
+    koji_session.multiCall.return_value = [[{"id": 1}], [{"id": 2}]]
+
+    def get_count():
+        return registry.get_sample_value(
+            "remote_call_duration_seconds_count",
+            {"service": "koji", "method": "getBuild", "outcome": "success"},
+        ) or 0
+
+    count = get_count()
+    assert koji_multicall_map(
+        koji_session, koji_session.getBuild, ["foo-1-1", "bar-1-1"], method="getBuild"
+    ) == [{"id": 1}, {"id": 2}]
+    assert get_count() == count + 1
@@ -5,10 +5,10 @@ import os
 from os import path
 import shutil
 import tempfile
+import threading
 
 from module_build_service.common import log, models
-from module_build_service.common.logger import ModuleBuildLogs
-from module_build_service.scheduler.consumer import MBSConsumer
+from module_build_service.common.logger import ModuleBuildLogs, module_build_log_context
 from module_build_service.scheduler.db_session import db_session
 from tests import init_data
 
@@ -38,7 +38,8 @@ class TestLogger:
         self.build_log = ModuleBuildLogs(self.base, self.name_format)
 
     def teardown_method(self, test_method):
-        MBSConsumer.current_module_build_id = None
+        for build_id in self.build_log.build_ids:
+            self.build_log.dispatcher.close_stream(build_id)
         shutil.rmtree(self.base)
 
     def test_module_build_logs(self):
@@ -55,7 +56,7 @@ class TestLogger:
         if os.path.exists(path):
             os.unlink(path)
 
-        # Try logging without the MBSConsumer.current_module_build_id set.
+        # Try logging without the module build log context set.
         # No log file should be created.
         log.debug("ignore this test msg")
         log.info("ignore this test msg")
@@ -64,21 +65,21 @@ class TestLogger:
         self.build_log.stop(build)
         assert not os.path.exists(path)
 
-        # Try logging with current_module_build_id set to 2 and then to 2.
-        # Only messages with current_module_build_id set to 2 should appear in
+        # Try logging with the module build log context set to 1 and then to 2.
+        # Only messages logged in the context of module build 2 should appear in
         # the log.
         self.build_log.start(db_session, build)
-        MBSConsumer.current_module_build_id = 1
-        log.debug("ignore this test msg1")
-        log.info("ignore this test msg1")
-        log.warning("ignore this test msg1")
-        log.error("ignore this test msg1")
-
-        MBSConsumer.current_module_build_id = 2
-        log.debug("ignore this test msg2")
-        log.info("ignore this test msg2")
-        log.warning("ignore this test msg2")
-        log.error("ignore this test msg2")
+        with module_build_log_context(1):
+            log.debug("ignore this test msg1")
+            log.info("ignore this test msg1")
+            log.warning("ignore this test msg1")
+            log.error("ignore this test msg1")
+
+        with module_build_log_context(2):
+            log.debug("ignore this test msg2")
+            log.info("ignore this test msg2")
+            log.warning("ignore this test msg2")
+            log.error("ignore this test msg2")
 
         self.build_log.stop(build)
         assert os.path.exists(path)
@@ -87,19 +88,51 @@ class TestLogger:
             # Note that DEBUG is not present unless configured server-wide.
             for level in ["INFO", "WARNING", "ERROR"]:
                 assert data.find("MBS - {0} - ignore this test msg2".format(level)) != -1
+            assert data.find("ignore this test msg1") == -1
 
         # Try to log more messages when build_log for module 1 is stopped.
         # New messages should not appear in a log.
-        MBSConsumer.current_module_build_id = 2
-        log.debug("ignore this test msg3")
-        log.info("ignore this test msg3")
-        log.warning("ignore this test msg3")
-        log.error("ignore this test msg3")
+        with module_build_log_context(2):
+            log.debug("ignore this test msg3")
+            log.info("ignore this test msg3")
+            log.warning("ignore this test msg3")
+            log.error("ignore this test msg3")
         self.build_log.stop(build)
         with open(path, "r") as f:
             data = f.read()
             assert data.find("ignore this test msg3") == -1
 
+    def test_module_build_logs_per_thread(self):
+        """
+        Tests that the messages are written to the build log of the module build
+        handled by the thread which logged them.
+        """
+        build_1 = models.ModuleBuild.get_by_id(db_session, 1)
+        build_2 = models.ModuleBuild.get_by_id(db_session, 2)
+        self.build_log.start(db_session, build_1)
+        self.build_log.start(db_session, build_2)
+
+        def log_messages(build_id):
+            with module_build_log_context(build_id):
+                for i in range(100):
+                    log.info("message %d of module build %d", i, build_id)
+
+        threads = [threading.Thread(target=log_messages, args=(i,)) for i in (1, 2)]
+        for thread in threads:
+            thread.start()
+        # Messages logged out of any module build context are not written
+        log.info("message of no module build")
+        for thread in threads:
+            thread.join()
+        self.build_log.stop(build_1)
+        self.build_log.stop(build_2)
+
+        for build in (build_1, build_2):
+            with open(self.build_log.path(db_session, build), "r") as f:
+                lines = f.read().splitlines()
+            assert [line.split(" - ")[-1] for line in lines] == [
+                "message %d of module build %d" % (i, build.id) for i in range(100)]
+
     def test_module_build_logs_name_format(self):
         build = models.ModuleBuild.get_by_id(db_session, 2)
 
@@ -2,11 +2,14 @@
 # SPDX-License-Identifier: MIT
 from __future__ import absolute_import
 
-from mock import patch
+from mock import patch, PropertyMock
 import pytest
+from sqlalchemy.exc import IntegrityError
 
 from module_build_service.common.config import conf
-from module_build_service.common.models import ComponentBuild, ComponentBuildTrace, ModuleBuild
+from module_build_service.common.models import (
+    ComponentBuild, ComponentBuildTrace, LogMessage, ModuleBuild, buffered_log_messages
+)
 from module_build_service.common.utils import load_mmd, mmd_to_str
 from module_build_service.scheduler.db_session import db_session
 from tests import (
@@ -48,6 +51,73 @@ class TestModels:
         assert component_builds_trace.state_reason is None
         assert component_builds_trace.task_id == 999999999
 
+    @patch("module_build_service.common.config.Config.log_messages_buffer_size",
+           new_callable=PropertyMock, return_value=2)
+    def test_buffered_log_messages(self, buffer_size):
+        build = ModuleBuild.get_by_id(db_session, 1)
+        with patch.object(db_session, "commit", wraps=db_session.commit) as commit:
+            with buffered_log_messages(db_session):
+                build.log_message(db_session, "message 1")
+                with buffered_log_messages(db_session):
+                    build.log_message(db_session, "message 2")
+                # The full buffer is inserted, but not committed
+                assert db_session.query(LogMessage).count() == 2
+                commit.assert_not_called()
+                build.log_message(db_session, "message 3")
+                assert db_session.query(LogMessage).count() == 2
+            commit.assert_called_once()
+
+        messages = db_session.query(LogMessage.message).order_by(LogMessage.id)
+        assert [message for message, in messages] == ["message 1", "message 2", "message 3"]
+
+    @patch("module_build_service.common.config.Config.log_messages_buffer_size",
+           new_callable=PropertyMock, return_value=2)
+    def test_buffered_log_messages_on_exception(self, buffer_size):
+        build = ModuleBuild.get_by_id(db_session, 1)
+        with pytest.raises(ValueError):
+            with buffered_log_messages(db_session):
+                build.log_message(db_session, "message 1")
+                build.log_message(db_session, "message 2")
+                build.log_message(db_session, "message 3")
+                raise ValueError("handler failed")
+
+        # The inserted messages are rolled back with the transaction, the buffered ones are
+        # stored in their own transaction
+        db_session.rollback()
+        messages = db_session.query(LogMessage.message)
+        assert [message for message, in messages] == ["message 3"]
+        assert "log_messages_buffer" not in db_session.info
+
+    def test_buffered_log_messages_on_exception_after_commit(self):
+        build = ModuleBuild.get_by_id(db_session, 1)
+        with pytest.raises(ValueError):
+            with buffered_log_messages(db_session):
+                build.state_reason = "committed by the handler"
+                db_session.commit()
+                build.log_message(db_session, "message 1")
+                build.state_reason = "not committed by the handler"
+                raise ValueError("handler failed")
+
+        # The changes the handler committed are kept, the others are rolled back
+        assert ModuleBuild.get_by_id(db_session, 1).state_reason == "committed by the handler"
+        messages = db_session.query(LogMessage.message)
+        assert [message for message, in messages] == ["message 1"]
+
+    def test_buffered_log_messages_on_exception_discarded(self):
+        build = ModuleBuild.get_by_id(db_session, 1)
+        # For example a message about a component build created in the rolled back transaction
+        error = IntegrityError("INSERT INTO log_messages", {}, Exception("foreign key violation"))
+        with patch.object(db_session, "execute", side_effect=error), pytest.raises(ValueError):
+            with buffered_log_messages(db_session):
+                build.log_message(db_session, "message 1")
+                raise ValueError("handler failed")
+
+        assert db_session.query(LogMessage).count() == 0
+        # The next transaction is not affected
+        build.log_message(db_session, "message 2")
+        messages = db_session.query(LogMessage.message)
+        assert [message for message, in messages] == ["message 2"]
+
     def test_context_functions(self):
         """ Test that the build_context, runtime_context, and context hashes are correctly
         determined"""
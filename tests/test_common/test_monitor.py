@@ -11,10 +11,13 @@ from six.moves import reload_module
 from module_build_service import app
 from module_build_service.common import conf, models
 import module_build_service.common.monitor
+from module_build_service.common.monitor import (
+    QueryStats, fingerprint_statement, registry, timed
+)
 from module_build_service.scheduler.db_session import db_session
 from tests import clean_database, init_data, make_module_in_db
 
-num_of_metrics = 18
+num_of_metrics = 33
 
 
 class TestViews:
@@ -31,6 +34,18 @@ class TestViews:
         ])
         assert count == num_of_metrics
 
+    @mock.patch("module_build_service.common.config.Config.debug",
+                new_callable=mock.PropertyMock, return_value=True)
+    def test_query_stats_headers(self, debug):
+        rv = self.client.get("/module-build-service/1/module-builds/1")
+        assert int(rv.headers["X-DB-Query-Count"]) > 0
+        assert rv.headers["Server-Timing"].startswith('db;desc="SQL queries";dur=')
+
+    def test_query_stats_headers_not_in_production(self):
+        rv = self.client.get("/module-build-service/1/module-builds/1")
+        assert "X-DB-Query-Count" not in rv.headers
+        assert "Server-Timing" not in rv.headers
+
 
 def test_standalone_metrics_server_disabled_by_default():
     with pytest.raises(requests.exceptions.ConnectionError):
@@ -90,3 +105,73 @@ def test_monitor_state_changing_failure(succ_cnt, failed_cnt):
     db_session.commit()
     succ_cnt.assert_not_called()
     failed_cnt.assert_called_once_with(reason=failure_type)
+
+
+def get_sample(name, **labels):
+    return registry.get_sample_value(name, labels) or 0
+
+
+def test_timed():
+    histogram = module_build_service.common.monitor.event_handler_histogram
+
+    @timed(histogram, handler="test_timed_handler")
+    def handler(fail):
+        if fail:
+            raise ValueError("handler failed")
+        return "result"
+
+    success = get_sample(
+        "event_handler_duration_seconds_count", handler="test_timed_handler", outcome="success")
+    failure = get_sample(
+        "event_handler_duration_seconds_count", handler="test_timed_handler", outcome="failure")
+
+    assert handler(False) == "result"
+    with pytest.raises(ValueError):
+        handler(True)
+
+    assert get_sample(
+        "event_handler_duration_seconds_count", handler="test_timed_handler", outcome="success"
+    ) == success + 1
+    assert get_sample(
+        "event_handler_duration_seconds_count", handler="test_timed_handler", outcome="failure"
+    ) == failure + 1
+    assert handler.__name__ == "handler"
+
+
+def test_fingerprint_statement():
+    fingerprint, normalized = fingerprint_statement(
+        "SELECT module_builds.id FROM module_builds\n"
+        "WHERE module_builds.name = 'testmodule' AND module_builds.id IN (1, 2, 3) LIMIT ?")
+    assert normalized == (
+        "SELECT module_builds.id FROM module_builds "
+        "WHERE module_builds.name = ? AND module_builds.id IN (...) LIMIT ?")
+    assert fingerprint == fingerprint_statement(
+        "SELECT module_builds.id FROM module_builds "
+        "WHERE module_builds.name = %(name_1)s AND module_builds.id IN (%(id_1)s) "
+        "LIMIT %(param_1)s")[0]
+
+
+@mock.patch("module_build_service.common.config.Config.db_query_budget",
+            new_callable=mock.PropertyMock, return_value=2)
+@mock.patch("module_build_service.common.monitor.log")
+def test_query_stats(log, query_budget):
+    clean_database(add_platform_module=False, add_default_arches=False)
+    with QueryStats("handler", "test_handler") as stats:
+        for _ in range(3):
+            db_session.query(models.ModuleBuild).all()
+    db_session.query(models.ModuleBuild).all()
+
+    assert stats.count == 3
+    assert stats.duration > 0
+    assert QueryStats.current() is None
+    log.warning.assert_called_once_with(
+        "The %s %s ran %d SQL queries, more than the budget of %d",
+        "handler", "test_handler", 3, 2)
+
+
+@mock.patch("module_build_service.common.config.Config.db_slow_query_threshold",
+            new_callable=mock.PropertyMock, return_value=0)
+@mock.patch("module_build_service.common.monitor.log")
+def test_slow_query_log_disabled(log, slow_query_threshold):
+    db_session.query(models.ModuleBuild).all()
+    log.warning.assert_not_called()
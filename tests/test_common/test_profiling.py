@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+from __future__ import absolute_import
+from datetime import datetime, timedelta
+import os
+import shutil
+import tempfile
+
+from mock import patch, PropertyMock
+
+from module_build_service.common.profiling import (
+    Profile, cleanup_profiles, list_profiles, summarize_profile
+)
+
+
+def profiled_function():
+    return sum(range(1000))
+
+
+class TestProfiling:
+
+    def setup_method(self, test_method):
+        self.profiling_dir = tempfile.mkdtemp(prefix="mbs-profiles-")
+        self.p_profiling_dir = patch(
+            "module_build_service.common.config.Config.profiling_dir",
+            new_callable=PropertyMock, return_value=self.profiling_dir)
+        self.p_profiling_dir.start()
+
+    def teardown_method(self, test_method):
+        self.p_profiling_dir.stop()
+        shutil.rmtree(self.profiling_dir)
+
+    def test_profile(self):
+        with Profile("handler", "wait.module_build_2") as profile:
+            profiled_function()
+
+        profiles = list_profiles()
+        assert len(profiles) == 1
+        assert profiles[0].path == profile.path
+        assert profiles[0].kind == "handler"
+        assert profiles[0].name == "wait.module_build_2"
+        assert profiles[0].size > 0
+
+        total_time, functions = summarize_profile(profile.path)
+        assert total_time > 0
+        assert any("profiled_function" in function for function, _, _, _ in functions)
+
+    def test_profile_name_is_sanitized(self):
+        with Profile("request", "GET /module-builds/"):
+            pass
+        assert list_profiles()[0].name == "GET_module_builds_"
+
+    def test_cleanup_old_profiles(self):
+        with Profile("handler", "old"):
+            pass
+        with Profile("handler", "new"):
+            pass
+        old_path = list_profiles()[0].path
+        old_time = datetime.utcnow() - timedelta(days=30)
+        os.rename(old_path, os.path.join(
+            self.profiling_dir,
+            old_time.strftime("%Y%m%dT%H%M%S%f") + os.path.basename(old_path)[21:]))
+
+        cleanup_profiles()
+        assert [profile.name for profile in list_profiles()] == ["new"]
+
+    @patch("module_build_service.common.config.Config.profiling_max_size",
+           new_callable=PropertyMock, return_value=0)
+    def test_cleanup_profiles_over_max_size(self, max_size):
+        # Every stored profile is over the maximum size, so it deletes all of them
+        with Profile("handler", "first"):
+            pass
+        assert list_profiles() == []
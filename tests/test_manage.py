@@ -2,13 +2,20 @@
 # SPDX-License-Identifier: MIT
 from __future__ import absolute_import
 
-from mock import patch
+import os
+import shutil
+import tempfile
+
+from mock import patch, PropertyMock
 import pytest
 
 from module_build_service import app
 from module_build_service.common import models
 from module_build_service.common.models import BUILD_STATES, ModuleBuild
-from module_build_service.manage import manager_wrapper, retire
+from module_build_service.common.profiling import Profile
+from module_build_service.manage import (
+    index_module_build_rpms, manager_wrapper, profiles, retire
+)
 from module_build_service.scheduler.db_session import db_session
 from module_build_service.web.utils import deps_to_dict
 from tests import clean_database, staged_data_filename
@@ -117,6 +124,68 @@ class TestMBSManage:
         expected_changed_count = 1 if confirm_expected else 0
         assert len(retired_module_builds) == expected_changed_count
 
+    @pytest.mark.parametrize("reindex", (False, True))
+    @patch("module_build_service.builder.KojiModuleBuilder.KojiModuleBuilder"
+           ".get_module_build_rpms")
+    def test_index_module_build_rpms(self, get_module_build_rpms, reindex):
+        get_module_build_rpms.side_effect = lambda build: [
+            {"name": "foo", "epoch": None, "version": "1.0", "release": str(build.id),
+             "arch": "x86_64"},
+            {"name": "foo", "epoch": None, "version": "1.0", "release": str(build.id),
+             "arch": "src"},
+        ]
+        module_builds = (
+            db_session.query(ModuleBuild)
+            .filter_by(state=BUILD_STATES["ready"])
+            .order_by(ModuleBuild.id)
+            .all()
+        )
+        for x, build in enumerate(module_builds):
+            build.koji_tag = "module-tag-" + str(x)
+        db_session.add(models.ModuleBuildRPM(
+            module_build_id=module_builds[0].id, name="bar", nevra="bar-0:1-1.noarch",
+            nvra="bar-1-1.noarch"))
+        db_session.commit()
+
+        index_module_build_rpms(reindex)
+
+        expected_indexed = module_builds if reindex else module_builds[1:]
+        assert get_module_build_rpms.call_count == len(expected_indexed)
+        for build in expected_indexed:
+            assert sorted(rpm.nvra for rpm in build.indexed_rpms) == [
+                "foo-1.0-%d.src" % build.id, "foo-1.0-%d.x86_64" % build.id]
+            assert {rpm.nevra for rpm in build.indexed_rpms} == {
+                "foo-0:1.0-%d.src" % build.id, "foo-0:1.0-%d.x86_64" % build.id}
+        if not reindex:
+            assert [rpm.name for rpm in module_builds[0].indexed_rpms] == ["bar"]
+
+
+class TestCommandProfiles:
+
+    def setup_method(self, test_method):
+        self.profiling_dir = tempfile.mkdtemp(prefix="mbs-profiles-")
+        self.p_profiling_dir = patch(
+            "module_build_service.common.config.Config.profiling_dir",
+            new_callable=PropertyMock, return_value=self.profiling_dir)
+        self.p_profiling_dir.start()
+
+    def teardown_method(self, test_method):
+        self.p_profiling_dir.stop()
+        shutil.rmtree(self.profiling_dir)
+
+    def test_list_and_summarize_profiles(self, capsys):
+        with Profile("handler", "wait.module_build_2") as profile:
+            sorted(range(100))
+
+        profiles()
+        out, _ = capsys.readouterr()
+        assert os.path.basename(profile.path) in out
+
+        profiles(os.path.basename(profile.path))
+        out, _ = capsys.readouterr()
+        assert out.startswith("Total time: ")
+        assert "sorted" in out
+
 
 class TestCommandBuildModuleLocally:
     """Test mbs-manager subcommand build_module_locally"""
@@ -56,6 +56,27 @@ class TestDBModule:
         nsvcs = {m.get_nsvc() for m in result}
         assert nsvcs == {"testmodule:master:20170109091357:123"}
 
+    def test_get_buildrequired_modulemds_latest_version_all_contexts(self):
+        platform = db_session.query(ModuleBuild).filter_by(name="platform").one()
+        for nsvc in (
+            "nodejs:master:1:c1",
+            "nodejs:master:10:c1",
+            "nodejs:master:10:c2",
+            "nodejs:master:9:c3",
+            "nodejs:other:20:c1",
+        ):
+            tests.make_module_in_db(nsvc, base_module=platform)
+
+        resolver = mbs_resolver.GenericResolver.create(db_session, conf, backend="db")
+        result = resolver.get_buildrequired_modulemds("nodejs", "master", platform.mmd())
+        nsvcs = {m.get_nsvc() for m in result}
+        assert nsvcs == {"nodejs:master:10:c1", "nodejs:master:10:c2"}
+
+        # The newest builds come first
+        builds = ModuleBuild.get_last_builds_in_stream_version_lte(db_session, "nodejs")
+        assert [build.version for build in builds] == ["20", "10", "10"]
+        assert {build.context for build in builds[1:]} == {"c1", "c2"}
+
     @pytest.mark.parametrize("stream_versions", [False, True])
     def test_get_compatible_base_module_modulemds_stream_versions(self, stream_versions):
         tests.init_data(1, multiple_stream_versions=True)
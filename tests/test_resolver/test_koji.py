@@ -3,7 +3,7 @@
 from __future__ import absolute_import
 from datetime import datetime
 
-from mock import patch, MagicMock
+from mock import patch, MagicMock, PropertyMock
 import pytest
 
 from module_build_service.common.config import conf
@@ -83,7 +83,7 @@ class TestLocalResolverModule:
 
         assert result == []
         koji_session.listTagged.assert_called_with(
-            "foo-test", inherit=True, package="testmodule", type="module", event=123)
+            "foo-test", inherit=True, type="module", event=123)
 
     @patch("koji.ClientSession")
     def test_get_buildrequired_modulemds_multiple_streams(self, ClientSession):
@@ -201,15 +201,7 @@ class TestLocalResolverModule:
         nvrs = {m.nvr_string for m in result}
         assert nvrs == {"testmodule-master-20170109091357.7c29193d"}
 
-    @patch("koji.ClientSession")
-    def test_filter_inherited(self, ClientSession):
-        koji_session = ClientSession.return_value
-
-        koji_session.getFullInheritance.return_value = [
-            {"name": "foo-test"},
-            {"name": "foo-test-parent"},
-        ]
-
+    def test_filter_inherited(self):
         builds = [
             {
                 "build_id": 124, "name": "testmodule", "version": "master",
@@ -225,13 +217,65 @@ class TestLocalResolverModule:
             }]
 
         resolver = mbs_resolver.GenericResolver.create(db_session, conf, backend="koji")
-        new_builds = resolver._filter_inherited(koji_session, builds, "foo-test", {"id": 123})
+        new_builds = resolver._filter_inherited(builds, "foo-test", ["foo-test-parent"])
 
         nvrs = {"{name}-{version}-{release}".format(**b) for b in new_builds}
         assert nvrs == {
             "testmodule-master-20170110091357.7c29193d",
             "testmodule-2-20180109091357.7c29193d"}
 
+    @patch("koji.ClientSession")
+    def test_get_buildrequired_modulemds_tag_snapshot(self, ClientSession):
+        koji_session = ClientSession.return_value
+        koji_session.getLastEvent.return_value = {"id": 123}
+        koji_session.listTagged.return_value = [
+            {
+                "build_id": 123, "name": "testmodule", "version": "2",
+                "release": "820181219174508.9edba152", "tag_name": "foo-test"
+            },
+            {
+                "build_id": 124, "name": "testmodule", "version": "master",
+                "release": "20170109091357.7c29193d", "tag_name": "foo-test"
+            }]
+        koji_session.multiCall.return_value = [[koji_session.listTagged.return_value[1]]]
+
+        self._create_test_modules()
+        platform = db_session.query(ModuleBuild).filter_by(stream="f30.1.3").one()
+        for _ in range(2):
+            resolver = mbs_resolver.GenericResolver.create(db_session, conf, backend="koji")
+            for _ in range(2):
+                result = resolver.get_buildrequired_modulemds(
+                    "testmodule", "master", platform.mmd())
+                nsvcs = {m.get_nsvc() for m in result}
+                assert nsvcs == {"testmodule:master:20170109091357:7c29193d"}
+
+        # The tag is listed once, and the real stream of the build is queried once.
+        koji_session.getLastEvent.assert_called_once()
+        koji_session.listTagged.assert_called_once_with(
+            "foo-test", inherit=True, type="module", event=123)
+        koji_session.getFullInheritance.assert_called_once_with("foo-test", event=123)
+        koji_session.multiCall.assert_called_once()
+
+    @patch("module_build_service.common.config.Config.koji_tag_snapshot_ttl",
+           new_callable=PropertyMock, return_value=0)
+    @patch("koji.ClientSession")
+    def test_get_buildrequired_modulemds_tag_snapshot_expired(self, ClientSession, ttl):
+        koji_session = ClientSession.return_value
+        koji_session.getLastEvent.return_value = {"id": 123}
+        koji_session.listTagged.return_value = []
+
+        self._create_test_modules()
+        platform = db_session.query(ModuleBuild).filter_by(stream="f30.1.3").one()
+        resolver = mbs_resolver.GenericResolver.create(db_session, conf, backend="koji")
+        resolver.get_buildrequired_modulemds("testmodule", "master", platform.mmd())
+        # The same resolver keeps seeing the tag at the same event
+        resolver.get_buildrequired_modulemds("testmodule", "2", platform.mmd())
+        assert koji_session.listTagged.call_count == 1
+
+        resolver = mbs_resolver.GenericResolver.create(db_session, conf, backend="koji")
+        resolver.get_buildrequired_modulemds("testmodule", "master", platform.mmd())
+        assert koji_session.listTagged.call_count == 2
+
     @patch("module_build_service.resolver.KojiResolver.koji_multicall_map")
     def test_filter_based_on_real_stream_name(self, koji_multicall_map):
         koji_session = MagicMock()
@@ -5,9 +5,10 @@ from __future__ import absolute_import
 import mock
 
 from module_build_service.common.config import conf
-from module_build_service.scheduler import celery_app
+from module_build_service.scheduler import celery_app, events
 from module_build_service.scheduler.handlers import components, greenwave, modules, repos, tags
 from module_build_service.scheduler.producer import fail_lost_builds
+from module_build_service.scheduler.route import apply_async_for_module_build, get_handler_args
 from tests import scheduler_init_data
 
 
@@ -116,3 +117,19 @@ class TestCeleryRouteTask:
         queue = send_task_message.call_args[1].get("queue")
         qname = queue.__dict__.get("name")
         assert qname == "mbs-default"
+
+    @mock.patch("module_build_service.common.models.ModuleBuild.get_by_tag")
+    def test_route_task_with_module_build_id_header(self, get_by_tag, send_task_message):
+        apply_async_for_module_build(
+            repos.done, 5, "fakemsg", "module-testmodule-master-20170109091357-7c29193d-build")
+        queue = send_task_message.call_args[1].get("queue")
+        qname = queue.__dict__.get("name")
+        assert qname == "mbs-2"
+        get_by_tag.assert_not_called()
+
+
+def test_handler_args_recorded_at_definition():
+    assert events.handler_args["module_build_service.scheduler.handlers.repos.done"] == [
+        "msg_id", "tag_name"]
+    assert get_handler_args("module_build_service.scheduler.handlers.tags.tagged") == [
+        "msg_id", "tag_name", "build_nvr"]
@@ -2,7 +2,7 @@
 # SPDX-License-Identifier: MIT
 from __future__ import absolute_import
 
-from mock import patch, MagicMock
+from mock import patch, MagicMock, PropertyMock
 import pytest
 
 from module_build_service.common.errors import IgnoreMessage
@@ -45,9 +45,11 @@ class TestConsumer:
         assert event_info["msg_id"] == msg["msg_id"]
         assert event_info["tag_name"] == msg["msg"]["tag"]
 
+    @patch("module_build_service.common.config.Config.message_relevance_filter",
+           new_callable=PropertyMock, return_value=False)
     @patch("module_build_service.scheduler.consumer.models")
     @patch.object(MBSConsumer, "process_message")
-    def test_consume_fedmsg(self, process_message, models):
+    def test_consume_fedmsg(self, process_message, models, relevance_filter):
         """
         Test the MBSConsumer.consume() method when using the
         fedmsg backend.
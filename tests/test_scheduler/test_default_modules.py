@@ -9,7 +9,6 @@ from mock import call, Mock, patch, PropertyMock
 import pytest
 
 from module_build_service.common.config import conf
-from module_build_service.common.errors import UnprocessableEntity
 from module_build_service.common.models import ModuleBuild
 from module_build_service.common.utils import import_mmd, load_mmd, mmd_to_str
 from module_build_service.scheduler import default_modules
@@ -197,11 +196,11 @@ def test_get_default_modules(
     """
     mock_scm.return_value.sourcedir = "/some/path"
     if is_rawhide:
-        mock_scm.return_value.checkout_ref.side_effect = [
-            UnprocessableEntity("invalid branch"),
-            None,
-        ]
+        mock_scm._run.return_value = (0, b"abc123\trefs/heads/master\n", b"")
         mock_get_rawhide.return_value = "f32"
+    else:
+        mock_scm._run.return_value = (
+            0, b"abc123\trefs/heads/f32\ndef456\trefs/heads/master\n", b"")
 
     expected = {"nodejs": "11"}
     mock_mmd_new.return_value.get_default_streams.return_value = expected
@@ -209,12 +208,8 @@ def test_get_default_modules(
     rv = default_modules._get_default_modules("f32", conf.default_modules_scm_url)
 
     assert rv == expected
-    if is_rawhide:
-        mock_scm.return_value.checkout_ref.assert_has_calls(
-            [call("f32"), call(conf.rawhide_branch)]
-        )
-    else:
-        mock_scm.return_value.checkout_ref.assert_called_once_with("f32")
+    mock_scm.return_value.checkout_ref.assert_called_once_with("abc123")
+    assert mock_get_rawhide.called == is_rawhide
 
 
 @pytest.mark.parametrize("uses_rawhide", (True, False))
@@ -235,26 +230,76 @@ def test_get_default_modules_invalid_branch(
     Test that _get_default_modules raises an exception with an invalid branch.
     """
     mock_uses_rawhide.return_value = uses_rawhide
-    mock_scm.return_value.sourcedir = "/some/path"
-    mock_scm.return_value.checkout_ref.side_effect = [
-        UnprocessableEntity("invalid branch"),
-        UnprocessableEntity("invalid branch"),
-    ]
+    mock_scm.return_value.repository = "https://pagure.io/releng/fedora-module-defaults.git"
     if uses_rawhide:
-        mock_get_rawhide.return_value = "f32"
+        mock_scm._run.return_value = (0, b"abc123\trefs/heads/master\n", b"")
+        mock_get_rawhide.return_value = "f33"
     else:
-        mock_get_rawhide.return_value = "something_else"
+        mock_scm._run.return_value = (0, b"", b"")
 
     with pytest.raises(RuntimeError, match="Failed to retrieve the default modules"):
         default_modules._get_default_modules("f32", conf.default_modules_scm_url)
 
     mock_mmd_new.assert_not_called()
+    mock_scm.return_value.clone.assert_not_called()
+    expected_refs = ["refs/heads/f32"]
     if uses_rawhide:
-        mock_scm.return_value.checkout_ref.assert_has_calls(
-            [call("f32"), call(conf.rawhide_branch)],
-        )
-    else:
-        mock_scm.return_value.checkout_ref.assert_called_once_with("f32")
+        expected_refs.append("refs/heads/master")
+    mock_scm._run.assert_called_once_with(
+        ["git", "ls-remote", mock_scm.return_value.repository] + expected_refs)
+
+
+@patch("shutil.rmtree")
+@patch("tempfile.mkdtemp")
+@patch("module_build_service.scheduler.default_modules.Modulemd.ModuleIndex.new")
+@patch("module_build_service.scheduler.default_modules.scm.SCM")
+def test_get_default_modules_cached(mock_scm, mock_mmd_new, mock_mkdtemp, mock_rmtree):
+    """
+    Test that the default modules are retrieved once per commit, and that the branch is resolved
+    again when the cached commit expires.
+    """
+    mock_scm.return_value.sourcedir = "/some/path"
+    mock_scm._run.return_value = (0, b"abc123\trefs/heads/f32\n", b"")
+    mock_mmd_new.return_value.get_default_streams.return_value = {"nodejs": "11"}
+
+    for _ in range(3):
+        rv = default_modules._get_default_modules("f32", conf.default_modules_scm_url)
+        assert rv == {"nodejs": "11"}
+    assert mock_scm._run.call_count == 1
+    assert mock_scm.return_value.clone.call_count == 1
+
+    # The branch still points to the same commit, so the default modules are not retrieved again
+    with patch.object(conf, "default_modules_ref_ttl", new=0):
+        default_modules._get_default_modules("f32", conf.default_modules_scm_url)
+    assert mock_scm._run.call_count == 2
+    assert mock_scm.return_value.clone.call_count == 1
+
+    mock_scm._run.return_value = (0, b"def456\trefs/heads/f32\n", b"")
+    mock_mmd_new.return_value.get_default_streams.return_value = {"nodejs": "12"}
+    with patch.object(conf, "default_modules_ref_ttl", new=0):
+        rv = default_modules._get_default_modules("f32", conf.default_modules_scm_url)
+    assert rv == {"nodejs": "12"}
+    mock_scm.return_value.checkout_ref.assert_called_with("def456")
+
+
+@patch("module_build_service.scheduler.default_modules.get_session")
+def test_get_rawhide_version_cached(mock_get_session):
+    """
+    Test that the rawhide version is queried again only when the cached one expires.
+    """
+    mock_get_session.return_value.getBuildTarget.return_value = {
+        "build_tag_name": "f32-build",
+    }
+    for _ in range(2):
+        assert default_modules._get_rawhide_version() == "f32"
+    assert mock_get_session.return_value.getBuildTarget.call_count == 1
+
+    mock_get_session.return_value.getBuildTarget.return_value = {
+        "build_tag_name": "f33-build",
+    }
+    with patch.object(conf, "rawhide_version_ttl", new=0):
+        assert default_modules._get_rawhide_version() == "f33"
+    assert mock_get_session.return_value.getBuildTarget.call_count == 2
 
 
 @patch("module_build_service.scheduler.default_modules.get_session")
@@ -269,8 +314,8 @@ def test_get_rawhide_version(mock_get_session):
 
 
 @patch("module_build_service.scheduler.default_modules.get_session")
-@patch("module_build_service.scheduler.default_modules._get_rpms_from_tags")
-def test_handle_collisions_with_base_module_rpms(mock_grft, mock_get_session):
+@patch("module_build_service.scheduler.default_modules._get_rpm_indexes")
+def test_handle_collisions_with_base_module_rpms(mock_gri, mock_get_session):
     """
     Test that handle_collisions_with_base_module_rpms will add conflicts for NEVRAs in the
     modulemd.
@@ -282,20 +327,32 @@ def test_handle_collisions_with_base_module_rpms(mock_grft, mock_get_session):
     xmd["mbs"]["buildrequires"]["bash"] = {"koji_tag": "module-bash"}
     mmd.set_xmd(xmd)
 
-    bm_rpms = {
-        "bash-completion-1:2.7-5.el8.noarch",
-        "bash-0:4.4.19-7.el8.aarch64",
-        "python2-tools-0:2.7.16-11.el8.aarch64",
-        "python2-tools-0:2.7.16-11.el8.x86_64",
-        "python3-ldap-0:3.1.0-4.el8.aarch64",
-        "python3-ldap-0:3.1.0-4.el8.x86_64",
-    }
-    non_bm_rpms = {
-        "bash-0:4.4.20-1.el8.aarch64",
-        "python2-tools-0:2.7.18-1.module+el8.1.0+3568+bbd875cb.aarch64",
-        "python2-tools-0:2.7.18-1.module+el8.1.0+3568+bbd875cb.x86_64",
-    }
-    mock_grft.side_effect = [bm_rpms, non_bm_rpms]
+    bm_indexes = [
+        {
+            "bash-completion": ["bash-completion-1:2.7-5.el8.noarch"],
+            "bash": ["bash-0:4.4.19-7.el8.aarch64"],
+            "python2-tools": [
+                "python2-tools-0:2.7.16-11.el8.aarch64",
+                "python2-tools-0:2.7.16-11.el8.x86_64",
+            ],
+        },
+        {
+            "python3-ldap": [
+                "python3-ldap-0:3.1.0-4.el8.aarch64",
+                "python3-ldap-0:3.1.0-4.el8.x86_64",
+            ],
+        },
+    ]
+    non_bm_indexes = [
+        {"bash": ["bash-0:4.4.20-1.el8.aarch64"]},
+        {
+            "python2-tools": [
+                "python2-tools-0:2.7.18-1.module+el8.1.0+3568+bbd875cb.aarch64",
+                "python2-tools-0:2.7.18-1.module+el8.1.0+3568+bbd875cb.x86_64",
+            ],
+        },
+    ]
+    mock_gri.side_effect = [bm_indexes, non_bm_indexes]
 
     default_modules.handle_collisions_with_base_module_rpms(mmd, ["aarch64", "x86_64"])
 
@@ -306,25 +363,27 @@ def test_handle_collisions_with_base_module_rpms(mock_grft, mock_get_session):
         "python2-tools-0:2.7.16-11.el8.aarch64",
         "python2-tools-0:2.7.16-11.el8.x86_64",
     }
-    assert mock_grft.call_count == 2
+    assert mock_gri.call_count == 2
     # We can't check the calls directly because the second argument is a set converted to a list,
     # so the order can't be determined ahead of time.
-    first_call = mock_grft.mock_calls[0][1]
+    first_call = mock_gri.mock_calls[0][1]
     assert first_call[0] == mock_get_session.return_value
     assert first_call[1] == ["module-el-build"]
     assert first_call[2] == ["aarch64", "x86_64"]
 
-    second_call = mock_grft.mock_calls[1][1]
+    second_call = mock_gri.mock_calls[1][1]
     assert second_call[0] == mock_get_session.return_value
     assert set(second_call[1]) == {"module-bash", "module-python27"}
     assert second_call[2] == ["aarch64", "x86_64"]
 
 
+@patch("module_build_service.scheduler.default_modules._get_repodata_checksum")
 @patch("module_build_service.scheduler.default_modules.koji_retrying_multicall_map")
 @patch("module_build_service.scheduler.default_modules._get_rpms_in_external_repo")
-def test_get_rpms_from_tags(mock_grier, mock_multicall_map):
+def test_get_rpm_indexes(mock_grier, mock_multicall_map, mock_grc, tmpdir):
     """
-    Test the function queries Koji for the tags' and the tags' external repos' for RPMs.
+    Test the function indexes the RPMs of the tags and of the tags' external repos, and that
+    the indexes are reused until the tags or the repodata change.
     """
     mock_session = Mock()
     bash_tagged = [
@@ -373,9 +432,11 @@ def test_get_rpms_from_tags(mock_grier, mock_multicall_map):
         "url": external_repo_url,
     }]
     mock_multicall_map.side_effect = [
+        [100, 200],
         [bash_tagged, python_tagged],
         [bash_repos, python_repos],
     ]
+    mock_grc.return_value = "checksum1"
     mock_grier.return_value = {
         "python2-test-0:2.7.16-11.module+el8.1.0+3568+bbd875cb.aarch64",
         "python2-test-0:2.7.16-11.module+el8.1.0+3568+bbd875cb.x86_64",
@@ -383,25 +444,53 @@ def test_get_rpms_from_tags(mock_grier, mock_multicall_map):
 
     tags = ["module-bash", "module-python27"]
     arches = ["aarch64", "x86_64"]
-    rv = default_modules._get_rpms_from_tags(mock_session, tags, arches)
+    with patch.object(conf, "cache_dir", new=str(tmpdir)):
+        rv = default_modules._get_rpm_indexes(mock_session, tags, arches)
 
-    expected = {
-        "bash-0:4.4.20-1.module+el8.1.0+123+bbd875cb.aarch64",
-        "bash-0:4.4.20-1.module+el8.1.0+123+bbd875cb.x86_64",
-        "python2-tools-0:2.7.18-1.module+el8.1.0+3568+bbd875cb.aarch64",
-        "python2-tools-0:2.7.18-1.module+el8.1.0+3568+bbd875cb.x86_64",
-        "python2-test-0:2.7.16-11.module+el8.1.0+3568+bbd875cb.aarch64",
-        "python2-test-0:2.7.16-11.module+el8.1.0+3568+bbd875cb.x86_64",
-    }
-    assert rv == expected
-    assert mock_multicall_map.call_count == 2
-    mock_grier.assert_called_once_with(external_repo_url, arches, "module-python27-12")
+        expected = [
+            {
+                "bash": [
+                    "bash-0:4.4.20-1.module+el8.1.0+123+bbd875cb.aarch64",
+                    "bash-0:4.4.20-1.module+el8.1.0+123+bbd875cb.x86_64",
+                ],
+            },
+            {
+                "python2-tools": [
+                    "python2-tools-0:2.7.18-1.module+el8.1.0+3568+bbd875cb.aarch64",
+                    "python2-tools-0:2.7.18-1.module+el8.1.0+3568+bbd875cb.x86_64",
+                ],
+            },
+            {
+                "python2-test": sorted(mock_grier.return_value),
+            },
+        ]
+        rv[2]["python2-test"].sort()
+        assert rv == expected
+        assert mock_multicall_map.call_count == 3
+        mock_multicall_map.assert_any_call(
+            mock_session, mock_session.listTaggedRPMS, tags,
+            [{"latest": True, "inherit": True, "event": event} for event in (100, 200)],
+            method="listTaggedRPMS",
+        )
+        mock_grier.assert_called_once_with(external_repo_url, arches, "module-python27-12")
+        mock_grc.assert_called_once_with(external_repo_url, arches)
+
+        # The indexes are stored on the disk and shared with the other processes
+        mock_multicall_map.side_effect = [[100, 201], [python_tagged], [bash_repos, python_repos]]
+        rv = default_modules._get_rpm_indexes(mock_session, tags, arches)
+        rv[2]["python2-test"].sort()
+        assert rv == expected
+        # Only the tagged RPMs of the changed tag are listed again
+        assert mock_multicall_map.call_count == 6
+        assert mock_multicall_map.mock_calls[4][1][2] == ["module-python27"]
+        assert mock_grier.call_count == 1
+        assert len(tmpdir.join("rpm_index").listdir()) == 3
 
 
 @patch("module_build_service.scheduler.default_modules.koji_retrying_multicall_map")
-def test_get_rpms_from_tags_error_listTaggedRPMS(mock_multicall_map):
+def test_get_rpm_indexes_error_tagLastChangeEvent(mock_multicall_map):
     """
-    Test that an exception is raised if the listTaggedRPMS Koji query fails.
+    Test that an exception is raised if the tagLastChangeEvent Koji query fails.
     """
     mock_session = Mock()
     mock_multicall_map.return_value = None
@@ -409,27 +498,71 @@ def test_get_rpms_from_tags_error_listTaggedRPMS(mock_multicall_map):
     tags = ["module-bash", "module-python27"]
     arches = ["aarch64", "x86_64"]
     expected = (
-        "Getting the tagged RPMs of the following Koji tags failed: module-bash, module-python27"
+        "Getting the last change events of the following Koji tags failed: "
+        "module-bash, module-python27"
     )
     with pytest.raises(RuntimeError, match=expected):
-        default_modules._get_rpms_from_tags(mock_session, tags, arches)
+        default_modules._get_rpm_indexes(mock_session, tags, arches)
 
 
 @patch("module_build_service.scheduler.default_modules.koji_retrying_multicall_map")
-def test_get_rpms_from_tags_error_getExternalRepoList(mock_multicall_map):
+def test_get_rpm_indexes_error_listTaggedRPMS(mock_multicall_map, tmpdir):
+    """
+    Test that an exception is raised if the listTaggedRPMS Koji query fails.
+    """
+    mock_session = Mock()
+    mock_multicall_map.side_effect = [[100, 200], None]
+
+    tags = ["module-bash", "module-python27"]
+    arches = ["aarch64", "x86_64"]
+    expected = (
+        "Getting the tagged RPMs of the following Koji tags failed: module-bash, module-python27"
+    )
+    with patch.object(conf, "cache_dir", new=str(tmpdir)):
+        with pytest.raises(RuntimeError, match=expected):
+            default_modules._get_rpm_indexes(mock_session, tags, arches)
+
+
+@patch("module_build_service.scheduler.default_modules.koji_retrying_multicall_map")
+def test_get_rpm_indexes_error_getExternalRepoList(mock_multicall_map, tmpdir):
     """
     Test that an exception is raised if the getExternalRepoList Koji query fails.
     """
     mock_session = Mock()
-    mock_multicall_map.side_effect = [[[[], []]], None]
+    mock_multicall_map.side_effect = [[100, 200], [[[], None], [[], None]], None]
 
     tags = ["module-bash", "module-python27"]
     arches = ["aarch64", "x86_64"]
     expected = (
         "Getting the external repos of the following Koji tags failed: module-bash, module-python27"
     )
-    with pytest.raises(RuntimeError, match=expected):
-        default_modules._get_rpms_from_tags(mock_session, tags, arches)
+    with patch.object(conf, "cache_dir", new=str(tmpdir)):
+        with pytest.raises(RuntimeError, match=expected):
+            default_modules._get_rpm_indexes(mock_session, tags, arches)
+
+
+@patch("module_build_service.scheduler.default_modules.requests_session")
+def test_get_repodata_checksum(mock_session):
+    """
+    Test that the checksum of the repodata changes with the repomd.xml of any of the arches.
+    """
+    external_repo_url = "http://domain.local/repo/latest/$arch/"
+    mock_session.get.return_value.content = b"<repomd>1</repomd>"
+    checksum = default_modules._get_repodata_checksum(external_repo_url, ["x86_64", "i686"])
+    mock_session.get.assert_has_calls([
+        call("http://domain.local/repo/latest/x86_64/repodata/repomd.xml",
+             timeout=conf.dnf_timeout),
+        call().raise_for_status(),
+        call("http://domain.local/repo/latest/i386/repodata/repomd.xml",
+             timeout=conf.dnf_timeout),
+        call().raise_for_status(),
+    ])
+    assert checksum == default_modules._get_repodata_checksum(
+        external_repo_url, ["x86_64", "i686"])
+
+    mock_session.get.return_value.content = b"<repomd>2</repomd>"
+    assert checksum != default_modules._get_repodata_checksum(
+        external_repo_url, ["x86_64", "i686"])
 
 
 @patch("dnf.Base")
@@ -15,8 +15,8 @@ class TestGreenwaveQuery():
     def setup_method(self, method):
         clean_database()
 
-    @patch("module_build_service.scheduler.greenwave.requests")
-    def test_greenwave_query_decision(self, mock_requests):
+    @patch.object(greenwave, "_session")
+    def test_greenwave_query_decision(self, mock_session):
         resp_status = 200
         resp_content = {
             "applicable_policies": ["osci_compose_modules"],
@@ -39,7 +39,7 @@ class TestGreenwaveQuery():
         response = Mock()
         response.json.return_value = resp_content
         response.status_code = resp_status
-        mock_requests.post.return_value = response
+        mock_session.post.return_value = response
 
         fake_build = make_module_in_db(
             "pkg:0.1:1:c1", [{
@@ -50,18 +50,18 @@ class TestGreenwaveQuery():
         got_response = greenwave.query_decision(fake_build, prod_version="xxxx-8")
 
         assert got_response == resp_content
-        assert json.loads(mock_requests.post.call_args_list[0][1]["data"]) == {
+        assert json.loads(mock_session.post.call_args_list[0][1]["data"]) == {
             "decision_context": "test_dec_context",
             "product_version": "xxxx-8", "subject_type": "some-module",
             "subject_identifier": "pkg-0.1-1.c1"}
-        assert mock_requests.post.call_args_list[0][1]["headers"] == {
+        assert mock_session.post.call_args_list[0][1]["headers"] == {
             "Content-Type": "application/json"}
-        assert mock_requests.post.call_args_list[0][1]["url"] == \
+        assert mock_session.post.call_args_list[0][1]["url"] == \
             "https://greenwave.example.local/api/v1.0/decision"
 
     @pytest.mark.parametrize("return_all", (False, True))
-    @patch("module_build_service.scheduler.greenwave.requests")
-    def test_greenwave_query_policies(self, mock_requests, return_all):
+    @patch.object(greenwave, "_session")
+    def test_greenwave_query_policies(self, mock_session, return_all):
         resp_status = 200
         resp_content = {
             "policies": [
@@ -90,7 +90,7 @@ class TestGreenwaveQuery():
         response = Mock()
         response.json.return_value = resp_content
         response.status_code = resp_status
-        mock_requests.get.return_value = response
+        mock_session.get.return_value = response
 
         got_response = greenwave.query_policies(return_all)
 
@@ -98,11 +98,11 @@ class TestGreenwaveQuery():
             assert got_response == resp_content
         else:
             assert got_response == selected_policies
-        assert mock_requests.get.call_args_list[0][1]["url"] == \
+        assert mock_session.get.call_args_list[0][1]["url"] == \
             "https://greenwave.example.local/api/v1.0/policies"
 
-    @patch("module_build_service.scheduler.greenwave.requests")
-    def test_greenwave_get_product_versions(self, mock_requests):
+    @patch.object(greenwave, "_session")
+    def test_greenwave_get_product_versions(self, mock_session):
         resp_status = 200
         resp_content = {
             "policies": [
@@ -131,17 +131,24 @@ class TestGreenwaveQuery():
         response = Mock()
         response.json.return_value = resp_content
         response.status_code = resp_status
-        mock_requests.get.return_value = response
+        mock_session.get.return_value = response
 
         versions_set = greenwave.get_product_versions()
 
         assert versions_set == expected_versions
-        assert mock_requests.get.call_args_list[0][1]["url"] == \
+        assert mock_session.get.call_args_list[0][1]["url"] == \
             "https://greenwave.example.local/api/v1.0/policies"
 
+        # The policies are cached
+        assert greenwave.get_product_versions() == expected_versions
+        assert mock_session.get.call_count == 1
+        greenwave.clear_product_versions()
+        assert greenwave.get_product_versions() == expected_versions
+        assert mock_session.get.call_count == 2
+
     @pytest.mark.parametrize("policies_satisfied", (True, False))
-    @patch("module_build_service.scheduler.greenwave.requests")
-    def test_greenwave_check_gating(self, mock_requests, policies_satisfied):
+    @patch.object(greenwave, "_session")
+    def test_greenwave_check_gating(self, mock_session, policies_satisfied):
         resp_status = 200
         policies_content = {
             "policies": [
@@ -160,8 +167,8 @@ class TestGreenwaveQuery():
         responses[0].json.return_value = policies_content
         responses[1].json.return_value = {"policies_satisfied": False}
         responses[2].json.return_value = {"policies_satisfied": policies_satisfied}
-        mock_requests.get.return_value = responses[0]
-        mock_requests.post.side_effect = responses[1:]
+        mock_session.get.return_value = responses[0]
+        mock_session.post.side_effect = responses[1:]
 
         fake_build = make_module_in_db(
             "pkg:0.1:1:c1", [{
@@ -172,3 +179,34 @@ class TestGreenwaveQuery():
         result = greenwave.check_gating(fake_build)
 
         assert result == policies_satisfied
+
+    @patch.object(greenwave, "_session")
+    def test_greenwave_check_gating_of_builds(self, mock_session):
+        policies_response = Mock(status_code=200)
+        policies_response.json.return_value = {
+            "policies": [
+                {
+                    "decision_context": "test_dec_context",
+                    "product_versions": ["ver1"],
+                    "rules": [],
+                    "subject_type": "some-module"
+                }
+            ]
+        }
+        mock_session.get.return_value = policies_response
+
+        def post(url, timeout, headers, data):
+            nvr = json.loads(data)["subject_identifier"]
+            if nvr == "pkg-0.1-3.c1":
+                return Mock(status_code=500, **{"json.return_value": {"message": "error"}})
+            return Mock(status_code=200, **{
+                "json.return_value": {"policies_satisfied": nvr == "pkg-0.1-1.c1"}})
+
+        mock_session.post.side_effect = post
+
+        nvrs = ["pkg-0.1-{0}.c1".format(i) for i in range(1, 4)]
+        assert greenwave.check_gating_of_builds(nvrs) == [
+            (True, False), (False, False), (False, True)]
+        # The policies are queried once for all the builds
+        assert mock_session.get.call_count == 1
+        assert greenwave.check_gating_of_builds([]) == []
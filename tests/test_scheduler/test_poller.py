@@ -80,6 +80,25 @@ class TestPoller:
 
         assert len(start_build_component.mock_calls) == expected_build_calls
 
+    @patch("module_build_service.scheduler.producer.log")
+    def test_log_summary(self, log, create_builder, dbg):
+        producer.log_summary()
+
+        expected_calls = []
+        for name, code in sorted(models.BUILD_STATES.items(), key=lambda item: item[1]):
+            module_builds = db_session.query(models.ModuleBuild).filter_by(state=code).all()
+            if module_builds:
+                expected_calls.append(
+                    call("  * %s module builds in the %s state", len(module_builds), name))
+            if name == "build":
+                for module_build in module_builds:
+                    expected_calls.append(call("    * %r", module_build))
+                    for i in range(1, module_build.batch + 1):
+                        n = len([c for c in module_build.component_builds if c.batch == i])
+                        expected_calls.append(call("      * %s components in batch %s", n, i))
+        assert any(c[1][0] == "    * %r" for c in log.info.mock_calls)
+        assert log.info.mock_calls == expected_calls
+
     @pytest.mark.parametrize('task_state, expect_start_build_component', (
         (None, True),  # Indicates a newRepo task has not been triggered yet.
         (koji.TASK_STATES["CLOSED"], True),
@@ -340,10 +359,10 @@ class TestPoller:
         # Poll :)
         producer.process_waiting_module_builds()
 
-        handler.delay.assert_called_once_with(
-            "internal:mbs.module.state.change",
-            module_build.id,
-            module_build.state
+        handler.apply_async.assert_called_once_with(
+            args=("internal:mbs.module.state.change", module_build.id, module_build.state),
+            kwargs={},
+            headers={"module_build_id": module_build.id},
         )
 
         db_session.refresh(module_build)
@@ -441,6 +460,56 @@ class TestPoller:
         ]
         assert expected == sorted(args[0])
 
+    @patch("module_build_service.common.config.Config.log_messages_max_per_module_build",
+           new_callable=mock.PropertyMock, return_value=2)
+    def test_cleanup_log_messages(self, max_per_module_build, create_builder, dbg):
+        """ Test that the old log messages of the finished module builds and the oldest log
+        messages of the module builds with too many of them are deleted.
+        """
+        module_build_one = models.ModuleBuild.get_by_id(db_session, 2)
+        module_build_one.state = models.BUILD_STATES["ready"]
+        module_build_two = models.ModuleBuild.get_by_id(db_session, 3)
+        module_build_two.state = models.BUILD_STATES["build"]
+        old = datetime.utcnow() - timedelta(days=conf.log_messages_retention_days + 1)
+        for module_build in (module_build_one, module_build_two):
+            for i in range(3):
+                db_session.add(models.LogMessage(
+                    module_build_id=module_build.id, message="old {}".format(i),
+                    time_created=old))
+        db_session.add(models.LogMessage(
+            module_build_id=module_build_two.id, message="new", time_created=datetime.utcnow()))
+        db_session.commit()
+
+        producer.cleanup_log_messages()
+
+        def get_messages(module_build):
+            query = (
+                db_session.query(models.LogMessage.message)
+                .filter_by(module_build_id=module_build.id)
+                .order_by(models.LogMessage.id)
+            )
+            return [message for message, in query]
+
+        assert get_messages(module_build_one) == []
+        assert get_messages(module_build_two) == ["old 2", "new"]
+
+    @patch("module_build_service.common.config.Config.log_messages_max_per_module_build",
+           new_callable=mock.PropertyMock, return_value=2)
+    def test_cleanup_log_messages_under_limit(self, max_per_module_build, create_builder, dbg):
+        """ Test that no log message is deleted when no module build has too many of them. """
+        module_build = models.ModuleBuild.get_by_id(db_session, 3)
+        module_build.state = models.BUILD_STATES["build"]
+        for i in range(2):
+            db_session.add(models.LogMessage(
+                module_build_id=module_build.id, message="message {}".format(i),
+                time_created=datetime.utcnow()))
+        db_session.commit()
+
+        with patch.object(producer, "_delete_log_messages", return_value=0) as delete:
+            producer.cleanup_log_messages()
+        # Only the messages older than the retention are looked for
+        assert delete.call_count == 1
+
     def test_cleanup_stale_failed_builds_no_components(self, create_builder, dbg):
         """ Test that a module build without any components built gets to the garbage state when
         running cleanup_stale_failed_builds.
@@ -539,25 +608,29 @@ class TestPoller:
                 listtags_return_value.append(
                     {"id": 1, "name": module_build_2.koji_tag + "-build"})
                 expected_tagged_calls.append(call(
-                    "internal:sync_koji_build_tags",
-                    module_build_2.koji_tag + "-build", c.nvr
+                    args=(
+                        "internal:sync_koji_build_tags", module_build_2.koji_tag + "-build", c.nvr
+                    ),
+                    kwargs={},
+                    headers={"module_build_id": module_build_2.id},
                 ))
             if tagged_in_final:
                 listtags_return_value.append(
                     {"id": 2, "name": module_build_2.koji_tag})
                 expected_tagged_calls.append(call(
-                    "internal:sync_koji_build_tags",
-                    module_build_2.koji_tag, c.nvr
+                    args=("internal:sync_koji_build_tags", module_build_2.koji_tag, c.nvr),
+                    kwargs={},
+                    headers={"module_build_id": module_build_2.id},
                 ))
         koji_session.listTags.return_value = listtags_return_value
 
         producer.sync_koji_build_tags()
 
-        tagged_handler.delay.assert_has_calls(
+        tagged_handler.apply_async.assert_has_calls(
             expected_tagged_calls, any_order=True)
 
     @pytest.mark.parametrize("greenwave_result", [True, False])
-    @patch("module_build_service.scheduler.greenwave.Greenwave.check_gating")
+    @patch("module_build_service.scheduler.greenwave.Greenwave.get_gating_decision")
     def test_poll_greenwave(self, mock_gw, create_builder, dbg, greenwave_result):
 
         module_build1 = models.ModuleBuild.get_by_id(db_session, 1)
@@ -575,7 +648,7 @@ class TestPoller:
 
         db_session.commit()
 
-        mock_gw.return_value = greenwave_result
+        mock_gw.return_value = (greenwave_result, False)
 
         producer.poll_greenwave()
 
@@ -596,3 +669,30 @@ class TestPoller:
                     assert re.match("Gating failed.*", module.state_reason)
                 else:
                     assert module.state_reason is None
+
+    @patch("module_build_service.scheduler.greenwave.Greenwave.get_gating_decision")
+    def test_poll_greenwave_backoff(self, mock_gw, create_builder, dbg):
+        now = datetime.utcnow()
+        models.ModuleBuild.get_by_id(db_session, 1).state = models.BUILD_STATES["ready"]
+        # Failed the gating an hour after completing, so it waits an hour before the next check
+        module_build2 = models.ModuleBuild.get_by_id(db_session, 2)
+        module_build2.state = models.BUILD_STATES["done"]
+        module_build2.time_completed = now - timedelta(hours=2)
+        module_build2.time_modified = now - timedelta(minutes=30)
+        # Checked an hour ago, a day after completing, so the maximum interval has passed
+        module_build3 = models.ModuleBuild.get_by_id(db_session, 3)
+        module_build3.state = models.BUILD_STATES["done"]
+        module_build3.time_completed = now - timedelta(days=1, hours=1)
+        module_build3.time_modified = now - timedelta(hours=1)
+        db_session.commit()
+
+        mock_gw.return_value = (False, False)
+        with patch.object(conf, "greenwave_poll_max_interval", new=3600):
+            producer.poll_greenwave()
+
+        mock_gw.assert_called_once_with(module_build3.nvr_string)
+        db_session.expire_all()
+        assert models.ModuleBuild.get_by_id(db_session, 3).state_reason == \
+            "Gating failed (MBS will retry in 3600 seconds)"
+        assert models.ModuleBuild.get_by_id(db_session, 2).time_modified == \
+            now - timedelta(minutes=30)
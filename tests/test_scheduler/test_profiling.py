@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+from __future__ import absolute_import
+
+from mock import patch, PropertyMock, MagicMock
+import pytest
+
+from module_build_service.scheduler.profiling import (
+    profile_handler, should_profile_module_build, start_task_profile, stop_task_profile
+)
+
+
+@patch("module_build_service.common.config.Config.profiling_dir",
+       new_callable=PropertyMock, return_value="/profiles")
+@patch("module_build_service.common.config.Config.profiling_module_build_ids",
+       new_callable=PropertyMock, return_value=[2])
+class TestProfiling:
+
+    @pytest.mark.parametrize(("module_build_id", "expected"), ((2, True), ("2", True), (3, False)))
+    def test_should_profile_module_build(self, ids, profiling_dir, module_build_id, expected):
+        assert should_profile_module_build(module_build_id) is expected
+
+    @patch("module_build_service.common.config.Config.profiling_sample_one_in",
+           new_callable=PropertyMock, return_value=1)
+    def test_should_profile_sampled_module_build(self, sample_one_in, ids, profiling_dir):
+        assert should_profile_module_build(3) is True
+
+    def test_profiling_disabled(self, ids, profiling_dir):
+        profiling_dir.return_value = ""
+        assert should_profile_module_build(2) is False
+
+    @patch("module_build_service.scheduler.profiling.Profile")
+    def test_profile_handler(self, Profile, ids, profiling_dir):
+        with profile_handler(3, "wait"):
+            pass
+        Profile.assert_not_called()
+
+        with profile_handler(2, "wait"):
+            pass
+        Profile.assert_called_once_with("handler", "wait.module_build_2")
+
+    @patch("module_build_service.scheduler.profiling.Profile")
+    def test_profile_celery_task(self, Profile, ids, profiling_dir):
+        task = MagicMock()
+        task.name = "module_build_service.scheduler.handlers.modules.wait"
+        task.request.module_build_id = 2
+        start_task_profile(task_id="abc", task=task)
+        Profile.assert_called_once_with("handler", "wait.module_build_2")
+        stop_task_profile(task_id="abc")
+        Profile.return_value.start.return_value.stop.assert_called_once_with()
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+from __future__ import absolute_import
+
+import koji
+from mock import patch, MagicMock, PropertyMock
+
+from module_build_service.common.models import BUILD_STATES, ComponentBuild, ModuleBuild
+from module_build_service.scheduler import events
+from module_build_service.scheduler.consumer import MBSConsumer
+from module_build_service.scheduler.db_session import db_session
+from module_build_service.scheduler.relevance import RelevanceIndex, relevance_index
+from tests import clean_database, make_module_in_db
+
+
+def build_change_event(task_id, module_build_id=None):
+    return {
+        "msg_id": "build-change",
+        "event": events.KOJI_BUILD_CHANGE,
+        "task_id": task_id,
+        "build_new_state": koji.BUILD_STATES["COMPLETE"],
+        "build_name": "foo",
+        "build_version": "1",
+        "build_release": "1",
+        "module_build_id": module_build_id,
+        "state_reason": None,
+    }
+
+
+def repo_change_event(tag_name):
+    return {"msg_id": "repo-change", "event": events.KOJI_REPO_CHANGE, "tag_name": tag_name}
+
+
+class TestRelevanceIndex:
+    def setup_method(self, test_method):
+        clean_database()
+        self.module_build = make_module_in_db("testmodule:master:1:c1")
+        self.module_build.state = BUILD_STATES["build"]
+        self.module_build.koji_tag = "module-testmodule-master-1-c1"
+        db_session.add_all([
+            self._make_component(1000, koji.BUILD_STATES["BUILDING"]),
+            self._make_component(1001, koji.BUILD_STATES["COMPLETE"]),
+        ])
+        done_module_build = make_module_in_db("testmodule:master:2:c1")
+        done_module_build.state = BUILD_STATES["done"]
+        done_module_build.koji_tag = "module-testmodule-master-2-c1"
+        db_session.add_all([
+            self._make_component(2000, koji.BUILD_STATES["BUILDING"], done_module_build.id),
+            self._make_component(2001, koji.BUILD_STATES["COMPLETE"], done_module_build.id),
+        ])
+        db_session.commit()
+        self.index = RelevanceIndex()
+
+    def _make_component(self, task_id, state, module_id=None):
+        return ComponentBuild(
+            package="foo-{}".format(task_id),
+            scmurl="https://src.stg.fedoraproject.org/rpms/foo.git?#ff1ea79",
+            format="rpms",
+            task_id=task_id,
+            state=state,
+            batch=1,
+            module_id=module_id or self.module_build.id,
+        )
+
+    def test_refresh(self):
+        self.index.refresh(db_session)
+        assert self.index.task_ids == {1000, 1001, 2000}
+        assert self.index.koji_tags == {"module-testmodule-master-1-c1"}
+
+    def test_is_relevant(self):
+        assert self.index.is_relevant(db_session, build_change_event(1000))
+        assert not self.index.is_relevant(db_session, build_change_event(2001))
+        assert self.index.is_relevant(db_session, build_change_event(2001, module_build_id=1))
+        assert self.index.is_relevant(
+            db_session, repo_change_event("module-testmodule-master-1-c1-build"))
+        assert not self.index.is_relevant(db_session, repo_change_event("f32-build"))
+        assert self.index.is_relevant(db_session, {
+            "msg_id": "module-state-change",
+            "event": events.MBS_MODULE_STATE_CHANGE,
+            "module_build_id": 1,
+            "module_build_state": BUILD_STATES["wait"],
+        })
+
+    def test_misses_do_not_query_the_database(self):
+        self.index.refresh(db_session)
+        session = MagicMock()
+        assert not self.index.is_relevant(session, build_change_event(3000))
+        assert not self.index.is_relevant(session, repo_change_event("f32-build"))
+        session.query.assert_not_called()
+
+    @patch("module_build_service.common.config.Config.message_relevance_refresh_interval",
+           new_callable=PropertyMock, return_value=0)
+    def test_changes_of_other_processes_known_after_refresh(self, refresh_interval):
+        self.index.refresh(db_session)
+        # Simulate changes done by another process, so not flushed through db_session
+        db_session.execute(
+            ComponentBuild.__table__.update()
+            .where(ComponentBuild.task_id == 1001)
+            .values(task_id=3000)
+        )
+        other_module_build = make_module_in_db("testmodule:master:3:c1")
+        db_session.execute(
+            ModuleBuild.__table__.update()
+            .where(ModuleBuild.id == other_module_build.id)
+            .values(state=BUILD_STATES["build"], koji_tag="module-testmodule-master-3-c1")
+        )
+        db_session.commit()
+
+        assert self.index.is_relevant(db_session, build_change_event(3000))
+        assert self.index.is_relevant(
+            db_session, repo_change_event("module-testmodule-master-3-c1"))
+
+    def test_record_session_changes(self):
+        relevance_index.refresh(db_session)
+        component = self._make_component(4000, koji.BUILD_STATES["BUILDING"])
+        db_session.add(component)
+        db_session.commit()
+        assert 4000 in relevance_index.task_ids
+
+
+class TestConsumerRelevanceFilter:
+    def setup_method(self, test_method):
+        clean_database()
+        relevance_index.invalidate()
+
+    @patch("module_build_service.common.monitor.messaging_rx_irrelevant_counter")
+    @patch.object(MBSConsumer, "process_message")
+    def test_drop_irrelevant_message(self, process_message, irrelevant_counter):
+        hub = MagicMock(config={})
+        consumer = MBSConsumer(hub)
+        consumer.get_abstracted_event_info = MagicMock()
+        consumer.get_abstracted_event_info.return_value = repo_change_event("f32-build")
+        consumer.consume({})
+        process_message.assert_not_called()
+        irrelevant_counter.inc.assert_called_once()
+
+    @patch("module_build_service.common.monitor.messaging_rx_relevant_counter")
+    @patch.object(MBSConsumer, "process_message")
+    def test_pass_relevant_message(self, process_message, relevant_counter):
+        module_build = make_module_in_db("testmodule:master:1:c1")
+        module_build.state = BUILD_STATES["build"]
+        module_build.koji_tag = "module-testmodule-master-1-c1"
+        db_session.commit()
+
+        hub = MagicMock(config={})
+        consumer = MBSConsumer(hub)
+        consumer.get_abstracted_event_info = MagicMock()
+        consumer.get_abstracted_event_info.return_value = repo_change_event(
+            "module-testmodule-master-1-c1-build")
+        consumer.consume({})
+        process_message.assert_called_once()
+        relevant_counter.inc.assert_called_once()
@@ -10,7 +10,9 @@ from module_build_service.common import models
 from module_build_service.common.modulemd import Modulemd
 from module_build_service.common.utils import import_mmd, load_mmd, mmd_to_str
 from module_build_service.scheduler.db_session import db_session
-from module_build_service.scheduler.reuse import get_reusable_component, get_reusable_module
+from module_build_service.scheduler.reuse import (
+    ReusePlanner, get_reusable_component, get_reusable_components, get_reusable_module
+)
 from tests import clean_database, read_staged_data
 
 
@@ -139,6 +141,38 @@ class TestUtilsComponentReuse:
         # component has been removed from it and added to the following one).
         assert bool(reuse_result is None) == bool(reuse_component.batch > orig_batch)
 
+    @pytest.mark.parametrize(
+        "changed_component,first_changed_batch",
+        [("perl-List-Compare", 2), ("tangerine", 3), (None, 4)],
+    )
+    def test_get_reusable_components_planned_once(self, changed_component, first_changed_batch):
+        """
+        Test that the components reusable according to the batches before them are the same
+        when found all at once, and that the number of queries does not depend on the number
+        of components.
+        """
+        second_module_build = models.ModuleBuild.get_by_id(db_session, 3)
+        previous_module_build = models.ModuleBuild.get_by_id(db_session, 2)
+        if changed_component:
+            component = models.ComponentBuild.from_component_name(
+                db_session, changed_component, second_module_build.id)
+            component.ref = "00ea1da4192a2030f9ae023de3b3143ed647bbab"
+            db_session.commit()
+
+        names = ["perl-List-Compare", "perl-Tangerine", "tangerine"]
+        expected = [get_reusable_component(second_module_build, name) for name in names]
+
+        db_session.expire_all()
+        planner = ReusePlanner(second_module_build, previous_module_build)
+        assert planner.first_changed_batch == first_changed_batch
+
+        with mock.patch.object(
+            models.ComponentBuild, "from_component_name"
+        ) as from_component_name:
+            rv = get_reusable_components(second_module_build, names, previous_module_build)
+        from_component_name.assert_not_called()
+        assert rv == expected
+
     @pytest.mark.parametrize(
         "reuse_component",
         ["perl-Tangerine", "perl-List-Compare", "tangerine"])
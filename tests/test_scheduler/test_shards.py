@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+from __future__ import absolute_import
+from datetime import datetime
+
+from mock import patch, PropertyMock, MagicMock
+
+from module_build_service.common.models import ModuleBuildShard
+from module_build_service.scheduler.db_session import db_session, session_factory
+from module_build_service.scheduler.shards import (
+    HashRing, ShardLeases, assign_shard, choose_shard, get_hash_ring, release_shard_lease
+)
+from tests import clean_database
+
+
+class TestHashRing:
+
+    def test_get_shard_is_stable(self):
+        ring = HashRing(4, 64)
+        shards = [ring.get_shard(module_build_id) for module_build_id in range(1000)]
+        assert shards == [HashRing(4, 64).get_shard(i) for i in range(1000)]
+        assert set(shards) == {0, 1, 2, 3}
+
+    def test_adding_a_shard_moves_few_module_builds(self):
+        before = HashRing(8, 64)
+        after = HashRing(9, 64)
+        moved = [
+            module_build_id for module_build_id in range(10000)
+            if before.get_shard(module_build_id) != after.get_shard(module_build_id)
+        ]
+        # About 1/9 of the module builds are expected to move, with modulo it is 8/9
+        assert len(moved) < 2000
+        # All the moved module builds are moved to the new shard
+        assert {after.get_shard(module_build_id) for module_build_id in moved} == {8}
+
+    def test_get_hash_ring_is_cached(self):
+        assert get_hash_ring(3) is get_hash_ring(3)
+
+
+def test_choose_shard():
+    assert choose_shard(1, [0, 3, 0], 5) == 1
+    assert choose_shard(1, [2, 7, 4], 5) == 0
+    assert choose_shard(2, [3, 1, 0], 1) == 2
+
+
+class TestShardLeases:
+
+    def setup_method(self, test_method):
+        clean_database()
+        self.leases = ShardLeases(session_factory)
+
+    def get_lease(self, module_build_id):
+        db_session.expire_all()
+        return db_session.query(ModuleBuildShard).get(module_build_id)
+
+    @patch("module_build_service.common.config.Config.shard_lease_cache_ttl",
+           new_callable=PropertyMock, return_value=0)
+    @patch("module_build_service.common.config.Config.shard_steal_threshold",
+           new_callable=PropertyMock, return_value=2)
+    def test_acquire_and_release(self, steal_threshold, cache_ttl):
+        preferred = get_hash_ring(3).get_shard(10)
+        assert self.leases.acquire(10, 3) == preferred
+        assert self.leases.acquire(10, 3) == preferred
+        assert self.get_lease(10).pending == 2
+
+        self.leases.release(10)
+        self.leases.release(10)
+        self.leases.release(10)
+        assert self.get_lease(10).pending == 0
+
+    @patch("module_build_service.common.config.Config.shard_steal_threshold",
+           new_callable=PropertyMock, return_value=2)
+    def test_idle_module_build_is_moved_to_least_busy_shard(self, steal_threshold):
+        preferred = get_hash_ring(3).get_shard(10)
+        # Another module build keeps the preferred shard busy
+        db_session.add(ModuleBuildShard(
+            module_build_id=20, shard=preferred, pending=5, time_leased=datetime.utcnow()))
+        db_session.commit()
+
+        shard = self.leases.acquire(10, 3)
+        assert shard != preferred
+        # The tasks in progress keep the module build in its shard
+        db_session.query(ModuleBuildShard).filter_by(module_build_id=20).update({"pending": 0})
+        db_session.commit()
+        assert self.leases.acquire(10, 3) == shard
+
+    def test_cached_lease(self):
+        shard = self.leases.acquire(10, 3)
+        with patch.object(self.leases, "_acquire") as acquire:
+            assert self.leases.acquire(10, 3) == shard
+            assert self.leases.acquire(10, 3) == shard
+        acquire.assert_not_called()
+        # The tasks routed using the cached lease are counted right away
+        assert self.get_lease(10).pending == 3
+        self.leases.release(10)
+        assert self.get_lease(10).pending == 2
+
+    @patch("module_build_service.common.config.Config.shard_steal_threshold",
+           new_callable=PropertyMock, return_value=2)
+    def test_cached_lease_of_idle_module_build(self, steal_threshold):
+        preferred = get_hash_ring(3).get_shard(10)
+        assert self.leases.acquire(10, 3) == preferred
+        self.leases.release(10)
+        # The module build has no task in progress, so it can be moved to a less busy shard
+        db_session.add(ModuleBuildShard(
+            module_build_id=20, shard=preferred, pending=5, time_leased=datetime.utcnow()))
+        db_session.commit()
+        shard = self.leases.acquire(10, 3)
+        assert shard != preferred
+        assert self.get_lease(10).shard == shard
+        assert self.get_lease(10).pending == 1
+
+    @patch("module_build_service.common.config.Config.shard_lease_timeout",
+           new_callable=PropertyMock, return_value=0)
+    def test_expired_lease_is_reassigned(self, lease_timeout):
+        preferred = get_hash_ring(3).get_shard(10)
+        db_session.add(ModuleBuildShard(
+            module_build_id=10, shard=(preferred + 1) % 3, pending=3,
+            time_leased=datetime.utcnow()))
+        db_session.commit()
+        assert self.leases.acquire(10, 3) == preferred
+        assert self.get_lease(10).pending == 1
+
+
+class TestAssignShard:
+
+    @patch("module_build_service.common.config.Config.shard_assignment",
+           new_callable=PropertyMock, return_value="modulo")
+    def test_modulo(self, shard_assignment):
+        assert assign_shard(7, 3) == 1
+
+    @patch("module_build_service.common.config.Config.shard_assignment",
+           new_callable=PropertyMock, return_value="hash_ring")
+    def test_hash_ring(self, shard_assignment):
+        assert assign_shard(7, 3) == get_hash_ring(3).get_shard(7)
+
+    @patch("module_build_service.common.config.Config.shard_assignment",
+           new_callable=PropertyMock, return_value="lease")
+    @patch("module_build_service.scheduler.shards.shard_leases")
+    def test_release_on_task_postrun(self, shard_leases, shard_assignment):
+        task = MagicMock()
+        task.request.is_eager = False
+        task.request.module_build_id = 7
+        release_shard_lease(task=task)
+        shard_leases.release.assert_called_once_with(7)
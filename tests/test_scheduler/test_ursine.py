@@ -187,6 +187,31 @@ class TestGetModulemdsFromUrsineContent:
         koji_session.getExternalRepoList.assert_called_once_with(koji_tag)
         assert expected_nsvcs == test_nsvcs
 
+    @patch("module_build_service.scheduler.ursine._find_ursine_content")
+    @patch("module_build_service.scheduler.ursine._get_tags_last_change_events")
+    @patch("koji.ClientSession")
+    def test_ursine_content_is_cached(
+        self, ClientSession, get_events, find_ursine_content
+    ):
+        find_ursine_content.side_effect = lambda session, tag: ursine.UrsineContent(
+            [tag, "tag-4-build"], [10, 20], [])
+
+        content = ursine.get_ursine_content("tag")
+        assert content is ursine.get_ursine_content("tag")
+        get_events.assert_not_called()
+
+        with patch.object(conf, "ursine_content_ttl", new=0):
+            # The tags did not change, the same content is used
+            get_events.return_value = [10, 20]
+            assert content is ursine.get_ursine_content("tag")
+            get_events.assert_called_once_with(ClientSession.return_value, ["tag", "tag-4-build"])
+
+            # Ursa-Major changed the inheritance of the build tag
+            get_events.return_value = [10, 21]
+            assert content is not ursine.get_ursine_content("tag")
+
+        assert 2 == find_ursine_content.call_count
+
 
 class TestRecordStreamCollisionModules:
     """Test ursine.record_stream_collision_modules"""
@@ -235,11 +260,12 @@ class TestRecordStreamCollisionModules:
         assert expected_xmd == fake_mmd.get_xmd()
 
     @patch.object(conf, "base_module_names", new=["platform", "project-platform"])
-    @patch("module_build_service.scheduler.ursine.get_modulemds_from_ursine_content")
+    @patch("module_build_service.scheduler.ursine.get_ursine_content")
     @patch("module_build_service.resolver.GenericResolver.create")
+    @patch("module_build_service.scheduler.ursine.koji_retrying_multicall_map")
     @patch("koji.ClientSession")
     def test_add_collision_modules(
-        self, ClientSession, resolver_create, get_modulemds_from_ursine_content
+        self, ClientSession, multicall_map, resolver_create, get_ursine_content
     ):
         xmd = {
             "mbs": {
@@ -257,21 +283,19 @@ class TestRecordStreamCollisionModules:
         }
         fake_mmd = make_module("name1:s:2020:c", xmd=xmd)
 
-        def mock_get_ursine_modulemds(koji_tag):
-            if koji_tag == "module-rhel-8.0-build":
-                return [
-                    # This is the one
-                    make_module("modulea:10:20180813041838:5ea3b708"),
-                    make_module("moduleb:1.0:20180113042038:6ea3b105"),
-                ]
-            if koji_tag == "module-project-1.0-build":
-                return [
-                    # Both of them are the collided modules
-                    make_module("bar:6:20181013041838:817fa3a8"),
-                    make_module("foo:2:20180113041838:95f078a1"),
-                ]
-
-        get_modulemds_from_ursine_content.side_effect = mock_get_ursine_modulemds
+        ursine_contents = {
+            "module-rhel-8.0-build": ursine.UrsineContent([], None, [
+                # This is the one
+                make_module("modulea:10:20180813041838:5ea3b708"),
+                make_module("moduleb:1.0:20180113042038:6ea3b105"),
+            ]),
+            "module-project-1.0-build": ursine.UrsineContent([], None, [
+                # Both of them are the collided modules
+                make_module("bar:6:20181013041838:817fa3a8"),
+                make_module("foo:2:20180113041838:95f078a1"),
+            ]),
+        }
+        get_ursine_content.side_effect = ursine_contents.get
 
         # Mock for finding out built rpms
         def mock_get_module(name, stream, version, context, strict=True):
@@ -304,7 +328,9 @@ class TestRecordStreamCollisionModules:
             }[tag]
 
         koji_session = ClientSession.return_value
-        koji_session.listTaggedRPMS.side_effect = mock_listTaggedRPMS
+        multicall_map.side_effect = lambda session, func, tags, kwargs, method: [
+            mock_listTaggedRPMS(tag, **kw) for tag, kw in zip(tags, kwargs)
+        ]
 
         ursine.handle_stream_collision_modules(fake_mmd)
 
@@ -322,6 +348,15 @@ class TestRecordStreamCollisionModules:
         rpms = sorted(buildrequires["project-platform"]["ursine_rpms"])
         assert ["pkg2-0:2.0-1.fc28", "pkg3-0:3.0-1.fc28"] == rpms
 
+        # The RPMs of the modules of every base module are listed with a single multicall
+        assert 2 == multicall_map.call_count
+        for call in multicall_map.mock_calls:
+            assert call[1][1] == koji_session.listTaggedRPMS
+        assert {
+            "module-bar-6-20181013041838-817fa3a8": ["pkg2-0:2.0-1.fc28"],
+            "module-foo-2-20180113041838-95f078a1": ["pkg3-0:3.0-1.fc28"],
+        } == ursine_contents["module-project-1.0-build"].built_rpms
+
 
 class TestFindStreamCollisionModules:
     """Test ursine.find_stream_collision_modules"""
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: MIT
+from __future__ import absolute_import
+import threading
+
+from mock import patch, MagicMock, PropertyMock
+import pytest
+
+from module_build_service.scheduler import events
+from module_build_service.scheduler.consumer import MBSConsumer
+from module_build_service.scheduler.workers import ModuleBuildWorkerPool
+
+
+class TestModuleBuildWorkerPool:
+
+    def test_per_module_build_order(self):
+        handled = []
+        threads = {}
+
+        def run_handler(module_build_id, value):
+            handled.append((module_build_id, value))
+            threads.setdefault(module_build_id, set()).add(threading.current_thread().name)
+
+        pool = ModuleBuildWorkerPool(3, run_handler)
+        for value in range(20):
+            for module_build_id in (1, 2, 3, 4):
+                pool.submit(module_build_id, value)
+        # Shutdown waits for all the queued events to be handled
+        pool.shutdown()
+
+        assert len(handled) == 80
+        for module_build_id in (1, 2, 3, 4):
+            values = [value for build_id, value in handled if build_id == module_build_id]
+            assert values == list(range(20))
+            assert len(threads[module_build_id]) == 1
+        # The module builds 1 and 4 share the same worker
+        assert threads[1] == threads[4]
+        assert threads[1] != threads[2]
+
+    def test_failing_handler_does_not_stop_worker(self):
+        handled = []
+
+        def run_handler(module_build_id, value):
+            if value == 0:
+                raise RuntimeError("failed")
+            handled.append(value)
+
+        pool = ModuleBuildWorkerPool(1, run_handler)
+        pool.submit(1, 0)
+        pool.submit(1, 1)
+        pool.shutdown()
+
+        assert handled == [1]
+
+    def test_submit_after_shutdown(self):
+        pool = ModuleBuildWorkerPool(1, MagicMock())
+        pool.shutdown()
+        with pytest.raises(RuntimeError):
+            pool.submit(1)
+
+
+class TestSchedulerQueues:
+
+    def test_bind_queue(self):
+        handler = MagicMock()
+        shared_queue = events.scheduler.get_queue()
+
+        def scheduled_in_thread():
+            events.scheduler.bind_queue()
+            events.scheduler.add(handler, (1,))
+            assert len(events.scheduler.get_queue()) == 1
+            events.scheduler.run()
+
+        thread = threading.Thread(target=scheduled_in_thread)
+        thread.start()
+        thread.join()
+
+        handler.assert_called_once_with(1)
+        assert events.scheduler.get_queue() is shared_queue
+        assert not shared_queue
+
+
+class TestConsumerWorkerPool:
+
+    @patch("module_build_service.common.config.Config.consumer_workers",
+           new_callable=PropertyMock, return_value=2)
+    @patch.object(MBSConsumer, "_map_message")
+    def test_process_message_queues_event(self, map_message, consumer_workers):
+        handler = MagicMock(__name__="handler")
+        map_message.return_value = (handler, MagicMock(id=5))
+        hub = MagicMock(config={})
+        consumer = MBSConsumer(hub)
+        try:
+            with patch.object(consumer.worker_pool, "submit") as submit:
+                consumer.process_message({
+                    "msg_id": "msg", "event": events.KOJI_REPO_CHANGE, "tag_name": "tag"})
+        finally:
+            consumer.worker_pool.shutdown()
+
+        submit.assert_called_once_with(
+            5, handler, {"msg_id": "msg", "tag_name": "tag"},
+            "handler: {}, msg".format(events.KOJI_REPO_CHANGE))
+        handler.assert_not_called()
+
+    @patch.object(MBSConsumer, "_map_message")
+    def test_process_message_without_workers(self, map_message):
+        handler = MagicMock(__name__="handler")
+        map_message.return_value = (handler, MagicMock(id=5))
+        hub = MagicMock(config={})
+        consumer = MBSConsumer(hub)
+        assert consumer.worker_pool is None
+        consumer.process_message({
+            "msg_id": "msg", "event": events.KOJI_REPO_CHANGE, "tag_name": "tag"})
+
+        handler.assert_called_once_with(msg_id="msg", tag_name="tag")
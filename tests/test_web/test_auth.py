@@ -2,6 +2,7 @@
 # SPDX-License-Identifier: MIT
 from __future__ import absolute_import
 from os import path
+import time
 
 import mock
 from mock import patch, PropertyMock, Mock
@@ -14,6 +15,21 @@ import module_build_service.common.errors
 import module_build_service.web.auth
 
 
+@pytest.fixture(autouse=True)
+def invalidate_auth_cache():
+    module_build_service.web.auth.region.invalidate()
+
+
+def _make_oidc_request(token="foobar"):
+    headers = {"authorization": "Bearer " + token}
+    request = mock.MagicMock()
+    request.headers.return_value = mock.MagicMock(spec_set=dict)
+    request.headers.__getitem__.side_effect = headers.__getitem__
+    request.headers.__setitem__.side_effect = headers.__setitem__
+    request.headers.__contains__.side_effect = headers.__contains__
+    return request
+
+
 class TestAuthModule:
     def test_get_user_no_token(self):
         base_dir = path.abspath(path.dirname(__file__))
@@ -247,3 +263,76 @@ class TestAuthModule:
         username, groups = module_build_service.web.auth.get_user_kerberos(request)
         assert "x-man" == username
         assert {"group1", "group2"} == groups
+
+
+class TestOIDCTokenCache:
+    client_secrets = path.join(path.abspath(path.dirname(__file__)), "client_secrets.json")
+
+    def _token_info(self, **kwargs):
+        token_info = {
+            "active": True,
+            "username": "Joey Jo Jo Junior Shabadoo",
+            "scope": "openid https://id.fedoraproject.org/scope/groups mbs-scope",
+        }
+        token_info.update(kwargs)
+        return token_info
+
+    def _get_user_oidc(self, token="foobar"):
+        with patch.dict(
+            "module_build_service.app.config",
+            {"OIDC_CLIENT_SECRETS": self.client_secrets, "OIDC_REQUIRED_SCOPE": "mbs-scope"},
+        ):
+            return module_build_service.web.auth.get_user_oidc(_make_oidc_request(token))
+
+    @patch("module_build_service.web.auth._get_token_info")
+    @patch("module_build_service.web.auth._get_user_info")
+    def test_cached_until_expiration(self, get_user_info, get_token_info):
+        get_token_info.return_value = self._token_info(exp=time.time() + 100)
+        get_user_info.return_value = {"groups": ["group"]}
+
+        for _ in range(3):
+            assert self._get_user_oidc() == ("Joey Jo Jo Junior Shabadoo", {"group"})
+        get_token_info.assert_called_once()
+        get_user_info.assert_called_once()
+
+        # Another token is not served from the cache
+        self._get_user_oidc("spameggs")
+        assert get_token_info.call_count == 2
+
+    @patch("module_build_service.web.auth._get_token_info")
+    @patch("module_build_service.web.auth._get_user_info")
+    def test_expired_token_not_cached(self, get_user_info, get_token_info):
+        get_token_info.return_value = self._token_info(exp=time.time() - 1)
+        get_user_info.return_value = {"groups": ["group"]}
+
+        self._get_user_oidc()
+        self._get_user_oidc()
+        assert get_token_info.call_count == 2
+
+    @patch.object(
+        mbs_config.Config, "oidc_token_cache_max_ttl", new_callable=PropertyMock, return_value=0)
+    @patch("module_build_service.web.auth._get_token_info")
+    @patch("module_build_service.web.auth._get_user_info")
+    def test_cache_disabled(self, get_user_info, get_token_info, max_ttl):
+        get_token_info.return_value = self._token_info()
+        get_user_info.return_value = {"groups": ["group"]}
+
+        self._get_user_oidc()
+        self._get_user_oidc()
+        assert get_token_info.call_count == 2
+
+    @patch("module_build_service.web.auth._get_token_info")
+    @patch("module_build_service.web.auth._get_user_info")
+    def test_invalid_token_not_cached(self, get_user_info, get_token_info):
+        get_token_info.return_value = self._token_info(active=False)
+
+        for _ in range(2):
+            with pytest.raises(module_build_service.common.errors.Unauthorized):
+                self._get_user_oidc()
+        assert get_token_info.call_count == 2
+        get_user_info.assert_not_called()
+
+    def test_token_hash_used_as_key(self):
+        key = module_build_service.web.auth._get_token_cache_key("foobar")
+        assert "foobar" not in key
+        assert key == module_build_service.web.auth._get_token_cache_key("foobar")
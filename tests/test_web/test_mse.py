@@ -2,9 +2,13 @@
 # SPDX-License-Identifier: MIT
 from __future__ import absolute_import
 
+from mock import patch
 import pytest
 
 from module_build_service.common.errors import StreamAmbigous
+from module_build_service.common.models import ModuleBuild
+from module_build_service.common.utils import mmd_to_str
+from module_build_service.resolver.DBResolver import DBResolver
 from module_build_service.scheduler.db_session import db_session
 from module_build_service.web.mse import (
     expand_mse_streams, generate_expanded_mmds, get_mmds_required_by_module_recursively
@@ -71,6 +75,34 @@ class TestModuleStreamExpansion:
         contexts = {mmd.get_context() for mmd in mmds}
         assert {"e1e005fb", "ce132a1e"} == contexts
 
+    def test_generate_expanded_mmds_cached_plan(self):
+        self._generate_default_modules()
+        module_build = make_module_in_db(
+            "app:1:0:c1", [{
+                "requires": {"gtk": ["1"]},
+                "buildrequires": {"platform": ["f28"], "gtk": ["1"]},
+            }],
+        )
+        with patch(
+            "module_build_service.web.mse.get_mmds_required_by_module_recursively",
+            wraps=get_mmds_required_by_module_recursively,
+        ) as get_mmds:
+            mmds = generate_expanded_mmds(db_session, module_build.mmd())
+            cached_mmds = generate_expanded_mmds(db_session, module_build.mmd())
+            assert get_mmds.call_count == 1
+            assert [mmd_to_str(m) for m in cached_mmds] == [mmd_to_str(m) for m in mmds]
+
+            # A new ready module build of gtk invalidates the plan
+            platform_f28 = ModuleBuild.get_build_from_nsvc(
+                db_session, "platform", "f28", "0", "c10")
+            make_module_in_db("gtk:1:1:c2", [{
+                "requires": {"platform": ["f28"]},
+                "buildrequires": {"platform": ["f28"]},
+            }], base_module=platform_f28)
+            mmds = generate_expanded_mmds(db_session, module_build.mmd())
+            assert get_mmds.call_count == 2
+            assert mmds[0].get_xmd()["mbs"]["buildrequires"]["gtk"]["version"] == "1"
+
     @pytest.mark.parametrize(
         "module_deps,stream_ambigous,expected_xmd,expected_buildrequires",
         [
@@ -424,6 +456,40 @@ class TestModuleStreamExpansion:
         nsvcs = self._get_mmds_required_by_module_recursively(module_build, db_session)
         assert set(nsvcs) == set(expected)
 
+    def test_get_required_modules_looks_up_each_module_once(self):
+        module_build = make_module_in_db("app:1:0:c1", [{
+            "requires": {},
+            "buildrequires": {"platform": [], "gtk": ["1"], "foo": ["1"]},
+        }])
+        self._generate_default_modules_recursion()
+        original = DBResolver.get_buildrequired_modulemds
+        with patch.object(
+            DBResolver, "get_buildrequired_modulemds", autospec=True, side_effect=original
+        ) as get_buildrequired_modulemds:
+            nsvcs = self._get_mmds_required_by_module_recursively(module_build, db_session)
+
+        assert set(nsvcs) == {
+            "foo:1:1:c2",
+            "base:f29:0:c3",
+            "platform:f29:0:c11",
+            "bar:1:1:c2",
+            "gtk:1:1:c2",
+            "lorem:1:1:c2",
+        }
+        # bar:1 and lorem:1 both require base:f29, and gtk:1 requires foo:1 as well
+        lookups = [
+            (name, stream, base_module_mmd.get_nsvc())
+            for _, name, stream, base_module_mmd in (
+                call[0] for call in get_buildrequired_modulemds.call_args_list)
+        ]
+        assert sorted(lookups) == [
+            ("bar", "1", "platform:f29:0:c11"),
+            ("base", "f29", "platform:f29:0:c11"),
+            ("foo", "1", "platform:f29:0:c11"),
+            ("gtk", "1", "platform:f29:0:c11"),
+            ("lorem", "1", "platform:f29:0:c11"),
+        ]
+
     def _generate_default_modules_modules_multiple_stream_versions(self):
         """
         Generates the gtk:1 module requiring foo:1 module requiring bar:1
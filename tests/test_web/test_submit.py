@@ -107,6 +107,33 @@ class TestUtilsComponentReuse:
         assert builds[0].siblings(db_session) == [builds[1].id]
         assert builds[1].siblings(db_session) == [builds[0].id]
 
+    @mock.patch("module_build_service.web.submit.notify_on_module_state_change")
+    @mock.patch("module_build_service.web.submit.generate_expanded_mmds")
+    def test_submit_build_new_builds_in_one_transaction(
+        self, generate_expanded_mmds, notify_on_module_state_change
+    ):
+        """
+        Tests that all the new module builds of a submission are committed at once, and that
+        the messages sent about them are the same as their JSON representation.
+        """
+        mmds = [make_module("foo:stream:0:{}".format(context)) for context in ("c1", "c2", "c3")]
+        generate_expanded_mmds.return_value = mmds
+        mmd_copy = mmds[0].copy()
+        mmd_copy.set_xmd({})
+
+        with mock.patch.object(db_session, "commit", wraps=db_session.commit) as commit:
+            builds = submit_module_build(db_session, "foo", mmd_copy, {})
+        assert commit.call_count == 1
+
+        assert [build.state for build in builds] == [models.BUILD_STATES["init"]] * 3
+        messages = [c[0][0] for c in notify_on_module_state_change.call_args_list]
+        assert len(messages) == 3
+        for message, build in zip(messages, builds):
+            expected = build.json(db_session, show_tasks=False)
+            assert sorted(message.pop("siblings")) == sorted(expected.pop("siblings"))
+            assert message == expected
+        assert sorted(builds[0].siblings(db_session)) == [builds[1].id, builds[2].id]
+
     @mock.patch("module_build_service.web.submit.generate_expanded_mmds")
     @mock.patch(
         "module_build_service.common.config.Config.scratch_build_only_branches",
@@ -9,6 +9,7 @@ from os import path, mkdir
 from os.path import basename, dirname, splitext
 import re
 from shutil import copyfile
+import zlib
 
 import koji
 from mock import patch, PropertyMock, Mock
@@ -21,10 +22,12 @@ from module_build_service import app, version
 from module_build_service.builder.utils import get_rpm_release
 import module_build_service.common.config as mbs_config
 from module_build_service.common.errors import UnprocessableEntity
-from module_build_service.common.models import ModuleBuild, BUILD_STATES, ComponentBuild
+from module_build_service.common.models import (
+    ModuleBuild, BUILD_STATES, ComponentBuild, ModuleBuildRPM)
 from module_build_service.common.utils import load_mmd, import_mmd, mmd_to_str
 from module_build_service.scheduler.db_session import db_session
 import module_build_service.web.submit
+from module_build_service.web.submission_jobs import submission_jobs
 from tests import (
     init_data,
     clean_database,
@@ -496,6 +499,71 @@ class TestViews:
 
         mock_session.krb_login.assert_not_called()
 
+    @pytest.mark.usefixtures("reuse_component_init_data")
+    @pytest.mark.parametrize("rpm", (
+        "module-build-macros-0.1-1.testmodule_master_20170303190726.src.rpm",
+        "module-build-macros-0.1-1.testmodule_master_20170303190726.src",
+        "module-build-macros-0:0.1-1.testmodule_master_20170303190726.src",
+    ))
+    @patch("module_build_service.builder.KojiModuleBuilder.KojiModuleBuilder.get_rpm_module_tag")
+    def test_query_builds_with_binary_rpm_indexed(self, get_rpm_module_tag, rpm):
+        for build_id in (2, 3):
+            db_session.add(ModuleBuildRPM(
+                module_build_id=build_id,
+                name="module-build-macros",
+                nevra="module-build-macros-0:0.1-1.testmodule_master_20170303190726.src",
+                nvra="module-build-macros-0.1-1.testmodule_master_20170303190726.src",
+            ))
+        db_session.commit()
+
+        rv = self.client.get("/module-build-service/1/module-builds/?rpm=%s" % quote(rpm))
+        results = json.loads(rv.data)["items"]
+
+        assert [result["id"] for result in results] == [3, 2]
+        get_rpm_module_tag.assert_not_called()
+
+    @pytest.mark.usefixtures("reuse_component_init_data")
+    def test_query_builds_with_rpm_name(self):
+        for build_id, release in ((2, "1"), (3, "2")):
+            db_session.add(ModuleBuildRPM(
+                module_build_id=build_id,
+                name="tangerine",
+                nevra="tangerine-0:0.22-%s.x86_64" % release,
+                nvra="tangerine-0.22-%s.x86_64" % release,
+            ))
+        db_session.commit()
+
+        rv = self.client.get("/module-build-service/1/module-builds/?rpm_name=tangerine")
+        results = json.loads(rv.data)["items"]
+        assert [result["id"] for result in results] == [3, 2]
+
+        rv = self.client.get("/module-build-service/1/module-builds/?rpm_name=perl-Tangerine")
+        assert json.loads(rv.data)["items"] == []
+
+    @pytest.mark.usefixtures("reuse_component_init_data")
+    @patch("module_build_service.builder.KojiModuleBuilder.KojiModuleBuilder.get_rpm_module_tag")
+    def test_query_builds_with_rpm_and_rpm_name(self, get_rpm_module_tag):
+        db_session.add(ModuleBuildRPM(
+            module_build_id=2,
+            name="tangerine",
+            nevra="tangerine-0:0.22-1.x86_64",
+            nvra="tangerine-0.22-1.x86_64",
+        ))
+        db_session.commit()
+        # The RPM is not indexed, so the module builds containing it are found in Koji
+        get_rpm_module_tag.return_value = [
+            ModuleBuild.get_by_id(db_session, build_id).koji_tag for build_id in (2, 3)]
+        rpm = "module-build-macros-0.1-1.testmodule_master_20170303190726.src.rpm"
+
+        rv = self.client.get(
+            "/module-build-service/1/module-builds/?rpm=%s&rpm_name=tangerine" % quote(rpm))
+        assert [result["id"] for result in json.loads(rv.data)["items"]] == [2]
+        get_rpm_module_tag.assert_called_once_with(rpm)
+
+        rv = self.client.get(
+            "/module-build-service/1/module-builds/?rpm=%s&rpm_name=perl-Tangerine" % quote(rpm))
+        assert json.loads(rv.data)["items"] == []
+
     @patch(
         "module_build_service.common.config.Config.system",
         new_callable=PropertyMock,
@@ -599,6 +667,53 @@ class TestViews:
         ]
         assert component_builds[0]["state_trace"][0]["state_name"] is None
 
+    @patch.object(ModuleBuild, "tasks")
+    @patch.object(ModuleBuild, "siblings")
+    def test_query_builds_fields(self, siblings, tasks):
+        rv = self.client.get(
+            "/module-build-service/1/module-builds/?fields=id,name,state_name,time_modified"
+            "&verbose=true&per_page=3"
+        )
+        data = json.loads(rv.data)
+        assert data["meta"]["total"] == 7
+        assert [item["id"] for item in data["items"]] == [7, 6, 5]
+        for item in data["items"]:
+            assert set(item.keys()) == {"id", "name", "state_name", "time_modified"}
+        assert data["items"][0]["name"] == "testmodule"
+        assert data["items"][0]["state_name"] == "wait"
+        siblings.assert_not_called()
+        tasks.assert_not_called()
+
+    def test_query_builds_fields_match_verbose(self):
+        rv = self.client.get("/module-build-service/1/module-builds/2?verbose=true")
+        verbose_data = json.loads(rv.data)
+        rv = self.client.get(
+            "/module-build-service/1/module-builds/2"
+            "?fields=state_trace,tasks,siblings&fields=state_url,buildrequires"
+        )
+        data = json.loads(rv.data)
+        assert set(data.keys()) == {
+            "state_trace", "tasks", "siblings", "state_url", "buildrequires"}
+        for key, value in data.items():
+            assert value == verbose_data[key]
+
+    def test_query_builds_fields_invalid(self):
+        rv = self.client.get("/module-build-service/1/module-builds/?fields=id,spam")
+        assert rv.status_code == 400
+        data = json.loads(rv.data)
+        assert data["message"] == 'An invalid field of "spam" was supplied'
+
+    def test_query_component_builds_fields(self):
+        rv = self.client.get(
+            "/module-build-service/1/component-builds/?fields=package,state_name&module_build=2")
+        data = json.loads(rv.data)
+        assert data["meta"]["total"] == 2
+        for item in data["items"]:
+            assert set(item.keys()) == {"package", "state_name"}
+        rv = self.client.get("/module-build-service/1/component-builds/3?fields=state_trace")
+        data = json.loads(rv.data)
+        assert data["state_trace"][0]["state_name"] == "wait"
+
     def test_query_component_builds_filter_format(self):
         rv = self.client.get("/module-build-service/1/component-builds/?format=rpms")
         data = json.loads(rv.data)
@@ -684,6 +799,77 @@ class TestViews:
         data = json.loads(rv.data)
         assert data["meta"]["total"] == 6
 
+    def _export(self, url, **kwargs):
+        rv = self.client.get(url, **kwargs)
+        assert rv.status_code == 200
+        assert rv.mimetype == "application/x-ndjson"
+        data = rv.data
+        if rv.headers.get("Content-Encoding") == "gzip":
+            data = zlib.decompress(data, zlib.MAX_WBITS | 16)
+        return [json.loads(line) for line in data.decode("utf-8").splitlines()]
+
+    def test_export_module_builds(self):
+        items = self._export("/module-build-service/1/module-builds/export")
+        expected = sorted(
+            db_session.query(ModuleBuild).all(), key=lambda build: (build.time_modified, build.id))
+        assert [item["id"] for item in items] == [build.id for build in expected]
+        rv = self.client.get("/module-build-service/1/module-builds/7")
+        expected_item = json.loads(rv.data)
+        # The tasks are left out of the default export
+        del expected_item["tasks"]
+        assert items[[item["id"] for item in items].index(7)] == expected_item
+
+    def test_export_module_builds_since(self):
+        items = self._export(
+            "/module-build-service/1/module-builds/export?since=2016-09-03T11:35:00Z")
+        assert len(items) == 6
+        time_modified = [item["time_modified"] for item in items]
+        assert time_modified == sorted(time_modified)
+        assert all(modified >= "2016-09-03T11:35:00Z" for modified in time_modified)
+
+    def test_export_module_builds_filters_and_fields(self):
+        items = self._export(
+            "/module-build-service/1/module-builds/export?name=nginx&fields=id,name,time_modified")
+        assert len(items) == 2
+        for item in items:
+            assert set(item.keys()) == {"id", "name", "time_modified"}
+            assert item["name"] == "nginx"
+
+    def test_export_module_builds_gzip(self):
+        items = self._export(
+            "/module-build-service/1/module-builds/export?fields=id",
+            headers={"Accept-Encoding": "gzip"},
+        )
+        assert len(items) == db_session.query(ModuleBuild).count()
+
+    def test_export_module_builds_invalid_since(self):
+        rv = self.client.get("/module-build-service/1/module-builds/export?since=yesterday")
+        assert rv.status_code == 400
+        assert json.loads(rv.data)["message"] == (
+            'An invalid Zulu ISO 8601 timestamp was provided for the "since" parameter')
+
+    def test_export_component_builds(self):
+        items = self._export(
+            "/module-build-service/1/component-builds/export?module_build=2&verbose=true")
+        expected = (
+            db_session.query(ComponentBuild).filter_by(module_id=2)
+            .order_by(ComponentBuild.id).all()
+        )
+        assert [item["id"] for item in items] == [build.id for build in expected]
+        assert all("state_trace" in item for item in items)
+
+    def test_export_component_builds_since(self):
+        items = self._export(
+            "/module-build-service/1/component-builds/export?fields=module_build"
+            "&since=2016-09-03T11:35:00Z"
+        )
+        modified_module_ids = {
+            build.id for build in db_session.query(ModuleBuild).filter(
+                ModuleBuild.time_modified >= datetime(2016, 9, 3, 11, 35)).all()
+        }
+        assert items
+        assert {item["module_build"] for item in items} <= modified_module_ids
+
     def test_query_builds_filter_owner(self):
         rv = self.client.get("/module-build-service/1/module-builds/?owner=Moe%20Szyslak")
         data = json.loads(rv.data)
@@ -985,6 +1171,88 @@ class TestViews:
         assert module.buildrequires[0].context == "00000000"
         assert module.buildrequires[0].stream_version == 280000
 
+    @patch("module_build_service.common.config.Config.submission_async",
+           new_callable=PropertyMock, return_value=True)
+    @patch("module_build_service.web.auth.get_user", return_value=user)
+    @patch("module_build_service.common.scm.SCM")
+    def test_submit_build_async(self, mocked_scm, mocked_get_user, submission_async):
+        FakeSCM(
+            mocked_scm, "testmodule", "testmodule.yaml", "620ec77321b2ea7b0d67d82992dda3e1d67055b4")
+
+        rv = self.client.post(
+            "/module-build-service/2/module-builds/",
+            data=json.dumps({
+                "branch": "master",
+                "scmurl": "https://src.stg.fedoraproject.org/modules/"
+                "testmodule.git?#68931c90de214d9d13feefbd35246a81b6cb8d49",
+            }),
+            headers={"Prefer": "respond-async"},
+        )
+        assert rv.status_code == 202
+        assert rv.headers["Preference-Applied"] == "respond-async"
+        job = json.loads(rv.data)
+        assert job["owner"] == "Homer J. Simpson"
+        assert rv.headers["Location"].endswith(
+            "/module-build-service/2/submission-jobs/{0}".format(job["id"]))
+
+        submission_jobs.shutdown()
+        rv = self.client.get("/module-build-service/2/submission-jobs/{0}".format(job["id"]))
+        job = json.loads(rv.data)
+        assert job["state_name"] == "done"
+        assert job["module_build_ids"] == [8]
+        assert job["module_build_urls"] == ["/module-build-service/2/module-builds/8"]
+        assert job["error"] is None
+        assert ModuleBuild.get_by_id(db_session, 8).name == "testmodule"
+
+    @patch("module_build_service.common.config.Config.submission_async",
+           new_callable=PropertyMock, return_value=True)
+    @patch("module_build_service.web.auth.get_user", return_value=user)
+    @patch("module_build_service.web.views.submit_module_build_from_scm")
+    def test_submit_build_async_failure(self, mocked_submit, mocked_get_user, submission_async):
+        mocked_submit.side_effect = UnprocessableEntity("The modulemd is invalid")
+
+        rv = self.client.post(
+            "/module-build-service/2/module-builds/",
+            data=json.dumps({
+                "branch": "master",
+                "scmurl": "https://src.stg.fedoraproject.org/modules/"
+                "testmodule.git?#68931c90de214d9d13feefbd35246a81b6cb8d49",
+            }),
+            headers={"Prefer": "respond-async, wait=10"},
+        )
+        assert rv.status_code == 202
+
+        submission_jobs.shutdown()
+        rv = self.client.get(
+            "/module-build-service/2/submission-jobs/{0}".format(json.loads(rv.data)["id"]))
+        job = json.loads(rv.data)
+        assert job["state_name"] == "failed"
+        assert job["module_build_ids"] == []
+        assert job["error"] == {"status": 422, "message": "The modulemd is invalid"}
+
+    @patch("module_build_service.web.auth.get_user", return_value=user)
+    @patch("module_build_service.common.scm.SCM")
+    def test_preview_build(self, mocked_scm, mocked_get_user):
+        FakeSCM(
+            mocked_scm, "testmodule", "testmodule.yaml", "620ec77321b2ea7b0d67d82992dda3e1d67055b4")
+
+        rv = self.client.post(
+            "/module-build-service/2/module-builds/preview",
+            data=json.dumps({
+                "branch": "master",
+                "scmurl": "https://src.stg.fedoraproject.org/modules/"
+                "testmodule.git?#68931c90de214d9d13feefbd35246a81b6cb8d49",
+            }),
+        )
+        assert rv.status_code == 200
+        data = json.loads(rv.data)
+        assert len(data) == 1
+        assert data[0]["nsvc"] == "testmodule:master:281:" + data[0]["context"]
+        assert data[0]["buildrequires"] == {"platform": "platform:f28:3:00000000"}
+        assert data[0]["module_build_id"] is None
+        # No module build is created
+        assert ModuleBuild.get_by_id(db_session, 8) is None
+
     @patch("module_build_service.web.auth.get_user", return_value=user)
     @patch("module_build_service.common.scm.SCM")
     def test_submit_build_no_base_module(self, mocked_scm, mocked_get_user):